@@ -0,0 +1,262 @@
+"""
+Seed the database with weather history for many cities over a date range.
+
+Usage:
+    python -m app.backfill --cities London Paris --start 2020-01-01 --end 2023-12-31
+    python -m app.backfill --cities-file cities.txt --start 2020-01-01 --end 2023-12-31 \\
+        --concurrency 8 --batch-size 5000 --checkpoint backfill.checkpoint
+
+Days already stored are skipped, and the remaining ones are fetched with ranged
+upstream calls of up to `UPSTREAM_MAX_RANGE_DAYS` days, `--concurrency` at a time.
+Rows are written in transactions of `--batch-size` rows. Each window is recorded
+in the checkpoint file once its rows are committed, so an interrupted run
+started again with the same checkpoint does not fetch those days again.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from app import config, crud, database, weather
+from app.weather import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+def load_checkpoint(path: str | None) -> dict:
+    """
+    Read the days a previous run already completed.
+
+    Args:
+        path (str, optional): The checkpoint file; missing files count as empty.
+
+    Returns:
+        dict: Maps normalized cities to sets of completed dates.
+    """
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as checkpoint:
+        for line in checkpoint:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line cut short by an interruption; its window is fetched again
+                continue
+            start, end = datetime.fromisoformat(entry["start"]), datetime.fromisoformat(entry["end"])
+            days = done.setdefault(entry["city"], set())
+            days.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return done
+
+def plan(cities: list, start: datetime, end: datetime, skip: dict, max_days: int) -> list:
+    """
+    List the upstream calls needed to cover the days not skipped.
+
+    Args:
+        cities (list): City names; spellings that normalize alike are fetched once.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+        skip (dict): Maps normalized cities to sets of dates that need no fetch.
+        max_days (int): Maximum days per upstream call.
+
+    Returns:
+        list: (city, window start, window end) tuples, city by city.
+    """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    units = []
+    first_spellings = {}
+    for city in cities:
+        first_spellings.setdefault(crud.normalize_city(city), city)
+    for city in first_spellings.values():
+        done = skip.get(crud.normalize_city(city), set())
+        missing = [day for day in days if day not in done]
+        units += [(city, first, last) for first, last in weather.plan_range_fetches(missing, max_days)]
+    return units
+
+async def run_backfill(cities: list, start: datetime, end: datetime, concurrency: int = 4,
+                       batch_size: int = 5000, checkpoint: str | None = None, session_factory=None,
+                       progress_interval: float = 10.0) -> dict:
+    """
+    Fetch and store weather history for every city and day in the range.
+
+    Fetches run in `concurrency` workers and hand their rows to a single writer,
+    which commits them with `crud.create_weather_many` once `batch_size` rows are
+    waiting, then appends the windows they came from to the checkpoint. Windows
+    the API has no data for are checkpointed without rows; windows that cannot be
+    fetched or stored are logged and left for the next run. Windows whose rows are
+    stored but can't be checkpointed (disk full, read-only directory) are counted
+    and logged; a resumed run finds their days in the database. If the writer
+    stops on an unexpected error, the fetches are cancelled and the error raised,
+    instead of leaving them waiting for a writer that is gone.
+
+    Args:
+        cities (list): City names.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+        concurrency (int): Upstream calls in flight.
+        batch_size (int): Rows per insert transaction.
+        checkpoint (str, optional): Path of the checkpoint file to resume from and append to.
+        session_factory (optional): Creates database sessions; defaults to `database.AsyncSessionLocal`.
+        progress_interval (float): Seconds between progress log lines.
+
+    Returns:
+        dict: Windows planned, completed, failed and not checkpointed, days skipped,
+        rows written, elapsed seconds and rows per second.
+    """
+    session_factory = session_factory or database.AsyncSessionLocal
+    skip = load_checkpoint(checkpoint)
+    resumed = sum(len(days) for days in skip.values())
+    async with session_factory() as db:
+        for city in cities:
+            stored = {row.date for row in await crud.get_weather_range(db, city, start, end)}
+            skip.setdefault(crud.normalize_city(city), set()).update(stored)
+
+    units = plan(cities, start, end, skip, Config.UPSTREAM_MAX_RANGE_DAYS)
+    stats = {"windows": len(units), "completed": 0, "failed": 0, "no_data": 0, "not_checkpointed": 0,
+             "resumed_days": resumed, "rows": 0}
+    logger.info("Backfill of %d cities from %s to %s: %d upstream calls planned",
+                len(cities), start.date(), end.date(), len(units))
+
+    todo = asyncio.Queue()
+    for unit in units:
+        todo.put_nowait(unit)
+    fetched = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.perf_counter()
+
+    async def fetch_worker():
+        while True:
+            try:
+                city, first, last = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                data = await weather.fetch_weather_data(city, first, last)
+                rows = [row for row in weather.parse_forecastdays(city, data) if first <= row.date <= last]
+            except Exception as e:
+                if not weather.is_no_data(e):
+                    stats["failed"] += 1
+                    logger.error("Backfill of %s from %s to %s failed: %s", city, first.date(), last.date(), e)
+                    continue
+                rows = []
+            await fetched.put(((city, first, last), rows))
+
+    async def write(batch: list):
+        rows = [row for _, unit_rows in batch for row in unit_rows]
+        if rows:
+            try:
+                async with session_factory() as db:
+                    await crud.create_weather_many(db, rows)
+            except Exception as e:
+                stats["failed"] += len(batch)
+                logger.error("Backfill could not store %d rows: %s", len(rows), e)
+                return
+        if checkpoint:
+            try:
+                with open(checkpoint, "a") as out:
+                    for (city, first, last), _ in batch:
+                        out.write(json.dumps({"city": crud.normalize_city(city), "start": first.date().isoformat(),
+                                              "end": last.date().isoformat()}) + "\n")
+                    out.flush()
+                    os.fsync(out.fileno())
+            except OSError as e:
+                stats["not_checkpointed"] += len(batch)
+                logger.error("Backfill stored %d rows but could not checkpoint them: %s", len(rows), e)
+        stats["rows"] += len(rows)
+        stats["completed"] += len(batch)
+        stats["no_data"] += sum(1 for _, unit_rows in batch if not unit_rows)
+
+    async def writer():
+        batch, waiting, last_report = [], 0, time.perf_counter()
+        while True:
+            item = await fetched.get()
+            if item is None:
+                break
+            batch.append(item)
+            waiting += len(item[1])
+            if waiting >= batch_size:
+                await write(batch)
+                batch, waiting = [], 0
+            if time.perf_counter() - last_report >= progress_interval:
+                last_report = time.perf_counter()
+                logger.info("Backfill progress: %d/%d windows, %d rows, %.0f rows/s", stats["completed"],
+                            len(units), stats["rows"], stats["rows"] / (last_report - started))
+        if batch:
+            await write(batch)
+
+    writer_task = asyncio.create_task(writer())
+
+    async def unless_writer_fails(awaitable):
+        # Fetch workers block on the bounded queue once the writer is gone; cancel them and raise its error
+        task = asyncio.ensure_future(awaitable)
+        await asyncio.wait({task, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            writer_task.result()
+        return await task
+
+    try:
+        await unless_writer_fails(asyncio.gather(*(fetch_worker() for _ in range(max(1, concurrency)))))
+        await unless_writer_fails(fetched.put(None))
+        await writer_task
+    finally:
+        if not writer_task.done():
+            writer_task.cancel()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["rows_per_second"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    logger.info("Backfill finished: %s", stats)
+    return stats
+
+def read_cities(names: list, path: str | None) -> list:
+    """
+    Combine cities given on the command line with those in a file, one per line.
+
+    Args:
+        names (list): City names.
+        path (str, optional): A file of city names; blank lines and '#' comments are ignored.
+
+    Returns:
+        list: The city names, in order.
+    """
+    cities = list(names or [])
+    if path:
+        with open(path) as lines:
+            cities += [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    return cities
+
+async def _main(args) -> dict:
+    await weather.open_http_client()
+    try:
+        return await run_backfill(
+            read_cities(args.cities, args.cities_file),
+            datetime.fromisoformat(args.start), datetime.fromisoformat(args.end),
+            concurrency=args.concurrency, batch_size=args.batch_size, checkpoint=args.checkpoint,
+        )
+    finally:
+        await weather.close_http_client()
+        await database.dispose_engines()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", nargs="*", default=[], help="city names")
+    parser.add_argument("--cities-file", help="file with one city name per line")
+    parser.add_argument("--start", required=True, help="first date, YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="last date, YYYY-MM-DD, inclusive")
+    parser.add_argument("--concurrency", type=int, default=4, help="upstream calls in flight")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per insert transaction")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint",
+                        help="progress file to resume from; empty to disable")
+    args = parser.parse_args(argv)
+    if not read_cities(args.cities, args.cities_file):
+        parser.error("no cities given")
+
+    config.configure_logging()
+    Config.validate()
+    database.init_db()
+    print(json.dumps(asyncio.run(_main(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Sentinel stored for keys that are known to have no data
+MISSING = object()
+
+class TTLCache:
+    """
+    A bounded, in-process LRU cache whose entries expire after a time-to-live.
+
+    Entries are evicted least-recently-used first once `maxsize` is reached.
+    Negative entries (see `set_missing`) record that a key has no data, usually
+    with a shorter TTL, so repeated lookups for it can be answered without work.
+    Counters for hits, misses, negative hits, evictions and expirations are kept
+    for monitoring.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0, negative_ttl: float = 60.0,
+                 timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a key, refreshing its LRU position.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any): Returned when the key is absent or expired.
+
+        Returns:
+            Any: The cached value, `MISSING` for a negative entry, or `default`.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._timer():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        if value is MISSING:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to store.
+            ttl (float, optional): Lifetime in seconds; defaults to the cache TTL.
+        """
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (self._timer() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set_missing(self, key: Hashable):
+        """
+        Record that a key has no data, for `negative_ttl` seconds.
+
+        Args:
+            key (Hashable): The cache key.
+        """
+        self.set(key, MISSING, ttl=self.negative_ttl)
+
+    def pop(self, key: Hashable):
+        """
+        Remove a key if present.
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove all entries. Counters are kept.
+        """
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Return the current size and counters.
+
+        Returns:
+            dict: Size, capacity and hit/miss/eviction counters.
+        """
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,270 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+from sqlalchemy import text
+from app import database
+from app.cache import TTLCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """
+    A key-value cache shared by every worker, or every node, that points at it.
+
+    Keys are strings and values bytes. Implementations batch multi-key calls into
+    one round trip and expire entries after the TTL given when they were set.
+    """
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """
+        Look up many keys at once.
+
+        Args:
+            keys (list): The cache keys.
+
+        Returns:
+            dict: Maps the keys that were found and not expired to their values.
+        """
+        raise NotImplementedError
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        """
+        Store many entries at once.
+
+        Args:
+            items (dict): Maps cache keys to values.
+            ttl (float): Lifetime of the entries, in seconds.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Release connections; the backend reconnects if it is used again.
+        """
+
+class MemoryBackend(CacheBackend):
+    """
+    Cache entries in this process only. Useful for tests and single-process runs.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self._cache = TTLCache(maxsize=maxsize)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        for key in keys:
+            value = self._cache.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        for key, value in items.items():
+            self._cache.set(key, value, ttl)
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache entries in a SQLite file, shared by the workers of one host.
+
+    The file is opened with the same pragmas as the main database (WAL, busy
+    timeout), so readers in different processes don't block each other. Expired
+    entries are skipped on read and overwritten on write, and deleted by the first
+    `set_many` every `purge_interval` seconds, so keys that are never set again,
+    like short-lived "no data" entries, don't make the file grow without bound.
+    """
+
+    def __init__(self, path: str = "./weather_cache.db", purge_interval: float = 60.0):
+        self.url = f"sqlite:///{path}"
+        self.purge_interval = purge_interval
+        self._engine = None
+        self._next_purge = 0.0
+        self.purged = 0
+
+    async def _get_engine(self):
+        if self._engine is None:
+            self._engine = database.create_async_db_engine(self.url)
+            async with self._engine.begin() as conn:
+                await conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS cache_entries "
+                    "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+                ))
+                await conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)"
+                ))
+        return self._engine
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        engine = await self._get_engine()
+        placeholders = ", ".join(f":k{i}" for i in range(len(keys)))
+        async with engine.connect() as conn:
+            rows = await conn.execute(
+                text(f"SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) AND expires_at > :now"),
+                {"now": time.time(), **{f"k{i}": key for i, key in enumerate(keys)}},
+            )
+            return {key: bytes(value) for key, value in rows}
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        if not items:
+            return
+        engine = await self._get_engine()
+        now = time.time()
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO cache_entries (key, value, expires_at) VALUES (:key, :value, :expires_at) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+                ),
+                [{"key": key, "value": value, "expires_at": now + ttl} for key, value in items.items()],
+            )
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + self.purge_interval
+                result = await conn.execute(text("DELETE FROM cache_entries WHERE expires_at <= :now"), {"now": now})
+                self.purged += result.rowcount
+
+    async def close(self):
+        if self._engine is not None:
+            engine, self._engine = self._engine, None
+            await engine.dispose()
+
+class RedisError(Exception):
+    """
+    An error reply from a Redis-protocol server.
+    """
+
+def _encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readuntil(b"\r\n")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload
+    if kind == b"-":
+        return RedisError(payload.decode(errors="replace"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply from server: {line!r}")
+
+class RedisBackend(CacheBackend):
+    """
+    Cache entries in a Redis-protocol server (Redis, Valkey, KeyDB, ...) shared by every node.
+
+    Speaks RESP2 over a small pool of connections: a multi-get is a single `MGET`
+    and a multi-set one pipelined write of `SET ... PX` commands. Every call is
+    bounded by `timeout` seconds; a connection that fails is dropped.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", pool_size: int = 10, timeout: float = 0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = []
+        self._slots = None
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password is not None:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            writer.write(b"".join(_encode_command(*command) for command in setup))
+            for _ in setup:
+                reply = await _read_reply(reader)
+                if isinstance(reply, RedisError):
+                    writer.close()
+                    raise reply
+        return reader, writer
+
+    async def _execute(self, commands: list) -> list:
+        # Send the commands in one write and read their replies in order
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            reader, writer = self._idle.pop() if self._idle else await asyncio.wait_for(self._connect(), self.timeout)
+            try:
+                writer.write(b"".join(_encode_command(*command) for command in commands))
+
+                async def replies():
+                    await writer.drain()
+                    return [await _read_reply(reader) for _ in commands]
+
+                result = await asyncio.wait_for(replies(), self.timeout)
+            except BaseException:
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+        for reply in result:
+            if isinstance(reply, RedisError):
+                raise reply
+        return result
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        values, = await self._execute([("MGET", *keys)])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items: Dict[str, bytes], ttl: float):
+        if not items:
+            return
+        milliseconds = max(1, int(ttl * 1000))
+        await self._execute([("SET", key, value, "PX", milliseconds) for key, value in items.items()])
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+def create_backend(name: str, url: Optional[str] = None, timeout: float = 0.5) -> Optional[CacheBackend]:
+    """
+    Create the shared cache backend selected by configuration.
+
+    Args:
+        name (str): "memory", "sqlite" or "redis"; empty or "none" for no shared cache.
+        url (str, optional): The SQLite file path or the `redis://[user:password@]host:port/db` URL.
+        timeout (float): Seconds a Redis call may take.
+
+    Returns:
+        CacheBackend or None: The backend, or `None` when disabled.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    name = (name or "none").lower()
+    if name == "none":
+        return None
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(url or "./weather_cache.db")
+    if name == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0", timeout=timeout)
+    raise ValueError(f"Unknown cache backend: {name!r}. Use memory, sqlite or redis.")
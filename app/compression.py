@@ -0,0 +1,118 @@
+import gzip
+from app import http_cache, profiling
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the content coding for a response from the request's `Accept-Encoding`.
+
+    Args:
+        accept_encoding (str): The request header value.
+
+    Returns:
+        str or None: "br" when the client accepts it and the `brotli` package is
+        installed, else "gzip" if accepted, else None.
+    """
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing the responses of selected paths with brotli or gzip.
+
+    Meant for large JSON documents (batch and range lookups), which are buffered
+    and compressed in one go; small single-row responses are left alone, as are
+    bodies under `minimum_size` bytes and already encoded responses. The strong
+    `ETag` of a compressed body gets a coding suffix (see `http_cache.coded_etag`),
+    and so does that of a 304 answering a request that validated such a tag.
+    """
+
+    def __init__(self, app, paths: Iterable[str], minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    @staticmethod
+    def etag(etag: str, encoding: str, coded: bool, if_none_match: str) -> str:
+        # The tag of a compressed body, or of a 304 confirming the client's compressed copy
+        tagged = http_cache.coded_etag(etag, encoding)
+        if coded or tagged in (candidate.strip() for candidate in if_none_match.split(",")):
+            return tagged
+        return etag
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            response_headers = [(name, value) for name, value in start.get("headers", [])
+                                if name.lower() not in (b"content-length", b"vary")]
+            already_encoded = any(name.lower() == b"content-encoding" for name, _ in response_headers)
+            vary = [value for name, value in start.get("headers", []) if name.lower() == b"vary"]
+            if not any(b"accept-encoding" in value.lower() for value in vary):
+                vary.insert(0, b"Accept-Encoding")
+            coded = False
+            if len(body) >= self.minimum_size and not already_encoded:
+                with profiling.phase("compress"):
+                    body = self.compress(body, encoding)
+                response_headers.append((b"content-encoding", encoding.encode()))
+                coded = True
+            if coded or start["status"] == 304:
+                response_headers = [
+                    (name, self.etag(value.decode("latin-1"), encoding, coded, if_none_match).encode("latin-1"))
+                    if name.lower() == b"etag" else (name, value)
+                    for name, value in response_headers
+                ]
+            response_headers.append((b"content-length", str(len(body)).encode()))
+            response_headers.append((b"vary", b", ".join(vary)))
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,31 @@
+import logging
+import os
+from dotenv import load_dotenv
+
+_environment_loaded = False
+
+def load_environment():
+    """
+    Load variables from a `.env` file into the environment, once per process.
+
+    Variables already set in the environment take precedence over the file.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        load_dotenv()
+        _environment_loaded = True
+
+def configure_logging(level: str | None = None):
+    """
+    Configure the root logger for the service. Modules only create their own loggers.
+
+    Called once at startup (application lifespan, gunicorn master); does nothing
+    if logging was already configured, e.g. by a test runner.
+
+    Args:
+        level (str, optional): Log level name; defaults to `LOG_LEVEL` or "INFO".
+    """
+    logging.basicConfig(
+        level=(level or os.getenv("LOG_LEVEL", "INFO")).upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
@@ -1,21 +1,269 @@
-from sqlalchemy.orm import Session
+import weakref
+from sqlalchemy import delete, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from app import models, schemas
+from app import hourly, metrics, models, schemas
+from app.models import normalize_city
 import logging
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_weather_by_city_and_date(db: Session, city: str, date: datetime):
+# Keys per IN (...) lookup and rows per INSERT, to stay under driver parameter limits
+BATCH_CHUNK_SIZE = 100
+
+# Columns returned by stream_weather, in export order
+EXPORT_COLUMNS = ("id", "city", "date", "min_temp", "max_temp", "avg_temp", "humidity")
+
+# Numeric columns aggregated by get_weather_aggregates
+STATS_COLUMNS = ("min_temp", "max_temp", "avg_temp", "humidity")
+
+# Columns refreshed when an upsert hits an existing (location_id, date) row
+UPSERT_COLUMNS = ("min_temp", "max_temp", "avg_temp", "humidity", "last_accessed_at")
+
+# Columns refreshed when an upsert hits an existing weather_hourly row
+HOURLY_COLUMNS = hourly.HOURLY_FIELDS
+
+# Columns refreshed when an upsert hits an existing location key; the first spelling of the name is kept
+LOCATION_COLUMNS = ("lat", "lon")
+
+# Per database engine, the aliases that may still point at name-only locations (see `adopt_legacy_locations`)
+_legacy_aliases = weakref.WeakKeyDictionary()
+
+def upsert_statement(db: AsyncSession, rows: list, model=models.Weather,
+                     index_elements=("location_id", "date"), update_columns=UPSERT_COLUMNS):
+    """
+    Build an `INSERT ... ON CONFLICT DO UPDATE` statement.
+
+    Args:
+        db (AsyncSession): The session the statement will run on; selects the SQL dialect.
+        rows (list): Dictionaries of column values for `model`.
+        model: The mapped class to insert into; `models.Weather` by default.
+        index_elements (tuple): Columns of the unique index the conflict is detected on.
+        update_columns (tuple): Columns overwritten with the new values on conflict.
+
+    Returns:
+        Insert: The dialect-specific upsert statement.
+
+    Raises:
+        NotImplementedError: If the database has no ON CONFLICT support.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}.")
+
+    stmt = insert(model).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: stmt.excluded[column] for column in update_columns},
+    )
+
+def _location_of(city: str):
+    # Location id the normalized city is an alias of, as a scalar subquery
+    return (
+        select(models.LocationAlias.location_id)
+        .where(models.LocationAlias.alias == normalize_city(city))
+        .scalar_subquery()
+    )
+
+def location_of(weather: schemas.WeatherCreate) -> schemas.LocationCreate:
+    """
+    Return the location a weather record is stored under.
+
+    Args:
+        weather (schemas.WeatherCreate): The record.
+
+    Returns:
+        schemas.LocationCreate: `weather.location`, or a location named after `weather.city`.
+    """
+    return weather.location or schemas.LocationCreate(name=" ".join(weather.city.split()))
+
+def _location_key(location: schemas.LocationCreate) -> str:
+    return models.location_key(location.name, location.region, location.country)
+
+def _is_legacy(alias: str, key: str, region: str | None, country: str | None) -> bool:
+    # Locations created by migrations.add_locations, or from a record without location details
+    return key == alias and region is None and country is None
+
+async def adopt_legacy_locations(db: AsyncSession, weathers: list) -> int:
+    """
+    Merge the name-only locations the aliases of weather records point at into their full locations.
+
+    Databases migrated by `migrations.add_locations` have one location per stored
+    city, keyed by the city alone ("london"), while records fetched since carry
+    the region and country the weather API resolved the city to. When the alias
+    of such a record points at a name-only location, that location is renamed to
+    the full key in place, keeping its id and rows; if the full location already
+    exists, the rows, minus dates it already has, and the aliases of the name-only
+    location are moved to it instead. Either way, rows stored before the migration
+    stay reachable through the alias. Nothing is committed.
+
+    The aliases pointing at name-only locations are loaded once per engine, and
+    dropped once the database shows they point at a full location, so records
+    whose alias was never one of them are not looked up at all.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        weathers (list): `schemas.WeatherCreate` objects.
+
+    Returns:
+        int: The number of locations merged.
+    """
+    engine = db.bind.sync_engine
+    if engine not in _legacy_aliases:
+        _legacy_aliases[engine] = set(await db.scalars(
+            select(models.LocationAlias.alias)
+            .join(models.Location, models.Location.id == models.LocationAlias.location_id)
+            .filter(models.Location.key == models.LocationAlias.alias,
+                    models.Location.region.is_(None), models.Location.country.is_(None))
+        ))
+    candidates = _legacy_aliases[engine]
+
+    wanted = {}
+    for weather in weathers:
+        location = location_of(weather)
+        alias = normalize_city(weather.city)
+        if alias in candidates and _location_key(location) != alias:
+            wanted.setdefault(alias, location)
+    if not wanted:
+        return 0
+
+    legacy = {}
+    aliases = list(wanted)
+    for start in range(0, len(aliases), BATCH_CHUNK_SIZE):
+        result = await db.execute(
+            select(models.LocationAlias.alias, models.Location.id, models.Location.key,
+                   models.Location.region, models.Location.country)
+            .join(models.Location, models.Location.id == models.LocationAlias.location_id)
+            .filter(models.LocationAlias.alias.in_(aliases[start:start + BATCH_CHUNK_SIZE]))
+        )
+        for alias, location_id, *location in result:
+            if _is_legacy(alias, *location):
+                legacy.setdefault(location_id, wanted[alias])
+            else:
+                # Merged and committed, here or by another process
+                candidates.discard(alias)
+
+    for legacy_id, location in legacy.items():
+        key = _location_key(location)
+        target = await db.scalar(select(models.Location.id).filter(models.Location.key == key))
+        if target is None:
+            await db.execute(
+                update(models.Location).where(models.Location.id == legacy_id)
+                .values(key=key, region=location.region, country=location.country, lat=location.lat, lon=location.lon)
+                .execution_options(synchronize_session=False)
+            )
+            continue
+        duplicates = (
+            select(models.Weather.id)
+            .filter(models.Weather.location_id == legacy_id,
+                    models.Weather.date.in_(select(models.Weather.date).filter(models.Weather.location_id == target)))
+            .scalar_subquery()
+        )
+        await db.execute(delete(models.WeatherHourly).where(models.WeatherHourly.weather_id.in_(duplicates))
+                         .execution_options(synchronize_session=False))
+        await db.execute(delete(models.Weather).where(models.Weather.id.in_(duplicates))
+                         .execution_options(synchronize_session=False))
+        for model in (models.Weather, models.LocationAlias):
+            await db.execute(update(model).where(model.location_id == legacy_id).values(location_id=target)
+                             .execution_options(synchronize_session=False))
+        await db.execute(delete(models.Location).where(models.Location.id == legacy_id)
+                         .execution_options(synchronize_session=False))
+    if legacy:
+        logger.info("Merged %d name-only locations into their full locations", len(legacy))
+    return len(legacy)
+
+async def store_locations(db: AsyncSession, weathers: list) -> list:
+    """
+    Upsert the locations of weather records and the aliases that name them.
+
+    Each location is stored once per canonical key, and the normalized `city` of
+    every record is recorded as an alias of its location, so later lookups by any
+    spelling seen so far resolve to the same rows. Name-only locations the aliases
+    still point at are merged first (see `adopt_legacy_locations`). Nothing is
+    committed.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        weathers (list): `schemas.WeatherCreate` objects.
+
+    Returns:
+        list: The (location id, stored location name) of each record, in input order.
+    """
+    await adopt_legacy_locations(db, weathers)
+    candidates = _legacy_aliases[db.bind.sync_engine]
+    locations = {}
+    for weather in weathers:
+        location = location_of(weather)
+        key = _location_key(location)
+        locations.setdefault(key, location)
+        # A record without location details makes a name-only location too
+        if _is_legacy(normalize_city(weather.city), key, location.region, location.country):
+            candidates.add(normalize_city(weather.city))
+
+    rows = [{"key": key, **location.model_dump()} for key, location in locations.items()]
+    ids = {}
+    for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+        stmt = upsert_statement(
+            db, rows[start:start + BATCH_CHUNK_SIZE], model=models.Location,
+            index_elements=("key",), update_columns=LOCATION_COLUMNS,
+        ).returning(models.Location.key, models.Location.id, models.Location.name)
+        ids.update({key: (id, name) for key, id, name in await db.execute(stmt)})
+
+    stored = [ids[_location_key(location_of(weather))] for weather in weathers]
+    aliases = [
+        {"alias": alias, "location_id": location_id}
+        for alias, location_id in {
+            normalize_city(weather.city): location_id for weather, (location_id, _) in zip(weathers, stored)
+        }.items()
+    ]
+    for start in range(0, len(aliases), BATCH_CHUNK_SIZE):
+        await db.execute(upsert_statement(
+            db, aliases[start:start + BATCH_CHUNK_SIZE], model=models.LocationAlias,
+            index_elements=("alias",), update_columns=("location_id",),
+        ))
+    return stored
+
+def _weather_values(weather: schemas.WeatherCreate, location: tuple) -> dict:
+    location_id, name = location
+    return {
+        **weather.model_dump(exclude={"location", "hourly"}),
+        "city": name,
+        "city_key": normalize_city(name),
+        "location_id": location_id,
+        "last_accessed_at": datetime.now(),
+    }
+
+async def store_hourly(db: AsyncSession, series: dict):
+    """
+    Upsert the hourly series of stored weather rows. Nothing is committed.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        series (dict): Maps weather row ids to `schemas.HourlySeries` objects.
+    """
+    rows = [{"weather_id": weather_id, **hourly.to_row(values)} for weather_id, values in series.items()]
+    for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+        await db.execute(upsert_statement(
+            db, rows[start:start + BATCH_CHUNK_SIZE], model=models.WeatherHourly,
+            index_elements=("weather_id",), update_columns=HOURLY_COLUMNS,
+        ))
+
+@metrics.timed_db("get_weather_by_city_and_date")
+async def get_weather_by_city_and_date(db: AsyncSession, city: str, date: datetime):
     """
     Retrieve a weather record for a specific city and date from the database.
 
-    It returns the first matching record, or `None` if no match is found.
+    The city is resolved through the alias index, so " London " and "london" (and any
+    other spelling stored for the same location) find the same record. It returns the
+    first matching record, or `None` if no match is found.
 
     Args:
-        db (Session): The SQLAlchemy session object used for database operations.
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
         city (str): The name of the city for which to retrieve the weather data.
         date (datetime): The specific date for which to retrieve the weather data.
 
@@ -24,38 +272,375 @@ def get_weather_by_city_and_date(db: Session, city: str, date: datetime):
         otherwise `None`.
     """
     try:
-        return db.query(models.Weather).filter(models.Weather.city == city, models.Weather.date == date).first()
+        result = await db.scalars(
+            select(models.Weather)
+            .filter(models.Weather.location_id == _location_of(city), models.Weather.date == date)
+            .limit(1)
+        )
+        return result.first()
     except SQLAlchemyError as e:
         logger.error(f"Error querying weather by city and date: {e}")
         raise
 
-def create_weather(db: Session, weather: schemas.WeatherCreate):
+@metrics.timed_db("create_weather")
+async def create_weather(db: AsyncSession, weather: schemas.WeatherCreate):
     """
-    Create a new weather record in the database.
+    Create or update the weather record for a city and date in the database.
 
-    This function takes a SQLAlchemy database session and a `WeatherCreate` schema object,
-    then creates and stores a new weather record in the database. The function commits 
-    the transaction and refreshes the instance to ensure it contains any updates made by the 
-    database (e.g., generated primary keys).
+    This function takes a SQLAlchemy asyncio session and a `WeatherCreate` schema object,
+    stores its location and the alias of `weather.city` (see `store_locations`), then
+    upserts the record with a single `INSERT ... ON CONFLICT DO UPDATE` keyed on the
+    location and date, so concurrent writers of the same key never create duplicate rows.
+    Its hourly series, if any, is upserted in the same transaction.
+    The stored row is returned through `RETURNING` and the transaction is committed.
 
     Args:
-        db (Session): The SQLAlchemy session object used for database operations.
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
         weather (schemas.WeatherCreate): The Pydantic schema object containing the weather data to be saved.
 
     Returns:
-        models.Weather: The newly created weather record as a SQLAlchemy model instance.
+        models.Weather: The stored weather record as a SQLAlchemy model instance.
     
     Raises:
         Exception: If there is an error creating the weather record.
     """
-    db_weather = models.Weather(**weather.model_dump())
-    
     try:
-        db.add(db_weather)
-        db.commit()
-        db.refresh(db_weather)
+        location, = await store_locations(db, [weather])
+        stmt = upsert_statement(db, [_weather_values(weather, location)]).returning(models.Weather)
+        result = await db.scalars(stmt, execution_options={"populate_existing": True})
+        db_weather = result.one()
+        if weather.hourly is not None:
+            await store_hourly(db, {db_weather.id: weather.hourly})
+        await db.commit()
         return db_weather
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating weather record: {e}")
         raise
+
+@metrics.timed_db("get_weather_range")
+async def get_weather_range(db: AsyncSession, city: str, start: datetime, end: datetime) -> list:
+    """
+    Retrieve the weather records for a city between two dates with one query.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        city (str): The name of the city; resolved through the alias index.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+
+    Returns:
+        list: `models.Weather` instances ordered by date.
+    """
+    try:
+        result = await db.scalars(
+            select(models.Weather)
+            .filter(models.Weather.location_id == _location_of(city), models.Weather.date.between(start, end))
+            .order_by(models.Weather.date)
+        )
+        return list(result)
+    except SQLAlchemyError as e:
+        logger.error(f"Error querying weather range: {e}")
+        raise
+
+@metrics.timed_db("get_weather_many")
+async def get_weather_many(db: AsyncSession, keys: list) -> dict:
+    """
+    Retrieve the weather records for many cities and dates with set-based queries.
+
+    Keys are resolved through the alias index and looked up with `(alias, date) IN (...)`
+    in chunks of `BATCH_CHUNK_SIZE`, instead of one query per key.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        keys (list): (city, date) tuples to look up.
+
+    Returns:
+        dict: Maps (normalized city, date) tuples to `models.Weather` instances.
+        Keys without a record are absent.
+    """
+    wanted = list({(normalize_city(city), date) for city, date in keys})
+    found = {}
+    try:
+        for start in range(0, len(wanted), BATCH_CHUNK_SIZE):
+            chunk = wanted[start:start + BATCH_CHUNK_SIZE]
+            result = await db.execute(
+                select(models.LocationAlias.alias, models.Weather)
+                .join(models.Weather, models.Weather.location_id == models.LocationAlias.location_id)
+                .filter(tuple_(models.LocationAlias.alias, models.Weather.date).in_(chunk))
+            )
+            for alias, weather in result:
+                found[(alias, weather.date)] = weather
+        return found
+    except SQLAlchemyError as e:
+        logger.error(f"Error querying weather for {len(wanted)} keys: {e}")
+        raise
+
+@metrics.timed_db("get_locations")
+async def get_locations(db: AsyncSession, ids) -> dict:
+    """
+    Retrieve locations by id with one query.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        ids: Location ids to look up.
+
+    Returns:
+        dict: Maps location ids to `models.Location` instances.
+    """
+    try:
+        result = await db.scalars(select(models.Location).filter(models.Location.id.in_(list(ids))))
+        return {location.id: location for location in result}
+    except SQLAlchemyError as e:
+        logger.error(f"Error querying locations: {e}")
+        raise
+
+@metrics.timed_db("create_weather_many")
+async def create_weather_many(db: AsyncSession, weathers: list) -> list:
+    """
+    Create or update many weather records in a single transaction.
+
+    Locations and aliases are stored first (see `store_locations`), then rows are written
+    with multi-row `INSERT ... ON CONFLICT DO UPDATE` statements of up to
+    `BATCH_CHUNK_SIZE` rows, followed by their hourly series, and committed once.
+    Records for the same location and date are written once, keeping the last value.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        weathers (list): `schemas.WeatherCreate` objects to be saved.
+
+    Returns:
+        list: The stored weather record of each input, as SQLAlchemy model instances
+        in input order.
+
+    Raises:
+        Exception: If there is an error saving the records; nothing is committed.
+    """
+    rows = {}
+    try:
+        locations = await store_locations(db, weathers)
+        series = {}
+        for weather, location in zip(weathers, locations):
+            values = _weather_values(weather, location)
+            rows[(values["location_id"], values["date"])] = values
+            if weather.hourly is not None:
+                series[(values["location_id"], values["date"])] = weather.hourly
+        rows = list(rows.values())
+
+        stored = {}
+        for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+            stmt = upsert_statement(db, rows[start:start + BATCH_CHUNK_SIZE]).returning(models.Weather)
+            result = await db.scalars(stmt, execution_options={"populate_existing": True})
+            for weather in result:
+                stored[(weather.location_id, weather.date)] = weather
+        await store_hourly(db, {stored[key].id: values for key, values in series.items()})
+        await db.commit()
+        return [stored[(location_id, weather.date)] for weather, (location_id, _) in zip(weathers, locations)]
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error creating {len(rows)} weather records: {e}")
+        raise
+
+@metrics.timed_db("get_weather_hourly")
+async def get_weather_hourly(db: AsyncSession, city: str, date: datetime):
+    """
+    Retrieve the weather record for a city and date together with its hourly series.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        city (str): The name of the city; resolved through the alias index.
+        date (datetime): The date.
+
+    Returns:
+        tuple or None: (`models.Weather`, `models.WeatherHourly` or `None` if the row was
+        stored without hours), or `None` if there is no record.
+    """
+    try:
+        result = await db.execute(
+            select(models.Weather, models.WeatherHourly)
+            .outerjoin(models.WeatherHourly, models.WeatherHourly.weather_id == models.Weather.id)
+            .filter(models.Weather.location_id == _location_of(city), models.Weather.date == date)
+            .limit(1)
+        )
+        row = result.first()
+        return tuple(row) if row is not None else None
+    except SQLAlchemyError as e:
+        logger.error(f"Error querying hourly weather: {e}")
+        raise
+
+@metrics.timed_db("touch_weather")
+async def touch_weather(db: AsyncSession, keys: list, when: datetime) -> int:
+    """
+    Record that weather rows were read, for least-recently-used eviction.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        keys (list): (location id, date) tuples of the rows read.
+        when (datetime): The access time to record.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    updated = 0
+    try:
+        for start in range(0, len(keys), BATCH_CHUNK_SIZE):
+            result = await db.execute(
+                update(models.Weather)
+                .where(tuple_(models.Weather.location_id, models.Weather.date).in_(keys[start:start + BATCH_CHUNK_SIZE]))
+                .values(last_accessed_at=when)
+                .execution_options(synchronize_session=False)
+            )
+            updated += result.rowcount
+        await db.commit()
+        return updated
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error recording access to {len(keys)} weather records: {e}")
+        raise
+
+@metrics.timed_db("get_least_recently_used_weather")
+async def get_least_recently_used_weather(db: AsyncSession, limit: int, before: datetime | None = None) -> list:
+    """
+    List the ids of the weather rows read least recently.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        limit (int): Maximum ids to return.
+        before (datetime, optional): Only rows last read before this time; rows with no
+            recorded access always qualify.
+
+    Returns:
+        list: Row ids, least recently used first.
+    """
+    stmt = select(models.Weather.id)
+    if before is not None:
+        stmt = stmt.where(or_(models.Weather.last_accessed_at < before, models.Weather.last_accessed_at.is_(None)))
+    try:
+        result = await db.scalars(stmt.order_by(models.Weather.last_accessed_at.asc().nulls_first()).limit(limit))
+        return list(result)
+    except SQLAlchemyError as e:
+        logger.error(f"Error listing least recently used weather records: {e}")
+        raise
+
+@metrics.timed_db("delete_weather")
+async def delete_weather(db: AsyncSession, ids: list) -> int:
+    """
+    Delete weather rows and their hourly series in one transaction.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        ids (list): Ids of the rows to delete.
+
+    Returns:
+        int: The number of weather rows deleted.
+    """
+    deleted = 0
+    try:
+        for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[start:start + BATCH_CHUNK_SIZE]
+            await db.execute(delete(models.WeatherHourly).where(models.WeatherHourly.weather_id.in_(chunk))
+                             .execution_options(synchronize_session=False))
+            result = await db.execute(delete(models.Weather).where(models.Weather.id.in_(chunk))
+                                      .execution_options(synchronize_session=False))
+            deleted += result.rowcount
+        await db.commit()
+        return deleted
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.error(f"Error deleting {len(ids)} weather records: {e}")
+        raise
+
+async def stream_weather(db: AsyncSession, city: str | None = None, start: datetime | None = None,
+                         end: datetime | None = None, chunk_size: int = 1000):
+    """
+    Stream stored weather rows in chunks through a server-side cursor.
+
+    Rows are read with `yield_per`, so only one chunk is held in memory at a time
+    regardless of the table size. Plain column tuples are returned instead of ORM
+    instances to keep the per-row cost low.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        city (str, optional): Only rows for this city (resolved through the alias index).
+        start (datetime, optional): Only rows on or after this date.
+        end (datetime, optional): Only rows on or before this date.
+        chunk_size (int): Rows fetched from the cursor per chunk.
+
+    Yields:
+        list: Rows with the columns in `EXPORT_COLUMNS`, ordered by id.
+    """
+    stmt = select(*(getattr(models.Weather, column) for column in EXPORT_COLUMNS)).order_by(models.Weather.id)
+    if city is not None:
+        stmt = stmt.filter(models.Weather.location_id == _location_of(city))
+    if start is not None:
+        stmt = stmt.filter(models.Weather.date >= start)
+    if end is not None:
+        stmt = stmt.filter(models.Weather.date <= end)
+
+    try:
+        result = await db.stream(stmt.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield rows
+    except SQLAlchemyError as e:
+        logger.error(f"Error streaming weather rows: {e}")
+        raise
+
+def _bucket_expression(dialect: str, bucket: str):
+    # First day of the bucket each row falls into, as 'YYYY-MM-DD'
+    date = models.Weather.date
+    if dialect == "sqlite":
+        # Dates are stored as 'YYYY-MM-DD HH:MM:SS...' text; slicing is much cheaper than parsing
+        if bucket == "week":
+            # Monday of the ISO week: advance to Sunday, then go back six days
+            return func.date(date, "weekday 0", "-6 days")
+        if bucket == "month":
+            return func.substr(date, 1, 8) + "01"
+        return func.substr(date, 1, 10)
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc(bucket, date), "YYYY-MM-DD")
+    raise NotImplementedError(f"Aggregations are not supported on {dialect}.")
+
+@metrics.timed_db("get_weather_aggregates")
+async def get_weather_aggregates(db: AsyncSession, cities: list, start: datetime, end: datetime,
+                                 bucket: str = "month") -> list:
+    """
+    Aggregate stored weather per city and calendar bucket with one GROUP BY query.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy asyncio session object used for database operations.
+        cities (list): City names; resolved through the alias index.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+        bucket (str): "day", "week" (starting Monday) or "month".
+
+    Returns:
+        list: Rows with `city_key` (the normalized city), `period_start` ('YYYY-MM-DD'), `days`, and
+        `<column>_mean`, `<column>_min` and `<column>_max` for each column in
+        `STATS_COLUMNS`, ordered by city key and period.
+    """
+    period_start = _bucket_expression(db.get_bind().dialect.name, bucket).label("period_start")
+    aggregates = []
+    for column in STATS_COLUMNS:
+        value = getattr(models.Weather, column)
+        aggregates += [
+            func.avg(value).label(f"{column}_mean"),
+            func.min(value).label(f"{column}_min"),
+            func.max(value).label(f"{column}_max"),
+        ]
+
+    city_key = models.LocationAlias.alias.label("city_key")
+    stmt = (
+        select(city_key, period_start, func.count().label("days"), *aggregates)
+        .join(models.Weather, models.Weather.location_id == models.LocationAlias.location_id)
+        .filter(
+            models.LocationAlias.alias.in_({normalize_city(city) for city in cities}),
+            models.Weather.date.between(start, end),
+        )
+        .group_by(models.LocationAlias.alias, period_start)
+        .order_by(models.LocationAlias.alias, period_start)
+    )
+    try:
+        return list(await db.execute(stmt))
+    except SQLAlchemyError as e:
+        logger.error(f"Error aggregating weather: {e}")
+        raise
@@ -1,15 +1,208 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import DeclarativeMeta
+from app import config
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./weather.db"
+# Load environment variables
+config.load_environment()
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./weather.db")
+
+# Connection pool of server databases (PostgreSQL, MySQL); SQLite file databases use the sizes only
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Run migrations and create tables in the application lifespan. The gunicorn
+# config turns this off for workers and initializes once in the master instead.
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Set on every new SQLite connection. WAL lets readers proceed while a writer commits;
+# busy_timeout comes first so the journal mode switch waits for other connections.
+# auto_vacuum only takes effect on a new, empty database, and must precede the switch
+# to WAL; INCREMENTAL lets the retention job return free pages to the filesystem.
+SQLITE_PRAGMAS = {
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    "auto_vacuum": os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL"),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-64000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+}
+
+# Async drivers used when the configured URL names a synchronous one
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def to_async_url(url: str) -> str:
+    """
+    Convert a database URL to one that uses an asyncio driver.
+
+    URLs that already name a driver (e.g. "sqlite+aiosqlite://") are returned unchanged.
+
+    Args:
+        url (str): A SQLAlchemy database URL.
+
+    Returns:
+        str: The URL with an async driver.
+    """
+    parsed = make_url(url)
+    if "+" in parsed.drivername or parsed.drivername not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername]).render_as_string(hide_password=False)
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """
+    Build the `create_engine` keyword arguments for a database URL.
+
+    Args:
+        url (str): A SQLAlchemy database URL.
+        is_async (bool): Whether the options are for `create_async_engine`.
+
+    Returns:
+        dict: Pool and connection arguments. In-memory SQLite databases keep
+        SQLAlchemy's defaults, since their pool can't be sized.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+
+    options = {} if is_async else {"connect_args": {"check_same_thread": False}}
+    if parsed.database in (None, "", ":memory:"):
+        return options
+    # Keep aiosqlite connections (each owns a worker thread) pooled instead of reopening per session
+    if is_async:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def set_sqlite_pragmas(engine: Engine, pragmas: dict = None):
+    """
+    Run `PRAGMA` statements on every new connection of a SQLite engine.
+
+    Args:
+        engine (Engine): A SQLite engine (for an `AsyncEngine`, its `sync_engine`).
+        pragmas (dict, optional): Pragma names and values; defaults to `SQLITE_PRAGMAS`.
+    """
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def create_db_engine(url: str, pragmas: dict = None) -> Engine:
+    """
+    Create a synchronous engine for `url`, tuned by `engine_options` and `SQLITE_PRAGMAS`.
+
+    Args:
+        url (str): A SQLAlchemy database URL.
+        pragmas (dict, optional): SQLite pragmas overriding `SQLITE_PRAGMAS`.
+
+    Returns:
+        Engine: The new engine.
+    """
+    engine = create_engine(url, **engine_options(url))
+    if engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def create_async_db_engine(url: str, pragmas: dict = None) -> AsyncEngine:
+    """
+    Create an asyncio engine for `url` (see `to_async_url`), tuned like `create_db_engine`.
+
+    Args:
+        url (str): A SQLAlchemy database URL.
+        pragmas (dict, optional): SQLite pragmas overriding `SQLITE_PRAGMAS`.
+
+    Returns:
+        AsyncEngine: The new engine.
+    """
+    url = to_async_url(url)
+    engine = create_async_engine(url, **engine_options(url, is_async=True))
+    if engine.dialect.name == "sqlite":
+        set_sqlite_pragmas(engine.sync_engine, pragmas)
+    return engine
+
+# `engine`, `SessionLocal`, `async_engine` and `AsyncSessionLocal` are created on first
+# use, in the process that uses them: importing the app (e.g. a preloading gunicorn
+# master) opens nothing that forked workers would share.
+_LAZY = {
+    "engine": lambda: create_db_engine(SQLALCHEMY_DATABASE_URL),
+    "SessionLocal": lambda: sessionmaker(autocommit=False, autoflush=False, bind=_get("engine")),
+    "async_engine": lambda: create_async_db_engine(SQLALCHEMY_DATABASE_URL),
+    "AsyncSessionLocal": lambda: async_sessionmaker(_get("async_engine"), autoflush=False, expire_on_commit=False),
+}
+
+def _get(name: str):
+    try:
+        return globals()[name]
+    except KeyError:
+        value = globals()[name] = _LAZY[name]()
+        return value
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def reset_engines():
+    """
+    Close pooled synchronous connections and forget both engines.
+
+    Called in a pre-forking server's master after `init_db`, so that each worker
+    creates its own engines and pools. An async engine, which can only be closed
+    from its event loop, is dropped without closing its connections.
+    """
+    sync_engine = globals().pop("engine", None)
+    if sync_engine is not None:
+        sync_engine.dispose()
+    async_engine = globals().pop("async_engine", None)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
+    globals().pop("SessionLocal", None)
+    globals().pop("AsyncSessionLocal", None)
+
+async def dispose_engines():
+    """
+    Close the connections of both engines and forget them. Called on application shutdown.
+    """
+    async_engine = globals().pop("async_engine", None)
+    if async_engine is not None:
+        await async_engine.dispose()
+    reset_engines()
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base: DeclarativeMeta = declarative_base()
 
 def init_db():
+    """
+    Bring the schema up to date: run pending migrations, then create missing tables.
+    """
+    from app import migrations
+
+    engine = _get("engine")
+    with engine.begin() as conn:
+        migrations.run(conn)
     Base.metadata.create_all(bind=engine)
 
 def get_db():
@@ -31,8 +224,27 @@ def get_db():
             return db.query(Item).all()
     """
 
-    db = SessionLocal()
+    db = _get("SessionLocal")()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    Provides an asyncio database session for dependency injection in FastAPI.
+
+    Queries made through the yielded `AsyncSession` run on an async driver
+    (e.g. aiosqlite), so they don't block the event loop of `async def` endpoints.
+    The session is closed after the request is completed.
+
+    Yields:
+        AsyncSession: A SQLAlchemy asyncio session object.
+
+    Example:
+        @app.get("/items/")
+        async def read_items(db: AsyncSession = Depends(get_async_db)):
+            return (await db.scalars(select(Item))).all()
+    """
+    async with _get("AsyncSessionLocal")() as db:
+        yield db
@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from app import crud, database
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Export formats and their media types
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _ndjson_chunk(rows) -> str:
+    lines = []
+    for row in rows:
+        record = dict(zip(crud.EXPORT_COLUMNS, row))
+        record["date"] = record["date"].isoformat()
+        lines.append(json.dumps(record))
+    return "\n".join(lines) + "\n"
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(crud.EXPORT_COLUMNS)
+    writer.writerows((row[0], row[1], row[2].isoformat(), *row[3:]) for row in rows)
+    return buffer.getvalue()
+
+async def export_weather(format: str, city=None, start=None, end=None, chunk_size: int = 1000):
+    """
+    Serialize stored weather rows as NDJSON or CSV, one chunk at a time.
+
+    The generator opens its own session, since it keeps reading after the endpoint
+    has returned its `StreamingResponse`. Memory use is bounded by `chunk_size`.
+
+    Args:
+        format (str): "ndjson" or "csv".
+        city (str, optional): Only rows for this city.
+        start (datetime, optional): Only rows on or after this date.
+        end (datetime, optional): Only rows on or before this date.
+        chunk_size (int): Rows serialized per yielded chunk.
+
+    Yields:
+        str: Serialized rows; the first CSV chunk starts with a header line.
+    """
+    header = format == "csv"
+    async with database.AsyncSessionLocal() as db:
+        async for rows in crud.stream_weather(db, city, start, end, chunk_size=chunk_size):
+            if format == "csv":
+                yield _csv_chunk(rows, header=header)
+                header = False
+            else:
+                yield _ndjson_chunk(rows)
+    if header:
+        yield _csv_chunk([], header=True)
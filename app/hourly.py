@@ -0,0 +1,133 @@
+import math
+import sys
+from array import array
+from datetime import datetime
+from typing import List, Optional
+from app import schemas
+
+# Fields kept from each `hour` entry of the weather API; the columns of `models.WeatherHourly`
+HOURLY_FIELDS = ("temp_c", "humidity", "precip_mm", "wind_kph", "pressure_mb", "cloud")
+
+HOURS = 24
+
+def pack(values: List[Optional[float]]) -> bytes:
+    """
+    Pack an hourly series into little-endian float32s.
+
+    Args:
+        values (list): One value per hour; `None` for hours without a reading.
+
+    Returns:
+        bytes: 4 bytes per hour, with NaN for missing readings.
+    """
+    packed = array("f", (math.nan if value is None else value for value in values))
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+def unpack(data: bytes) -> List[Optional[float]]:
+    """
+    Unpack a series written by `pack`.
+
+    Args:
+        data (bytes): The packed series.
+
+    Returns:
+        list: One value per hour, `None` where the reading was missing.
+    """
+    values = array("f")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    # float32 holds the API's one-decimal readings only approximately; round back
+    return [None if math.isnan(value) else round(value, 4) for value in values]
+
+def parse_hours(day: dict) -> schemas.HourlySeries | None:
+    """
+    Read the hourly entries of one `forecastday` of a history API response.
+
+    Entries are placed by the hour of their `time` ("YYYY-MM-DD HH:MM", local time),
+    so a day with missing hours still has 24 slots.
+
+    Args:
+        day (dict): A `forecastday` entry.
+
+    Returns:
+        schemas.HourlySeries or None: The series, or `None` if the entry has no hours.
+    """
+    entries = day.get("hour") or []
+    if not entries:
+        return None
+    series = {field: [None] * HOURS for field in HOURLY_FIELDS}
+    for index, entry in enumerate(entries):
+        hour = datetime.strptime(entry["time"], "%Y-%m-%d %H:%M").hour if entry.get("time") else index
+        if not 0 <= hour < HOURS:
+            continue
+        for field in HOURLY_FIELDS:
+            series[field][hour] = entry.get(field)
+    return schemas.HourlySeries(**series)
+
+def to_row(series: schemas.HourlySeries) -> dict:
+    """
+    Pack a series into the column values of `models.WeatherHourly`.
+
+    Args:
+        series (schemas.HourlySeries): The hourly series.
+
+    Returns:
+        dict: Maps each hourly field to its packed bytes.
+    """
+    return {field: pack(getattr(series, field)) for field in HOURLY_FIELDS}
+
+def from_row(row) -> schemas.HourlySeries:
+    """
+    Unpack a stored `models.WeatherHourly` row.
+
+    Args:
+        row: The stored row.
+
+    Returns:
+        schemas.HourlySeries: The hourly series.
+    """
+    return schemas.HourlySeries(**{field: unpack(getattr(row, field)) for field in HOURLY_FIELDS})
+
+def daily_summary(series: schemas.HourlySeries) -> dict:
+    """
+    Derive the daily fields of a weather record from its hourly series.
+
+    Args:
+        series (schemas.HourlySeries): The hourly series.
+
+    Returns:
+        dict: `min_temp`, `max_temp`, `avg_temp` and `humidity` (mean of the hours),
+        each `None` if no hour has a reading.
+    """
+    temps = [value for value in series.temp_c if value is not None]
+    humidity = [value for value in series.humidity if value is not None]
+    return {
+        "min_temp": min(temps) if temps else None,
+        "max_temp": max(temps) if temps else None,
+        "avg_temp": round(sum(temps) / len(temps), 1) if temps else None,
+        "humidity": round(sum(humidity) / len(humidity), 1) if humidity else None,
+    }
+
+def response(city: str, date: datetime, series: schemas.HourlySeries) -> schemas.WeatherHourlyResponse:
+    """
+    Build the `/weather/hourly` response for a day.
+
+    Args:
+        city (str): The stored city name.
+        date (datetime): The date.
+        series (schemas.HourlySeries): The hourly series of that day.
+
+    Returns:
+        schemas.WeatherHourlyResponse: One entry per hour, from 00:00 local time.
+    """
+    hours = [
+        schemas.HourlyObservation(
+            time=date.replace(hour=hour),
+            **{field: getattr(series, field)[hour] for field in HOURLY_FIELDS},
+        )
+        for hour in range(HOURS)
+    ]
+    return schemas.WeatherHourlyResponse(city=city, date=date, hours=hours)
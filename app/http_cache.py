@@ -0,0 +1,99 @@
+import hashlib
+from datetime import date as date_type, datetime
+from typing import Iterable, Optional
+
+# Fields of `schemas.WeatherResponse` that make up its representation; not `id`,
+# which each node's database assigns on its own
+ETAG_FIELDS = ("city", "date", "min_temp", "max_temp", "avg_temp", "humidity")
+
+# Content codings `coded_etag` tags compressed bodies with
+CODINGS = ("gzip", "br")
+
+def etag_for(rows: Iterable) -> str:
+    """
+    Build a strong ETag for one or more stored weather rows.
+
+    The tag is a digest of the row fields rather than of the encoded body, so it
+    can be checked against `If-None-Match` before anything is serialized. Row ids
+    are left out, so nodes with their own databases give the same weather the same
+    tag and a client's copy validates against any of them.
+
+    Args:
+        rows (Iterable): `schemas.WeatherResponse` objects (or ORM rows), in response order.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(repr(tuple(getattr(row, field) for field in ETAG_FIELDS)).encode())
+    return f'"{digest.hexdigest()}"'
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    Derive the entity tag of a compressed body from the tag of the uncompressed one.
+
+    RFC 9110 requires different strong validators for different content codings,
+    so "abc" becomes "abc-gzip". Weak tags may be shared and are returned as is.
+
+    Args:
+        etag (str): The quoted entity tag of the uncompressed body.
+        coding (str): The content coding, e.g. "gzip" or "br".
+
+    Returns:
+        str: The quoted entity tag of the compressed body.
+    """
+    if etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+def _uncoded(opaque: str) -> str:
+    # The tag `coded_etag` derived `opaque` from, or `opaque` itself
+    for coding in CODINGS:
+        if opaque.endswith(f'-{coding}"'):
+            return opaque[:-len(coding) - 2] + '"'
+    return opaque
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Tell whether an `If-None-Match` header matches an entity tag.
+
+    Uses the weak comparison RFC 9110 prescribes for `If-None-Match`, so a `W/`
+    prefix added by an intermediary still matches. Tags of compressed copies of
+    the same body (see `coded_etag`) match too.
+
+    Args:
+        if_none_match (str, optional): The request header value.
+        etag (str): The current entity tag.
+
+    Returns:
+        bool: True if the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(_uncoded(candidate.strip().removeprefix("W/")) == opaque for candidate in if_none_match.split(","))
+
+def cache_control(last_date, max_age: int, recent_max_age: int, today: Optional[date_type] = None) -> str:
+    """
+    Choose the `Cache-Control` header for weather data ending on `last_date`.
+
+    History for a day that is over never changes, so it may be cached for a long
+    time and marked immutable. Today's data is still being collected.
+
+    Args:
+        last_date (datetime or date): The latest date in the response.
+        max_age (int): Seconds past dates may be cached.
+        recent_max_age (int): Seconds today's data may be cached.
+        today (date, optional): The current date; defaults to `date.today()`.
+
+    Returns:
+        str: The header value.
+    """
+    if isinstance(last_date, datetime):
+        last_date = last_date.date()
+    if last_date < (today or date_type.today()):
+        return f"public, max-age={max_age}, immutable"
+    return f"public, max-age={recent_max_age}"
@@ -0,0 +1,50 @@
+import os
+try:
+    import fcntl
+except ImportError:  # Windows: no preforking server, every process leads
+    fcntl = None
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LeaderLock:
+    """
+    Elect one process of a host to run a background job, with an exclusive file lock.
+
+    Under gunicorn every worker runs the application lifespan, so jobs started
+    there run once per worker. Each worker's job calls `acquire` before a run: the
+    first one to lock the file leads and keeps the lock until it stops or exits,
+    when the operating system releases it and the next worker to try takes over.
+    The lock is not shared between hosts.
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.path = os.path.join(directory, f"weather-{name}.lock")
+        self._fd = None
+
+    def acquire(self) -> bool:
+        """
+        Take the lock if no other process holds it, without waiting.
+
+        Returns:
+            bool: True if this process holds the lock.
+        """
+        if self._fd is not None or fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        logger.info("Process %d holds %s", os.getpid(), self.path)
+        return True
+
+    def release(self):
+        """
+        Release the lock if this process holds it.
+        """
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            os.close(fd)
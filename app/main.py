@@ -1,13 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from datetime import datetime
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Union
+import httpx
+import math
 import re
-from app import weather, schemas, database
+from app import compression, config, crud, export, http_cache, metrics, prefetch, profiling, retention, serialization, stats, weather, schemas, database
+from app.resilience import UpstreamUnavailable
 import logging
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WeatherRequest(BaseModel):
@@ -41,44 +45,381 @@ class WeatherRequest(BaseModel):
             raise ValueError("Invalid date. Please ensure the date exists.")
         return value
 
-# Initialize the database
-database.init_db()
+class WeatherBatchRequest(BaseModel):
+    items: List[WeatherRequest] = Field(min_length=1, max_length=weather.Config.BATCH_MAX_ITEMS)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialize the service on startup and release its resources on shutdown.
+
+    Importing this module has no side effects: logging, configuration checks and
+    the database schema are set up here, once per process (the schema only when
+    `INIT_DB_ON_STARTUP` is on). The shared upstream HTTP client is opened so that
+    cache misses reuse pooled keep-alive connections, the shared cache backend is
+    set up if configured, and the cache warmer, write-behind queue and retention
+    job are started when enabled; on shutdown the queue is flushed before the
+    database engines, created on first use by each worker, are closed.
+    """
+    config.configure_logging()
+    weather.Config.validate()
+    if database.INIT_DB_ON_STARTUP:
+        database.init_db()
+    await weather.open_http_client()
+    await weather.open_shared_cache()
+    if weather.Config.WRITE_BEHIND_ENABLED:
+        weather.writer.start()
+    if weather.Config.PREFETCH_ENABLED:
+        prefetch.warmer.start()
+    if weather.Config.RETENTION_ENABLED:
+        retention.job.start()
+    try:
+        yield
+    finally:
+        await retention.job.stop()
+        await prefetch.warmer.stop()
+        await weather.writer.stop()
+        await weather.close_http_client()
+        await weather.close_shared_cache()
+        await database.dispose_engines()
 
-@app.get("/weather", response_model=schemas.WeatherResponse)
-async def get_weather(city: str, date: str, db: Session = Depends(database.get_db)):
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(compression.CompressionMiddleware,
+                   paths=("/weather/batch", "/weather/range", "/weather/hourly"),
+                   minimum_size=weather.Config.COMPRESSION_MINIMUM_SIZE)
+app.add_middleware(metrics.MetricsMiddleware)
+if (weather.Config.SERVER_TIMING_ENABLED or weather.Config.PROFILE_SAMPLE_RATE > 0
+        or weather.Config.PROFILE_TOKEN):
+    app.add_middleware(profiling.TimingMiddleware, server_timing=weather.Config.SERVER_TIMING_ENABLED,
+                       sample_rate=weather.Config.PROFILE_SAMPLE_RATE, profile_token=weather.Config.PROFILE_TOKEN,
+                       directory=weather.Config.PROFILE_DIR, interval=weather.Config.PROFILE_INTERVAL)
+
+# Write-behind answers with records that are not stored yet and have no id; they are only
+# part of the documented schema when it is enabled, so the contract is otherwise unchanged
+if weather.Config.WRITE_BEHIND_ENABLED:
+    WeatherModel = Union[schemas.WeatherResponse, schemas.QueuedWeatherResponse]
+    WeatherBatchModel = schemas.QueuedWeatherBatchResponse
+else:
+    WeatherModel = schemas.WeatherResponse
+    WeatherBatchModel = schemas.WeatherBatchResponse
+
+def upstream_error(e: Exception) -> HTTPException:
+    """
+    Map a failure to reach the weather API to the response the client should see.
+
+    Args:
+        e (Exception): The error raised while fetching weather data.
+
+    Returns:
+        HTTPException: 503 with a `Retry-After` header while the API is not being
+        called (circuit open or rate limited), 502 if the API kept failing,
+        otherwise 500.
+    """
+    if isinstance(e, UpstreamUnavailable):
+        return HTTPException(status_code=503, detail="Weather service is temporarily unavailable. Please try again later.",
+                             headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    if isinstance(e, httpx.HTTPError):
+        return HTTPException(status_code=502, detail="The weather API request failed. Please try again later.")
+    return HTTPException(status_code=500, detail="Internal server error. Please try again later.")
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Expose this process's metrics in the Prometheus text format.
+
+    Returns:
+        Response: Request counts and latencies per route, cache hit/miss counters,
+        upstream call counts and latency, and database operation timings.
+    """
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+def caching_headers(rows: list, last_date: datetime) -> dict:
+    """
+    Build the `ETag` and `Cache-Control` headers for a response made of weather rows.
+
+    Responses including rows still queued for write-behind are marked `no-cache`:
+    once stored, the rows get an id and the response a new body and ETag, which
+    caches must not miss by keeping the queued copy.
+
+    Args:
+        rows (list): The `schemas.WeatherResponse` or `schemas.QueuedWeatherResponse`
+            objects in the response.
+        last_date (datetime): The latest date the response covers.
+
+    Returns:
+        dict: The headers.
+    """
+    if any(row.id is None for row in rows):
+        cache_control = "no-cache"
+    else:
+        cache_control = http_cache.cache_control(last_date, weather.Config.CACHE_CONTROL_MAX_AGE,
+                                                 weather.Config.CACHE_CONTROL_RECENT_MAX_AGE)
+    return {"ETag": http_cache.etag_for(rows), "Cache-Control": cache_control}
+
+@app.get("/weather", response_model=WeatherModel, responses={304: {"description": "Not Modified"}})
+async def get_weather(city: str, date: str, db: AsyncSession = Depends(database.get_async_db),
+                      if_none_match: Optional[str] = Header(default=None)):
     """
     Retrieve weather data for a specific city and date.
 
     Fetches weather data from the database for the specified city and date.
     Raises a 404 error if the data is not found or a 400 error if the date format is invalid.
 
+    Responses carry a strong `ETag` and a `Cache-Control` header that lets past
+    dates be cached for a long time. A request whose `If-None-Match` matches gets
+    an empty 304; for hot-cache hits that involves no database access or encoding.
+    The body is encoded directly from the already validated row (see
+    `serialization.dump_weather`); `response_model` only documents it.
+
     Args:
         city (str): The name of the city.
         date (str): The date in the format "YYYY-MM-DD".
-        db (Session, optional): Database session dependency.
+        db (AsyncSession, optional): Asyncio database session dependency.
+        if_none_match (str, optional): ETags of the copies the client holds.
 
     Returns:
-        schemas.WeatherResponse: The weather data for the city and date.
+        schemas.WeatherResponse: The weather data for the city and date, or an
+        empty 304 response.
 
     Raises:
         HTTPException: 400 if the date format is invalid.
                         404 if weather data is not found.
+                        502 if the weather API keeps failing.
+                        503 if the weather API is temporarily not being called.
     """
     try:
         date_obj = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use 'YYYY-MM-DD'.")
 
+    prefetch.warmer.record(city, date_obj)
     try:
         weather_data = await weather.get_weather(db, city, date_obj)
     except Exception as e:
         logger.error(f"Unexpected error while fetching weather data: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error. Please try again later.")
+        raise upstream_error(e)
     
     if not weather_data:
         logger.info(f"No weather data found for city '{city}' on date '{date}'")
         raise HTTPException(status_code=404, detail="Weather data not found")
 
-    return weather_data
+    headers = caching_headers([weather_data], date_obj)
+    if http_cache.etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    with profiling.phase("serialize"):
+        body = serialization.dump_weather(weather_data)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/weather/hourly", response_model=schemas.WeatherHourlyResponse)
+async def get_weather_hourly(city: str, date: str, db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Retrieve the hourly observations of a city on a date.
+
+    The hours are stored with the daily record, from the same weather API call, so
+    any day already served by `/weather`, `/weather/range` or `/weather/batch` is
+    answered from the database.
+
+    Args:
+        city (str): The name of the city.
+        date (str): The date in the format "YYYY-MM-DD".
+        db (AsyncSession, optional): Asyncio database session dependency.
+
+    Returns:
+        schemas.WeatherHourlyResponse: 24 hourly observations from 00:00 local time;
+        hours without a reading have null values.
+
+    Raises:
+        HTTPException: 400 if the date format is invalid.
+                        404 if hourly data is not found.
+                        502 or 503 if the weather API is failing (see `upstream_error`).
+    """
+    try:
+        date_obj = datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use 'YYYY-MM-DD'.")
+
+    try:
+        observations = await weather.get_weather_hourly(db, city, date_obj)
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching hourly weather data: {e}")
+        raise upstream_error(e)
+
+    if observations is None:
+        logger.info(f"No hourly weather data found for city '{city}' on date '{date}'")
+        raise HTTPException(status_code=404, detail="Hourly weather data not found")
+    return observations
+
+@app.get("/weather/export", response_class=StreamingResponse, responses={
+    200: {"content": {media_type: {} for media_type in export.MEDIA_TYPES.values()}}
+})
+async def export_weather(format: Literal["ndjson", "csv"] = "ndjson", city: Optional[str] = None,
+                         start: Optional[str] = None, end: Optional[str] = None):
+    """
+    Stream every cached weather row as NDJSON or CSV.
+
+    Rows are read through a server-side cursor and written as they arrive, so memory
+    use stays flat however large the table is.
+
+    Args:
+        format (str): "ndjson" (default) or "csv".
+        city (str, optional): Only rows for this city.
+        start (str, optional): Only rows on or after this date, in the format "YYYY-MM-DD".
+        end (str, optional): Only rows on or before this date, in the format "YYYY-MM-DD".
+
+    Returns:
+        StreamingResponse: The rows, ordered by id.
+
+    Raises:
+        HTTPException: 400 if a date format is invalid.
+    """
+    try:
+        start_obj = datetime.strptime(start, "%Y-%m-%d") if start else None
+        end_obj = datetime.strptime(end, "%Y-%m-%d") if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use 'YYYY-MM-DD'.")
+
+    return StreamingResponse(
+        export.export_weather(format, city, start_obj, end_obj),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="weather.{format}"'},
+    )
+
+@app.get("/weather/stats", response_model=schemas.WeatherStatsResponse)
+async def get_weather_stats(start: str, end: str, city: List[str] = Query(max_length=weather.Config.STATS_MAX_CITIES),
+                            bucket: Literal["day", "week", "month"] = "month",
+                            window: Optional[int] = Query(default=None, ge=1, le=366),
+                            db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Retrieve per-city weather statistics over day, week or month buckets.
+
+    Means and extremes of the minimum, maximum and average temperature and humidity
+    are aggregated in the database from the stored daily rows; no data is fetched
+    from the weather API.
+
+    Args:
+        start (str): The first date, in the format "YYYY-MM-DD".
+        end (str): The last date, inclusive, in the format "YYYY-MM-DD".
+        city (List[str]): One or more cities (repeat the parameter).
+        bucket (str): "day", "week" (starting Monday) or "month" (default).
+        window (int, optional): Add a rolling mean over this many buckets.
+        db (AsyncSession, optional): Asyncio database session dependency.
+
+    Returns:
+        schemas.WeatherStatsResponse: One entry per city and bucket that has data.
+
+    Raises:
+        HTTPException: 400 if a date is invalid or the range is reversed.
+    """
+    try:
+        start_obj = datetime.strptime(start, "%Y-%m-%d")
+        end_obj = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use 'YYYY-MM-DD'.")
+    if end_obj < start_obj:
+        raise HTTPException(status_code=400, detail="End date must not be before start date.")
+
+    try:
+        return await stats.get_weather_stats(db, city, start_obj, end_obj, bucket, window)
+    except Exception as e:
+        logger.error(f"Unexpected error while computing weather stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error. Please try again later.")
+
+@app.get("/weather/range", response_model=List[WeatherModel], responses={304: {"description": "Not Modified"}})
+async def get_weather_range(city: str, start: str, end: str, db: AsyncSession = Depends(database.get_async_db),
+                            if_none_match: Optional[str] = Header(default=None)):
+    """
+    Retrieve daily weather data for a city over a date range.
+
+    Stored days are read with one query; only the missing days are fetched from the
+    weather API, using as few ranged calls as possible. Caching headers and
+    `If-None-Match` work as for `/weather`; large responses are compressed.
+
+    Args:
+        city (str): The name of the city.
+        start (str): The first date, in the format "YYYY-MM-DD".
+        end (str): The last date, inclusive, in the format "YYYY-MM-DD".
+        db (AsyncSession, optional): Asyncio database session dependency.
+        if_none_match (str, optional): ETags of the copies the client holds.
+
+    Returns:
+        List[schemas.WeatherResponse]: The weather data for each day with data, ordered by date,
+        or an empty 304 response.
+
+    Raises:
+        HTTPException: 400 if a date is invalid, the range is reversed or longer than
+                        `RANGE_MAX_DAYS` days.
+                        500 if the data cannot be stored.
+                        502 or 503 if the weather API is failing (see `upstream_error`).
+    """
+    try:
+        start_obj = datetime.strptime(start, "%Y-%m-%d")
+        end_obj = datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use 'YYYY-MM-DD'.")
+
+    if end_obj < start_obj:
+        raise HTTPException(status_code=400, detail="End date must not be before start date.")
+    if (end_obj - start_obj).days >= weather.Config.RANGE_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range cannot exceed {weather.Config.RANGE_MAX_DAYS} days.")
+
+    try:
+        days = await weather.get_weather_range(db, city, start_obj, end_obj)
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching weather range: {e}")
+        raise upstream_error(e)
+
+    headers = caching_headers(days, end_obj)
+    if http_cache.etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    with profiling.phase("serialize"):
+        body = serialization.dump_weather_list(days)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.post("/weather/batch", response_model=WeatherBatchModel)
+async def get_weather_batch(request: WeatherBatchRequest, db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Retrieve weather data for many city and date pairs in one request.
+
+    Cached pairs are resolved with a single set-based query; the rest are fetched
+    from the weather API concurrently and saved in one transaction. Each item gets
+    its own status, so a failing pair does not fail the whole batch.
+
+    Args:
+        request (WeatherBatchRequest): The city and date pairs, in "YYYY-MM-DD" format.
+        db (AsyncSession, optional): Asyncio database session dependency.
+
+    Returns:
+        schemas.WeatherBatchResponse: One result per requested item, in request order,
+        with status "ok", "not_found" or "error".
+
+    Raises:
+        HTTPException: 500 if the cached pairs cannot be looked up.
+    """
+    items = [(item.city, datetime.strptime(item.date, "%Y-%m-%d")) for item in request.items]
+
+    try:
+        found = await weather.get_weather_batch(db, items)
+    except Exception as e:
+        logger.error(f"Unexpected error while fetching batch weather data: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error. Please try again later.")
+
+    # The write-behind variants also accept rows still queued; stored rows serialize the same either way
+    results = []
+    for item, (city, date_obj) in zip(request.items, items):
+        outcome = found[(crud.normalize_city(city), date_obj)]
+        if isinstance(outcome, UpstreamUnavailable):
+            result = schemas.QueuedWeatherBatchResult(city=item.city, date=item.date, status="error",
+                                                      error="Weather service is temporarily unavailable.")
+        elif isinstance(outcome, Exception):
+            result = schemas.QueuedWeatherBatchResult(city=item.city, date=item.date, status="error",
+                                                      error="Failed to fetch weather data.")
+        elif outcome is None:
+            result = schemas.QueuedWeatherBatchResult(city=item.city, date=item.date, status="not_found")
+        else:
+            result = schemas.QueuedWeatherBatchResult(city=item.city, date=item.date, status="ok", data=outcome)
+        results.append(result)
+
+    # Already validated; serialize once instead of re-validating through response_model
+    with profiling.phase("serialize"):
+        body = schemas.QueuedWeatherBatchResponse(results=results).model_dump_json()
+    return Response(body, media_type="application/json")
@@ -0,0 +1,247 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Sequence, Tuple
+from app import profiling
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        """
+        Return the child for a set of label values, creating it on first use.
+
+        Keep the returned child around on hot paths to skip the lookup.
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class Counter(_Metric):
+    """A monotonically increasing count, optionally split by labels."""
+    type = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}_total{_format_labels(self.labelnames, values)} {child.value}"]
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+class Histogram(_Metric):
+    """A distribution of observed values (e.g. latencies) over cumulative buckets."""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), child.counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class CallbackMetric:
+    """
+    A gauge or counter whose value is read from a callback at scrape time.
+
+    Used to expose state that is already tracked elsewhere (cache sizes and
+    counters) without adding work to the code that updates it.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], type: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.type = type
+
+    def render(self) -> list:
+        suffix = "_total" if self.type == "counter" else ""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            f"{self.name}{suffix} {float(self.callback())}",
+        ]
+
+class Registry:
+    """A collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], float],
+                 type: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, type))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Metrics of this process, served by GET /metrics
+REGISTRY = Registry()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests", "HTTP requests handled, by route, method and status.", ("route", "method", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency, by route, method and status.", ("route", "method", "status"))
+WEATHER_LOOKUPS = REGISTRY.counter(
+    "weather_lookups", "Weather lookups, by where the answer came from.", ("source",))
+SHARED_CACHE_ERRORS = REGISTRY.counter(
+    "shared_cache_errors", "Shared cache calls that failed and were treated as misses, by operation.", ("operation",))
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "upstream_requests", "Weather API calls, by HTTP status or 'error' for network failures.", ("status",))
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "upstream_retries", "Weather API calls retried, by the status or 'error' that caused the retry.", ("reason",))
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "upstream_request_duration_seconds", "Weather API call latency.")
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database operation latency, by crud operation.", ("operation",))
+
+def timed_db(operation: str):
+    """
+    Decorate an async crud function to record its duration in `DB_QUERY_SECONDS`,
+    and as a phase of the request being timed (see `profiling.record`).
+
+    Args:
+        operation (str): The `operation` label value.
+    """
+    child = DB_QUERY_SECONDS.labels(operation)
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child.observe(elapsed)
+                profiling.record(operation, elapsed)
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts and latency per route template.
+
+    Routes are labelled with their path template (e.g. "/weather/range") rather
+    than the raw URL, so query strings and unknown paths can't explode the number
+    of series. Latency runs until the last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            labels = (route, scope["method"], str(status))
+            HTTP_REQUESTS.labels(*labels).inc()
+            HTTP_REQUEST_SECONDS.labels(*labels).observe(time.perf_counter() - start)
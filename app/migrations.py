@@ -0,0 +1,138 @@
+from datetime import datetime
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.engine import Connection
+from app import models
+from app.models import normalize_city
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_weather_city_key(conn: Connection) -> bool:
+    """
+    Add the normalized `city_key` column and the unique (city_key, date) index.
+
+    Databases created before the column existed may hold duplicate rows for the
+    same city and date; all but the oldest row of each group are deleted before
+    the unique index is built. The separate `city` index is dropped, since the
+    composite index covers lookups by city.
+
+    Args:
+        conn (Connection): An open connection inside a transaction.
+
+    Returns:
+        bool: True if the database was migrated, False if it was already up to date.
+    """
+    inspector = inspect(conn)
+    if "weather" not in inspector.get_table_names():
+        return False
+    if "city_key" in {column["name"] for column in inspector.get_columns("weather")}:
+        return False
+
+    conn.execute(text("ALTER TABLE weather ADD COLUMN city_key VARCHAR"))
+    rows = conn.execute(text("SELECT id, city FROM weather")).all()
+    if rows:
+        conn.execute(
+            text("UPDATE weather SET city_key = :city_key WHERE id = :id"),
+            [{"id": id, "city_key": normalize_city(city)} for id, city in rows],
+        )
+    removed = conn.execute(text(
+        "DELETE FROM weather WHERE id NOT IN (SELECT MIN(id) FROM weather GROUP BY city_key, date)"
+    )).rowcount
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE weather ALTER COLUMN city_key SET NOT NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_weather_city"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_weather_city_key_date ON weather (city_key, date)"))
+
+    logger.info("Added weather.city_key to %d rows and removed %d duplicates", len(rows), removed)
+    return True
+
+def add_locations(conn: Connection) -> bool:
+    """
+    Create the `locations` and `location_aliases` tables and key weather rows by location.
+
+    Every distinct `city_key` already stored becomes a location of its own, with
+    the key itself as its only alias, and its rows are assigned to it. The unique
+    (city_key, date) index is replaced by the unique (location_id, date) index.
+
+    Args:
+        conn (Connection): An open connection inside a transaction.
+
+    Returns:
+        bool: True if the database was migrated, False if it was already up to date.
+    """
+    inspector = inspect(conn)
+    if "weather" not in inspector.get_table_names():
+        return False
+    if "location_id" in {column["name"] for column in inspector.get_columns("weather")}:
+        return False
+
+    models.Location.__table__.create(conn, checkfirst=True)
+    models.LocationAlias.__table__.create(conn, checkfirst=True)
+    conn.execute(text("ALTER TABLE weather ADD COLUMN location_id INTEGER REFERENCES locations (id)"))
+
+    cities = conn.execute(text("SELECT city_key, MIN(city) FROM weather GROUP BY city_key")).all()
+    for city_key, city in cities:
+        location_id = conn.execute(
+            text("INSERT INTO locations (key, name) VALUES (:key, :name) RETURNING id"),
+            {"key": city_key, "name": city},
+        ).scalar_one()
+        conn.execute(
+            text("INSERT INTO location_aliases (alias, location_id) VALUES (:alias, :location_id)"),
+            {"alias": city_key, "location_id": location_id},
+        )
+    conn.execute(text(
+        "UPDATE weather SET location_id = "
+        "(SELECT location_id FROM location_aliases WHERE alias = weather.city_key)"
+    ))
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE weather ALTER COLUMN location_id SET NOT NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_weather_city_key_date"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_weather_location_id_date ON weather (location_id, date)"))
+
+    logger.info("Created %d locations for existing weather rows", len(cities))
+    return True
+
+def add_weather_last_accessed_at(conn: Connection) -> bool:
+    """
+    Add and index `weather.last_accessed_at`, used by the retention job.
+
+    Existing rows count as accessed now, so that none of them is evicted as the
+    least recently used before it has had a chance to be read.
+
+    Args:
+        conn (Connection): An open connection inside a transaction.
+
+    Returns:
+        bool: True if the database was migrated, False if it was already up to date.
+    """
+    inspector = inspect(conn)
+    if "weather" not in inspector.get_table_names():
+        return False
+    if "last_accessed_at" in {column["name"] for column in inspector.get_columns("weather")}:
+        return False
+
+    # DATETIME on SQLite, TIMESTAMP WITHOUT TIME ZONE on PostgreSQL
+    column_type = DateTime().compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE weather ADD COLUMN last_accessed_at {column_type}"))
+    updated = conn.execute(models.Weather.__table__.update().values(last_accessed_at=datetime.now())).rowcount
+    conn.execute(text("CREATE INDEX ix_weather_last_accessed_at ON weather (last_accessed_at)"))
+
+    logger.info("Added weather.last_accessed_at to %d rows", updated)
+    return True
+
+# Applied in order by `run`; each step checks whether it is still needed
+MIGRATIONS = [
+    add_weather_city_key,
+    add_locations,
+    add_weather_last_accessed_at,
+]
+
+def run(conn: Connection):
+    """
+    Bring an existing database schema up to date.
+
+    Args:
+        conn (Connection): An open connection inside a transaction.
+    """
+    for migration in MIGRATIONS:
+        migration(conn)
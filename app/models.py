@@ -1,16 +1,98 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, LargeBinary
 from app.database import Base
 
+def normalize_city(city: str) -> str:
+    """
+    Normalize a city name for use as a lookup key.
+
+    Surrounding whitespace is stripped, inner whitespace collapsed and case folded,
+    so that " London " and "london" map to the same key.
+
+    Args:
+        city (str): The city name as given by the caller.
+
+    Returns:
+        str: The normalized city key.
+    """
+    return " ".join(city.split()).casefold()
+
+def location_key(name: str, region: str | None = None, country: str | None = None) -> str:
+    """
+    Build the canonical key of a location from its name, region and country.
+
+    Args:
+        name (str): The location name.
+        region (str, optional): The region, state or province.
+        country (str, optional): The country.
+
+    Returns:
+        str: The normalized "name, region, country" key; empty parts are left out.
+    """
+    return normalize_city(", ".join(part for part in (name, region, country) if part))
+
+def _default_city_key(context):
+    return normalize_city(context.get_current_parameters()["city"])
+
+class Location(Base):
+    __tablename__ = "locations"
+
+    id = Column(Integer, primary_key=True)
+    # location_key(name, region, country); one row per place the weather API resolves to
+    key = Column(String, nullable=False, unique=True)
+    name = Column(String, nullable=False)
+    region = Column(String)
+    country = Column(String)
+    lat = Column(Float)
+    lon = Column(Float)
+
+    def __repr__(self):
+        return f"<Location(id={self.id}, key='{self.key}')>"
+
+class LocationAlias(Base):
+    __tablename__ = "location_aliases"
+
+    # Normalized user input, e.g. "london" or "london, uk"
+    alias = Column(String, primary_key=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<LocationAlias(alias='{self.alias}', location_id={self.location_id})>"
+
 class Weather(Base):
     __tablename__ = "weather"
+    __table_args__ = (
+        # One row per location and date; also serves the hit-path lookup
+        Index("ix_weather_location_id_date", "location_id", "date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    city = Column(String, index=True, nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+    city = Column(String, nullable=False)
+    # Normalized `city`, the canonical location name; lookups go through location_aliases
+    city_key = Column(String, nullable=False, default=_default_city_key)
     date = Column(DateTime, index=True, nullable=False)
     min_temp = Column(Float, default=0.0)
     max_temp = Column(Float, default=0.0)
     avg_temp = Column(Float, default=0.0)
     humidity = Column(Float, default=0.0)
+    # When the row was stored or last read; the retention job evicts the least recently used rows
+    last_accessed_at = Column(DateTime, index=True, default=datetime.now)
 
     def __repr__(self):
         return f"<Weather(id={self.id}, city='{self.city}', date={self.date}, min_temp={self.min_temp}, max_temp={self.max_temp}, avg_temp={self.avg_temp}, humidity={self.humidity})>"
+
+class WeatherHourly(Base):
+    __tablename__ = "weather_hourly"
+
+    # One row per daily weather row; each column packs 24 float32 values (see app.hourly)
+    weather_id = Column(Integer, ForeignKey("weather.id", ondelete="CASCADE"), primary_key=True)
+    temp_c = Column(LargeBinary, nullable=False)
+    humidity = Column(LargeBinary, nullable=False)
+    precip_mm = Column(LargeBinary, nullable=False)
+    wind_kph = Column(LargeBinary, nullable=False)
+    pressure_mb = Column(LargeBinary, nullable=False)
+    cloud = Column(LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<WeatherHourly(weather_id={self.weather_id})>"
@@ -0,0 +1,207 @@
+import asyncio
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from app import crud, database, metrics, weather
+from app.leader import LeaderLock
+from app.weather import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmer:
+    """
+    Periodically pre-populate the weather cache for popular cities and recent dates.
+
+    Cities come from `cities` when configured, otherwise from the most requested
+    cities seen by `record`. Each run fetches the missing (city, date) pairs through
+    `weather.get_weather`, with at most `concurrency` calls in flight and at most
+    `budget` upstream calls. Keys it warmed are remembered so that the first user
+    request for one of them counts as a prevented miss.
+
+    In the background, only the worker holding `lock` warms (see
+    `leader.LeaderLock`), so `budget` is the upstream quota per run for the whole
+    host rather than per worker. The other workers try to take the lock every
+    `lock_interval` seconds, so one of them takes over soon after the leader
+    exits. The most requested cities are then those seen by the leader, which gets
+    its share of the traffic, and prevented misses are only counted for the
+    requests it serves, since the other workers don't know which keys it warmed.
+    """
+
+    def __init__(self, cities=None, top=20, days=1, interval=3600.0, concurrency=4, budget=100,
+                 max_tracked=1000, session_factory=None, lock=None, lock_interval=30.0):
+        self.cities = list(cities or [])
+        self.top = top
+        self.days = days
+        self.interval = interval
+        self.concurrency = concurrency
+        self.budget = budget
+        self.max_tracked = max_tracked
+        self._session_factory = session_factory
+        self.lock = lock
+        self.lock_interval = lock_interval
+        self._counts = Counter()
+        self._names = {}
+        self._warmed = OrderedDict()
+        self._task = None
+        self.runs = 0
+        self.fetched = 0
+        self.already_cached = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.prevented_misses = 0
+
+    def _session(self):
+        return (self._session_factory or database.AsyncSessionLocal)()
+
+    def record(self, city: str, date: datetime):
+        """
+        Count a user request for a city, and whether the warmer already fetched it.
+
+        Args:
+            city (str): The city as requested.
+            date (datetime): The requested date.
+        """
+        city_key = crud.normalize_city(city)
+        self._counts[city_key] += 1
+        self._names[city_key] = city
+        if self._warmed.pop((city_key, date), None) is not None:
+            self.prevented_misses += 1
+
+        if len(self._counts) > self.max_tracked:
+            # Forget the long tail, keeping the most requested half
+            keep = dict(self._counts.most_common(self.max_tracked // 2))
+            self._counts = Counter(keep)
+            self._names = {key: self._names[key] for key in keep}
+
+    def targets(self, today: datetime | None = None) -> list:
+        """
+        List the (city, date) pairs the next run should make sure are cached.
+
+        Args:
+            today (datetime, optional): Reference day; defaults to the current date.
+
+        Returns:
+            list: (city, date) tuples, most popular cities first, most recent dates first.
+        """
+        today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        cities = self.cities or [self._names[key] for key, _ in self._counts.most_common(self.top)]
+        dates = [today - timedelta(days=offset) for offset in range(1, self.days + 1)]
+        return [(city, date) for date in dates for city in cities]
+
+    async def run_once(self, today: datetime | None = None) -> int:
+        """
+        Warm the cache once.
+
+        Args:
+            today (datetime, optional): Reference day; defaults to the current date.
+
+        Returns:
+            int: The number of pairs fetched from the upstream API.
+        """
+        targets = self.targets(today)
+        if not targets:
+            return 0
+
+        async with self._session() as db:
+            cached = await crud.get_weather_many(db, targets)
+        missing = [(city, date) for city, date in targets if (crud.normalize_city(city), date) not in cached]
+        self.already_cached += len(targets) - len(missing)
+        self.over_budget += max(0, len(missing) - self.budget)
+        missing = missing[:self.budget]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fetched = 0
+
+        async def warm(city, date):
+            nonlocal fetched
+            async with semaphore:
+                try:
+                    async with self._session() as db:
+                        weather_data = await weather.get_weather(db, city, date)
+                except Exception as e:
+                    self.failed += 1
+                    logger.warning("Cache warming failed for %s on %s: %s", city, date.date(), e)
+                    return
+            fetched += 1
+            if weather_data is not None:
+                self._warmed[(crud.normalize_city(city), date)] = True
+                while len(self._warmed) > self.max_tracked:
+                    self._warmed.popitem(last=False)
+
+        await asyncio.gather(*(warm(city, date) for city, date in missing))
+        self.runs += 1
+        self.fetched += fetched
+        logger.info("Cache warming run fetched %d of %d pairs (%d already cached)",
+                    fetched, len(targets), len(targets) - len(missing))
+        return fetched
+
+    async def _loop(self):
+        while True:
+            try:
+                if self.lock is not None and not self.lock.acquire():
+                    await asyncio.sleep(self.lock_interval)
+                    continue
+                await self.run_once()
+            except Exception as e:
+                logger.error("Cache warming run failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Start warming in the background, once now and then every `interval` seconds.
+
+        A worker that doesn't hold `lock` only tries to take it, every `lock_interval` seconds.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """
+        Stop the background task, waiting for it to finish.
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.lock is not None:
+            self.lock.release()
+
+    def stats(self) -> dict:
+        """
+        Return the warming counters.
+
+        Returns:
+            dict: Runs, pairs fetched, already cached, failed and skipped for budget,
+            user misses prevented and the number of tracked cities.
+        """
+        return {
+            "running": self._task is not None,
+            "runs": self.runs,
+            "fetched": self.fetched,
+            "already_cached": self.already_cached,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "prevented_misses": self.prevented_misses,
+            "tracked_cities": len(self._counts),
+        }
+
+warmer = CacheWarmer(
+    cities=Config.PREFETCH_CITIES,
+    top=Config.PREFETCH_TOP_CITIES,
+    days=Config.PREFETCH_DAYS,
+    interval=Config.PREFETCH_INTERVAL,
+    concurrency=Config.PREFETCH_CONCURRENCY,
+    budget=Config.PREFETCH_BUDGET,
+    lock=LeaderLock("prefetch", Config.LOCK_DIR),
+    lock_interval=Config.PREFETCH_LOCK_INTERVAL,
+)
+
+metrics.REGISTRY.callback("prefetch_fetched", "Pairs fetched by the cache warmer.",
+                          lambda: warmer.fetched, type="counter")
+metrics.REGISTRY.callback("prefetch_failed", "Cache warmer fetches that failed.",
+                          lambda: warmer.failed, type="counter")
+metrics.REGISTRY.callback("prefetch_prevented_misses", "User requests answered from keys the cache warmer fetched, counted by the worker that warms.",
+                          lambda: warmer.prevented_misses, type="counter")
@@ -0,0 +1,205 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Phase durations of the request being timed, in seconds; None outside timed requests
+_phases: ContextVar[Optional[dict]] = ContextVar("phases", default=None)
+
+def record(name: str, seconds: float):
+    """
+    Add time spent in a phase to the request being timed, if any.
+
+    Args:
+        name (str): The phase name, e.g. a crud operation or "upstream".
+        seconds (float): The time spent.
+    """
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+class phase:
+    """
+    Time a block as a phase of the current request: `with profiling.phase("serialize"): ...`
+
+    Outside timed requests this is a context variable lookup and nothing else.
+    """
+    __slots__ = ("name", "phases", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.phases = _phases.get()
+        if self.phases is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.phases is not None:
+            self.phases[self.name] = self.phases.get(self.name, 0.0) + time.perf_counter() - self.start
+
+def server_timing(phases: dict) -> str:
+    """
+    Format phase durations as a `Server-Timing` header value.
+
+    Args:
+        phases (dict): Maps phase names to seconds.
+
+    Returns:
+        str: e.g. "get_weather_by_city_and_date;dur=0.812, upstream;dur=120.3", in milliseconds.
+    """
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in phases.items())
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold(frame) -> str:
+    """
+    Collapse a stack into one line of the folded format read by flame graph tools.
+
+    Args:
+        frame: The innermost frame.
+
+    Returns:
+        str: Frame names from the outermost to `frame`, separated by ";".
+    """
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Sampler:
+    """
+    Sample the stack of one thread from a background thread every `interval` seconds.
+
+    Stacks are counted in the folded format (`frame;frame;frame count`), which
+    flamegraph.pl, speedscope and inferno render directly. For the event loop
+    thread, samples show whatever the loop runs while the sampler is active,
+    including other requests in flight and the selector waiting for I/O.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        """
+        Stop sampling.
+
+        Returns:
+            Counter: Maps folded stacks to the number of samples they were seen in.
+        """
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def dump(self, path: str):
+        """
+        Write the samples in the folded format, one stack per line.
+
+        Args:
+            path (str): The output file.
+        """
+        with open(path, "w") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+class TimingMiddleware:
+    """
+    ASGI middleware breaking request time down into phases, with opt-in profiling.
+
+    With `server_timing`, phases recorded during the request (database operations
+    via `metrics.timed_db`, upstream calls, serialization, ...) are returned in a
+    `Server-Timing` header, which browsers' developer tools display, and logged as
+    one JSON line per request. Requests carrying `X-Profile: <profile_token>`,
+    and a `sample_rate` fraction of all requests, are also run under a `Sampler`
+    whose folded stacks are written to `directory`; the file name is returned in
+    an `X-Profile-Id` header.
+
+    The middleware is only installed when one of these is enabled.
+    """
+
+    def __init__(self, app, server_timing: bool = True, sample_rate: float = 0.0,
+                 profile_token: str | None = None, directory: str = "./profiles", interval: float = 0.001):
+        self.app = app
+        self.server_timing = server_timing
+        self.sample_rate = sample_rate
+        self.profile_token = profile_token.encode() if profile_token else None
+        self.directory = directory
+        self.interval = interval
+
+    def _should_profile(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if self.profile_token is None:
+            return False
+        return any(name == b"x-profile" and value == self.profile_token for name, value in scope["headers"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases = {}
+        token = _phases.set(phases)
+        sampler = Sampler(interval=self.interval).start() if self._should_profile(scope) else None
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{id(phases):x}.folded" if sampler else None
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if self.server_timing:
+                    timings = {**phases, "total": time.perf_counter() - start}
+                    headers.append((b"server-timing", server_timing(timings).encode()))
+                if profile_id:
+                    headers.append((b"x-profile-id", profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _phases.reset(token)
+            elapsed = time.perf_counter() - start
+            if sampler is not None:
+                sampler.stop()
+                os.makedirs(self.directory, exist_ok=True)
+                sampler.dump(os.path.join(self.directory, profile_id))
+            if self.server_timing:
+                logger.info("request timing %s", json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status,
+                    "total_ms": round(elapsed * 1000, 3),
+                    "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+                    **({"profile": profile_id} if profile_id else {}),
+                }))
@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from typing import Callable, Optional
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised instead of calling the weather API when it cannot be called right now.
+
+    Attributes:
+        retry_after (float): Seconds after which a new attempt may succeed.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(UpstreamUnavailable):
+    """The circuit breaker is open because recent upstream calls kept failing."""
+
+class RateLimitExceeded(UpstreamUnavailable):
+    """No rate-limit token would become available within the allowed wait."""
+
+class TokenBucket:
+    """
+    A client-side rate limiter allowing `rate` calls per second with bursts of `capacity`.
+
+    Callers wait for a token in arrival order. Waits that would exceed `max_wait`
+    fail fast with `RateLimitExceeded` instead of piling up behind the quota.
+    A `rate` of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, max_wait: float = 5.0,
+                 timer: Callable[[], float] = time.monotonic, sleep=asyncio.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.max_wait = max_wait
+        self._timer = timer
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = timer()
+        # Calls that had to wait for a token, calls rejected, and total seconds waited
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = self._timer()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def tokens(self) -> float:
+        """Return the tokens currently available."""
+        if not self.enabled:
+            return float("inf")
+        self._refill()
+        return self._tokens
+
+    async def acquire(self):
+        """
+        Take one token, waiting for it if the bucket is empty.
+
+        The token is reserved before waiting (the balance may go negative), so
+        concurrent callers are spaced out instead of all waking at once.
+
+        Raises:
+            RateLimitExceeded: If the wait for a token would exceed `max_wait`.
+        """
+        if not self.enabled:
+            return
+        self._refill()
+        wait = (1.0 - self._tokens) / self.rate
+        if wait <= 0:
+            self._tokens -= 1.0
+            return
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise RateLimitExceeded("Weather API rate limit reached.", retry_after=wait)
+        self._tokens -= 1.0
+        self.throttled += 1
+        self.wait_seconds += wait
+        await self._sleep(wait)
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are
+    rejected with `CircuitOpenError` for `reset_timeout` seconds. Then it turns
+    half-open and lets `half_open_max_calls` trial calls through: a success closes
+    it again, a failure reopens it for another `reset_timeout`. A trial call that
+    never reports back (e.g. it was cancelled) frees its slot after `reset_timeout`.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1,
+                 timer: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._timer = timer
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_at = 0.0
+        # Times the circuit opened, and calls rejected while it was open
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._timer() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    def before_call(self):
+        """
+        Check that a call may go ahead.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all trial calls taken.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return
+        if state == self.HALF_OPEN:
+            now = self._timer()
+            if self._trials >= self.half_open_max_calls and now - self._trial_at >= self.reset_timeout:
+                self._trials = 0
+            if self._trials < self.half_open_max_calls:
+                self._trials += 1
+                self._trial_at = now
+                return
+        self.rejected += 1
+        retry_after = max(self.reset_timeout - (self._timer() - self._opened_at), 0.0)
+        raise CircuitOpenError("Weather API is unavailable; circuit breaker is open.", retry_after=retry_after)
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opens += 1
+            self._state = self.OPEN
+            self._opened_at = self._timer()
+
+    def reset(self):
+        """Close the circuit and forget recent failures."""
+        self._state = self.CLOSED
+        self._failures = 0
+        self._trials = 0
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """
+    Return the delay before retry number `attempt` (starting at 0).
+
+    Uses exponential backoff with full jitter: a uniform draw between 0 and
+    `base * 2 ** attempt`, capped at `cap`, so clients that failed together do
+    not retry together.
+
+    Args:
+        attempt (int): How many retries came before this one.
+        base (float): Upper bound of the first delay, in seconds.
+        cap (float): Largest possible delay, in seconds.
+        rng (random.Random): Source of jitter.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,338 @@
+"""
+Keep weather.db within a row count, a size and an age since last access.
+
+Runs in the background with `RETENTION_ENABLED`, or once from the command line:
+    python -m app.retention --max-rows 1000000 --max-age-days 90
+    python -m app.retention --vacuum
+
+`--vacuum` rebuilds the database with a full `VACUUM`, which blocks other writers
+while it runs; it is only needed once for SQLite databases created before
+incremental auto-vacuum was enabled.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from app import config, crud, database, metrics, models, weather
+from app.leader import LeaderLock
+from app.weather import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum value of databases that can be compacted online
+_INCREMENTAL = 2
+
+def _percentiles(timings: list) -> dict:
+    if not timings:
+        return {"p50": None, "p99": None}
+    timings = sorted(timings)
+    return {
+        "p50": round(timings[len(timings) // 2] * 1000, 3),
+        "p99": round(timings[min(len(timings) - 1, math.ceil(len(timings) * 0.99) - 1)] * 1000, 3),
+    }
+
+class RetentionJob:
+    """
+    Periodically evict the least recently used weather rows and compact the database.
+
+    Each run first writes the reads recorded since the last run (see `weather._touch`)
+    to `weather.last_accessed_at`. It then deletes rows not read for `max_age_days`,
+    followed by the least recently used rows past `max_rows` and, on SQLite, past
+    `max_bytes`; the size cap is turned into a row count from the current average
+    bytes per row. Deletes run in transactions of `batch_size` rows with `pause`
+    seconds between them, so readers, which WAL never blocks, and other writers wait
+    for one small batch at most. The excess is measured again before each batch,
+    so a concurrent run, e.g. from the command line, never makes it evict more
+    than needed. On SQLite, free pages are then returned to the filesystem with
+    `PRAGMA incremental_vacuum`, `vacuum_pages` at a time.
+
+    In the background, every worker records its reads each `interval`, but only
+    the worker holding `lock` evicts and compacts (see `leader.LeaderLock`).
+
+    Each run reports the rows evicted, the bytes reclaimed and the latency of
+    `probes` point lookups timed before and after.
+    """
+
+    def __init__(self, max_rows=0, max_bytes=0, max_age_days=0.0, interval=300.0, batch_size=500, pause=0.05,
+                 vacuum_pages=1000, probes=100, session_factory=None, lock=None):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.probes = probes
+        self._session_factory = session_factory
+        self.lock = lock
+        self._task = None
+        self._warned_no_vacuum = False
+        self.runs = 0
+        self.evicted = 0
+        self.reclaimed_bytes = 0
+        self.file_bytes = 0
+        self.last_report = None
+
+    def _session(self):
+        return (self._session_factory or database.AsyncSessionLocal)()
+
+    async def record_accesses(self, now: datetime | None = None) -> int:
+        """
+        Write the reads recorded in memory to `weather.last_accessed_at`.
+
+        Args:
+            now (datetime, optional): The access time to record; defaults to now.
+
+        Returns:
+            int: The number of rows updated.
+        """
+        keys = list(weather.accessed)
+        weather.accessed.clear()
+        if not keys:
+            return 0
+        async with self._session() as db:
+            return await crud.touch_weather(db, keys, now or datetime.now())
+
+    async def _size(self) -> dict:
+        # Row count and, on SQLite, the file size and the bytes in use
+        async with self._session() as db:
+            size = {"rows": await db.scalar(select(func.count()).select_from(models.Weather))}
+            if db.get_bind().dialect.name == "sqlite":
+                page_size = await db.scalar(text("PRAGMA page_size"))
+                page_count = await db.scalar(text("PRAGMA page_count"))
+                free_pages = await db.scalar(text("PRAGMA freelist_count"))
+                size.update(file_bytes=page_count * page_size, used_bytes=(page_count - free_pages) * page_size)
+        return size
+
+    async def _excess_rows(self) -> int:
+        return (await self._size())["rows"] - self.max_rows
+
+    async def _excess_bytes(self) -> float:
+        # Rows to delete to get under max_bytes, from the current average bytes per row
+        size = await self._size()
+        if "used_bytes" not in size or not size["rows"] or size["used_bytes"] <= self.max_bytes:
+            return 0
+        return math.ceil((size["used_bytes"] - self.max_bytes) / (size["used_bytes"] / size["rows"]))
+
+    async def _evict(self, excess, before: datetime | None = None) -> int:
+        # Delete least recently used rows, last read before `before`, a batch at a time while `excess()` is positive
+        evicted = 0
+        while (count := await excess()) > 0:
+            async with self._session() as db:
+                ids = await crud.get_least_recently_used_weather(db, int(min(self.batch_size, count)), before)
+                if not ids:
+                    break
+                evicted += await crud.delete_weather(db, ids)
+            await asyncio.sleep(self.pause)
+        return evicted
+
+    async def _vacuum(self, full: bool = False) -> bool:
+        # Return free pages to the filesystem; False if the database can't be compacted online
+        async with self._session() as db:
+            if db.get_bind().dialect.name != "sqlite":
+                return False
+            if not full and await db.scalar(text("PRAGMA auto_vacuum")) != _INCREMENTAL:
+                if not self._warned_no_vacuum:
+                    self._warned_no_vacuum = True
+                    logger.warning("The database was created without incremental auto-vacuum; "
+                                   "run `python -m app.retention --vacuum` once to compact it online")
+                return False
+
+        while True:
+            async with self._session() as db:
+                if not full and not await db.scalar(text("PRAGMA freelist_count")):
+                    break
+                await db.commit()
+                raw = await (await db.connection()).get_raw_connection()
+                # executescript runs the pragma to completion; execute() would free one page
+                script = "VACUUM" if full else f"PRAGMA incremental_vacuum({self.vacuum_pages})"
+                await raw.driver_connection.executescript(f"{script}; PRAGMA wal_checkpoint(PASSIVE);")
+            if full:
+                break
+            await asyncio.sleep(self.pause)
+        return True
+
+    async def _sample_keys(self) -> list:
+        # (location id, date) keys of up to `probes` random rows
+        async with self._session() as db:
+            low, high = (await db.execute(select(func.min(models.Weather.id), func.max(models.Weather.id)))).one()
+            if low is None:
+                return []
+            ids = [random.randint(low, high) for _ in range(self.probes * 2)]
+            rows = await db.execute(
+                select(models.Weather.location_id, models.Weather.date).where(models.Weather.id.in_(ids)).limit(self.probes)
+            )
+            return [tuple(row) for row in rows]
+
+    async def _lookup_latency(self, keys: list) -> dict:
+        # Time the hit-path point lookup of each key
+        timings = []
+        async with self._session() as db:
+            for location_id, date in keys:
+                start = time.perf_counter()
+                (await db.scalars(
+                    select(models.Weather).filter(models.Weather.location_id == location_id, models.Weather.date == date)
+                )).first()
+                timings.append(time.perf_counter() - start)
+        return _percentiles(timings)
+
+    async def run_once(self, now: datetime | None = None, full_vacuum: bool = False) -> dict:
+        """
+        Record accesses, evict rows over the limits and compact the database once.
+
+        Args:
+            now (datetime, optional): Reference time; defaults to now.
+            full_vacuum (bool): Rebuild the database with `VACUUM` instead of an
+                incremental vacuum (SQLite only; blocks writers while it runs).
+
+        Returns:
+            dict: Accesses recorded, rows evicted per reason, rows and file bytes
+            before and after, bytes reclaimed, lookup latency percentiles (ms)
+            before and after, and elapsed seconds.
+        """
+        now = now or datetime.now()
+        started = time.perf_counter()
+        accesses = await self.record_accesses(now)
+        keys = await self._sample_keys()
+        latency_before = await self._lookup_latency(keys)
+        before = await self._size()
+
+        evicted = {"age": 0, "rows": 0, "bytes": 0}
+        if self.max_age_days:
+            async def expired():
+                return math.inf
+            evicted["age"] = await self._evict(expired, before=now - timedelta(days=self.max_age_days))
+        if self.max_rows:
+            evicted["rows"] = await self._evict(self._excess_rows)
+        if self.max_bytes:
+            evicted["bytes"] = await self._evict(self._excess_bytes)
+
+        compacted = await self._vacuum(full=full_vacuum)
+        after = await self._size()
+        report = {
+            "accesses_recorded": accesses,
+            "evicted": evicted,
+            "rows_before": before["rows"],
+            "rows_after": after["rows"],
+            "file_bytes_before": before.get("file_bytes"),
+            "file_bytes_after": after.get("file_bytes"),
+            "reclaimed_bytes": before.get("file_bytes", 0) - after.get("file_bytes", 0),
+            "compacted": compacted,
+            "lookup_ms_before": latency_before,
+            "lookup_ms_after": await self._lookup_latency(keys),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+        self.runs += 1
+        self.evicted += sum(evicted.values())
+        self.reclaimed_bytes += max(0, report["reclaimed_bytes"])
+        self.file_bytes = after.get("file_bytes") or 0
+        self.last_report = report
+        logger.info("Retention run: %s", json.dumps(report))
+        return report
+
+    async def _loop(self):
+        while True:
+            try:
+                if self.lock is None or self.lock.acquire():
+                    await self.run_once()
+                else:
+                    await self.record_accesses()
+            except Exception as e:
+                logger.error("Retention run failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Start the job in the background, once now and then every `interval` seconds.
+
+        Runs on a worker that doesn't hold `lock` only record its reads.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """
+        Stop the background task, waiting for it to finish, and record pending accesses.
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            try:
+                await self.record_accesses()
+            except Exception as e:
+                logger.warning("Could not record pending accesses: %s", e)
+        if self.lock is not None:
+            self.lock.release()
+
+    def stats(self) -> dict:
+        """
+        Return the retention counters.
+
+        Returns:
+            dict: Runs, rows evicted, bytes reclaimed, the last measured file size
+            and the report of the last run.
+        """
+        return {
+            "running": self._task is not None,
+            "runs": self.runs,
+            "evicted": self.evicted,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "file_bytes": self.file_bytes,
+            "last_report": self.last_report,
+        }
+
+job = RetentionJob(
+    max_rows=Config.RETENTION_MAX_ROWS,
+    max_bytes=Config.RETENTION_MAX_BYTES,
+    max_age_days=Config.RETENTION_MAX_AGE_DAYS,
+    interval=Config.RETENTION_INTERVAL,
+    batch_size=Config.RETENTION_BATCH_SIZE,
+    pause=Config.RETENTION_BATCH_PAUSE,
+    vacuum_pages=Config.RETENTION_VACUUM_PAGES,
+    lock=LeaderLock("retention", Config.LOCK_DIR),
+)
+
+metrics.REGISTRY.callback("retention_evicted_rows", "Weather rows evicted by the retention job.",
+                          lambda: job.evicted, type="counter")
+metrics.REGISTRY.callback("retention_reclaimed_bytes", "Bytes returned to the filesystem by the retention job.",
+                          lambda: job.reclaimed_bytes, type="counter")
+metrics.REGISTRY.callback("weather_db_bytes", "Size of the database file at the last retention run.",
+                          lambda: job.file_bytes)
+
+async def _main(args) -> dict:
+    runner = RetentionJob(
+        max_rows=args.max_rows, max_bytes=args.max_bytes, max_age_days=args.max_age_days,
+        batch_size=args.batch_size, pause=Config.RETENTION_BATCH_PAUSE, vacuum_pages=Config.RETENTION_VACUUM_PAGES,
+    )
+    try:
+        return await runner.run_once(full_vacuum=args.vacuum)
+    finally:
+        await database.dispose_engines()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-rows", type=int, default=Config.RETENTION_MAX_ROWS, help="rows to keep; 0 for no limit")
+    parser.add_argument("--max-bytes", type=int, default=Config.RETENTION_MAX_BYTES,
+                        help="database bytes in use to keep (SQLite); 0 for no limit")
+    parser.add_argument("--max-age-days", type=float, default=Config.RETENTION_MAX_AGE_DAYS,
+                        help="evict rows not read for this many days; 0 for no limit")
+    parser.add_argument("--batch-size", type=int, default=Config.RETENTION_BATCH_SIZE, help="rows per delete transaction")
+    parser.add_argument("--vacuum", action="store_true", help="rebuild the database with a full VACUUM")
+    args = parser.parse_args(argv)
+
+    config.configure_logging()
+    database.init_db()
+    print(json.dumps(asyncio.run(_main(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
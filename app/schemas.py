@@ -1,5 +1,6 @@
 from pydantic import BaseModel, field_validator, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
+from typing import List, Literal, Optional, Union
 
 class WeatherBase(BaseModel):
     city: str
@@ -19,10 +20,85 @@ class WeatherBase(BaseModel):
         return value
 
 
+class LocationCreate(BaseModel):
+    name: str
+    region: Optional[str] = None
+    country: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class HourlySeries(BaseModel):
+    # 24 values each, from 00:00 local time; None for hours without a reading
+    temp_c: List[Optional[float]]
+    humidity: List[Optional[float]]
+    precip_mm: List[Optional[float]]
+    wind_kph: List[Optional[float]]
+    pressure_mb: List[Optional[float]]
+    cloud: List[Optional[float]]
+
 class WeatherCreate(WeatherBase):
-    pass
+    # Where the weather API resolved `city` to; a location named `city` when unknown
+    location: Optional[LocationCreate] = None
+    # Stored in weather_hourly alongside the daily row, when the API returned hours
+    hourly: Optional[HourlySeries] = None
 
 class WeatherResponse(WeatherBase):
     id: int
 
     model_config = ConfigDict(from_attributes=True)
+
+class QueuedWeatherResponse(WeatherBase):
+    # A record still in the write-behind queue; it has an id once stored
+    id: None = None
+
+class HourlyObservation(BaseModel):
+    time: datetime
+    temp_c: Optional[float] = None
+    humidity: Optional[float] = None
+    precip_mm: Optional[float] = None
+    wind_kph: Optional[float] = None
+    pressure_mb: Optional[float] = None
+    cloud: Optional[float] = None
+
+class WeatherHourlyResponse(BaseModel):
+    city: str
+    date: datetime
+    hours: List[HourlyObservation]
+
+class WeatherBatchResult(BaseModel):
+    city: str
+    date: str
+    status: Literal["ok", "not_found", "error"]
+    data: Optional[WeatherResponse] = None
+    error: Optional[str] = None
+
+class WeatherBatchResponse(BaseModel):
+    results: List[WeatherBatchResult]
+
+class QueuedWeatherBatchResult(WeatherBatchResult):
+    data: Optional[Union[WeatherResponse, QueuedWeatherResponse]] = None
+
+class QueuedWeatherBatchResponse(BaseModel):
+    # WeatherBatchResponse as documented in write-behind mode
+    results: List[QueuedWeatherBatchResult]
+
+class MetricStats(BaseModel):
+    mean: float
+    min: float
+    max: float
+    # Day-weighted mean over this and the preceding `window - 1` calendar buckets; empty ones add nothing
+    rolling_mean: Optional[float] = None
+
+class WeatherStatsBucket(BaseModel):
+    city: str
+    period_start: date
+    days: int
+    min_temp: MetricStats
+    max_temp: MetricStats
+    avg_temp: MetricStats
+    humidity: MetricStats
+
+class WeatherStatsResponse(BaseModel):
+    bucket: Literal["day", "week", "month"]
+    window: Optional[int] = None
+    series: List[WeatherStatsBucket]
@@ -0,0 +1,73 @@
+import orjson
+from datetime import datetime
+from typing import Iterable
+from app import schemas
+
+# Fields of `schemas.WeatherResponse`, in the order Pydantic serializes them
+WEATHER_FIELDS = ("city", "date", "min_temp", "max_temp", "avg_temp", "humidity", "id")
+
+def weather_dict(row) -> dict:
+    """
+    Return the JSON-ready fields of a stored weather row.
+
+    Args:
+        row: A `schemas.WeatherResponse` (or ORM row) that has already been validated.
+
+    Returns:
+        dict: The fields of `schemas.WeatherResponse`, in schema order.
+    """
+    return {field: getattr(row, field) for field in WEATHER_FIELDS}
+
+def dump_weather(row) -> bytes:
+    """
+    Encode one weather row as the JSON body of `schemas.WeatherResponse`.
+
+    The row is written straight from its attributes with orjson, skipping the
+    second validation and `jsonable_encoder` pass FastAPI applies to a
+    `response_model`; the bytes are the same as `WeatherResponse.model_dump_json()`.
+
+    Args:
+        row: A `schemas.WeatherResponse` (or ORM row) that has already been validated.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    return orjson.dumps(weather_dict(row))
+
+def dump_weather_list(rows: Iterable) -> bytes:
+    """
+    Encode weather rows as the JSON body of `List[schemas.WeatherResponse]`.
+
+    Args:
+        rows (Iterable): Validated `schemas.WeatherResponse` objects.
+
+    Returns:
+        bytes: The JSON array.
+    """
+    return orjson.dumps([weather_dict(row) for row in rows])
+
+def dump_record(record: schemas.WeatherCreate) -> bytes:
+    """
+    Encode a weather record, without a row id, for another node to store.
+
+    Args:
+        record (schemas.WeatherCreate): The record, with its location and hourly series.
+
+    Returns:
+        bytes: The JSON document.
+    """
+    return orjson.dumps(record.model_dump())
+
+def load_record(data: bytes) -> schemas.WeatherCreate:
+    """
+    Decode a document written by `dump_record`.
+
+    Args:
+        data (bytes): The JSON document.
+
+    Returns:
+        schemas.WeatherCreate: The weather record.
+    """
+    fields = orjson.loads(data)
+    fields["date"] = datetime.fromisoformat(fields["date"])
+    return schemas.WeatherCreate.model_validate(fields)
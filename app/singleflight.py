@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is in flight wait for it and receive the same result, or the same exception.
+    Once the call completes the key is forgotten, so later calls run again.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Calls that joined one already in flight instead of running
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` for `key`, or join the call already in flight for it.
+
+        Args:
+            key (Hashable): Identifies equivalent calls.
+            fn (Callable[[], Awaitable[Any]]): Coroutine function producing the result.
+
+        Returns:
+            Any: The result of the (shared) call.
+
+        Raises:
+            Exception: Whatever the shared call raised.
+        """
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled rather than failing; take over the call.
+                if future.cancelled():
+                    continue
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting for it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Cancellation of the leader lets a waiter retry instead of failing.
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
@@ -0,0 +1,70 @@
+from collections import deque
+from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, schemas
+
+def _window_start(period_start: date, bucket: str, window: int) -> date:
+    # Start of the earliest bucket in a rolling window ending with the bucket starting at `period_start`
+    if bucket == "month":
+        months = period_start.year * 12 + period_start.month - 1 - (window - 1)
+        return date(months // 12, months % 12 + 1, 1)
+    return period_start - timedelta(days=(window - 1) * (7 if bucket == "week" else 1))
+
+async def get_weather_stats(db: AsyncSession, cities: list, start: datetime, end: datetime,
+                            bucket: str = "month", window: int | None = None) -> schemas.WeatherStatsResponse:
+    """
+    Compute per-city weather statistics over calendar buckets.
+
+    Means and extremes are aggregated in the database (see
+    `crud.get_weather_aggregates`), so only one row per city and bucket is
+    transferred. Rolling means are then derived from those rows, weighting each
+    bucket by the number of days it covers. The window spans `window` calendar
+    buckets, so buckets without data shorten it rather than pulling in older ones.
+
+    Args:
+        db (AsyncSession): The asyncio database session object.
+        cities (list): City names.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+        bucket (str): "day", "week" or "month".
+        window (int, optional): Number of buckets in the rolling mean; omitted when `None`.
+
+    Returns:
+        schemas.WeatherStatsResponse: One entry per city and bucket that has data.
+    """
+    names = {crud.normalize_city(city): city for city in cities}
+    rows = await crud.get_weather_aggregates(db, cities, start, end, bucket)
+
+    series = []
+    recent = deque()
+    for row in rows:
+        period_start = datetime.strptime(row.period_start, "%Y-%m-%d").date()
+        if recent and recent[-1][0].city_key != row.city_key:
+            recent.clear()
+        if window:
+            recent.append((row, period_start))
+            earliest = _window_start(period_start, bucket, window)
+            while recent[0][1] < earliest:
+                recent.popleft()
+            window_days = sum(previous.days for previous, _ in recent)
+
+        metrics = {}
+        for column in crud.STATS_COLUMNS:
+            rolling_mean = None
+            if window:
+                rolling_mean = sum(getattr(previous, f"{column}_mean") * previous.days for previous, _ in recent) / window_days
+            metrics[column] = schemas.MetricStats(
+                mean=getattr(row, f"{column}_mean"),
+                min=getattr(row, f"{column}_min"),
+                max=getattr(row, f"{column}_max"),
+                rolling_mean=rolling_mean,
+            )
+
+        series.append(schemas.WeatherStatsBucket(
+            city=names.get(row.city_key, row.city_key),
+            period_start=period_start,
+            days=row.days,
+            **metrics,
+        ))
+
+    return schemas.WeatherStatsResponse(bucket=bucket, window=window, series=series)
@@ -1,36 +1,458 @@
+import asyncio
 import httpx
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+from datetime import date as date_type, datetime, timedelta
 import os
-from dotenv import load_dotenv
-from app import crud, schemas
+import tempfile
+import time
+from app import cache_backends, config, crud, hourly, metrics, profiling, schemas, serialization
+from app.cache import MISSING, TTLCache
+from app.resilience import CircuitBreaker, TokenBucket, UpstreamUnavailable, backoff_delay
+from app.singleflight import SingleFlight
+from app.writebehind import WriteBehindQueue
 import logging
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
-load_dotenv()
+config.load_environment()
 
 class Config:
-    WEATHER_API_URL = "http://api.weatherapi.com/v1/history.json"
+    WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.weatherapi.com/v1/history.json")
     API_KEY = os.getenv("WEATHER_API_KEY")
 
+    # Upstream connection pool
+    HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "30.0"))
+    HTTP2 = os.getenv("WEATHER_HTTP2", "false").lower() in ("1", "true", "yes")
+
+    # Upstream timeouts, in seconds
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", "5.0"))
+    HTTP_READ_TIMEOUT = float(os.getenv("WEATHER_HTTP_READ_TIMEOUT", "10.0"))
+    HTTP_WRITE_TIMEOUT = float(os.getenv("WEATHER_HTTP_WRITE_TIMEOUT", "10.0"))
+    HTTP_POOL_TIMEOUT = float(os.getenv("WEATHER_HTTP_POOL_TIMEOUT", "5.0"))
+
+    # Client-side rate limit matching the API plan, in calls per second (0 disables it)
+    UPSTREAM_RATE_LIMIT = float(os.getenv("UPSTREAM_RATE_LIMIT", "0"))
+    UPSTREAM_RATE_BURST = float(os.getenv("UPSTREAM_RATE_BURST", "10"))
+    # Longest wait for a rate-limit token before failing fast, in seconds
+    UPSTREAM_RATE_MAX_WAIT = float(os.getenv("UPSTREAM_RATE_MAX_WAIT", "2.0"))
+
+    # Retries of 429/5xx responses and network errors, with exponential backoff and full jitter
+    UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.2"))
+    UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2.0"))
+    # No retry starts once a call has spent this long, in seconds, including waits
+    UPSTREAM_RETRY_BUDGET = float(os.getenv("UPSTREAM_RETRY_BUDGET", "5.0"))
+    UPSTREAM_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    # Circuit breaker: open after this many consecutive failures, probe again after the timeout
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # In-memory hot cache in front of the database
+    HOT_CACHE_MAXSIZE = int(os.getenv("HOT_CACHE_MAXSIZE", "10000"))
+    HOT_CACHE_TTL = float(os.getenv("HOT_CACHE_TTL", "3600"))
+    NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "60"))
+    # Upstream statuses meaning "no data for this query", cached negatively
+    NEGATIVE_CACHE_STATUSES = frozenset({400, 404})
+    # Cache shared by workers or nodes, checked before the database: "none", "memory", "sqlite" or "redis"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "none")
+    # SQLite file path, or redis://[user:password@]host:port/db
+    CACHE_URL = os.getenv("CACHE_URL")
+    CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", "0.5"))
+    SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", str(24 * 3600)))
+    SHARED_CACHE_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "weather:")
+
+    # In-memory map of normalized city input to location id, in front of location_aliases
+    ALIAS_CACHE_MAXSIZE = int(os.getenv("ALIAS_CACHE_MAXSIZE", "100000"))
+    ALIAS_CACHE_TTL = float(os.getenv("ALIAS_CACHE_TTL", "86400"))
+
+    # Write-behind: answer misses at once and store fetched rows in batches in the background
+    WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+    WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.05"))
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+    # Failed writes of a record on its own before it is given up on
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+
+    # Retention of weather.db (see app.retention): evict least recently used rows
+    # past a row count, a size in bytes or an age since last access (0 disables each)
+    RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() in ("1", "true", "yes")
+    RETENTION_MAX_ROWS = int(os.getenv("RETENTION_MAX_ROWS", "0"))
+    RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", "0"))
+    RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+    RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "300"))
+    # Rows deleted per transaction, and the pause between transactions, in seconds
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+    # Free pages returned to the filesystem per incremental vacuum step (SQLite)
+    RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+    # Reads remembered between two retention runs; further reads are not recorded
+    RETENTION_MAX_PENDING_ACCESSES = int(os.getenv("RETENTION_MAX_PENDING_ACCESSES", "100000"))
+
+    # Lock files electing the one worker per host that runs the retention job (see app.leader)
+    LOCK_DIR = os.getenv("LOCK_DIR", tempfile.gettempdir())
+
+    # POST /weather/batch
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+
+    # GET /weather/range
+    RANGE_MAX_DAYS = int(os.getenv("RANGE_MAX_DAYS", "366"))
+    # Longest dt..end_dt span the history API serves in one call
+    UPSTREAM_MAX_RANGE_DAYS = int(os.getenv("UPSTREAM_MAX_RANGE_DAYS", "30"))
+
+    # HTTP caching: Cache-Control max-age for past dates and for today, in seconds
+    CACHE_CONTROL_MAX_AGE = int(os.getenv("CACHE_CONTROL_MAX_AGE", str(365 * 24 * 3600)))
+    CACHE_CONTROL_RECENT_MAX_AGE = int(os.getenv("CACHE_CONTROL_RECENT_MAX_AGE", "300"))
+    # Batch and range responses at least this large are compressed (gzip, or brotli if installed)
+    COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+
+    # Per-request timing and profiling (see app.profiling); all off by default
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+    # Fraction of requests run under the sampling profiler
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    # Requests sending this value in an X-Profile header are profiled; unset disables it
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+    PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+    # GET /weather/stats
+    STATS_MAX_CITIES = int(os.getenv("STATS_MAX_CITIES", "50"))
+
+    # Background cache warming (see app.prefetch)
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+    PREFETCH_CITIES = [city.strip() for city in os.getenv("PREFETCH_CITIES", "").split(",") if city.strip()]
+    PREFETCH_TOP_CITIES = int(os.getenv("PREFETCH_TOP_CITIES", "20"))
+    PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "1"))
+    PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "3600"))
+    PREFETCH_LOCK_INTERVAL = float(os.getenv("PREFETCH_LOCK_INTERVAL", "30"))
+    PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+    PREFETCH_BUDGET = int(os.getenv("PREFETCH_BUDGET", "100"))
+
     @staticmethod
     def validate():
+        """
+        Check that the configuration can serve requests. Called from the application lifespan.
+
+        Raises:
+            ValueError: If the weather API key is missing.
+        """
         if not Config.API_KEY:
             raise ValueError("Weather API key is missing. Please set WEATHER_API_KEY in the environment variables.")
 
-# Validate configuration
-Config.validate()
+# Location ids of recently seen normalized city inputs ("london", "london, uk", ...)
+aliases = TTLCache(maxsize=Config.ALIAS_CACHE_MAXSIZE, ttl=Config.ALIAS_CACHE_TTL)
+
+# Validated responses for the hottest keys, checked before any database access; see `cache_key`
+hot_cache = TTLCache(
+    maxsize=Config.HOT_CACHE_MAXSIZE,
+    ttl=Config.HOT_CACHE_TTL,
+    negative_ttl=Config.NEGATIVE_CACHE_TTL,
+)
+
+# Coalesces concurrent cache misses for the same (city, date)
+_misses = SingleFlight()
+
+# (location id, date) keys read since the retention job last recorded accesses
+accessed = set()
+
+def _touch(key):
+    # Remember a read for least-recently-used eviction; the retention job writes them in bulk
+    if Config.RETENTION_ENABLED and isinstance(key[0], int) and len(accessed) < Config.RETENTION_MAX_PENDING_ACCESSES:
+        accessed.add(key)
+
+# Set up by `open_shared_cache`; `None` when no shared cache is configured
+shared_cache = None
+
+# Fetched records waiting to be stored, keyed by (normalized city, date), in write-behind mode
+writer = WriteBehindQueue(
+    batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+    interval=Config.WRITE_BEHIND_INTERVAL,
+    max_pending=Config.WRITE_BEHIND_MAX_PENDING,
+    max_attempts=Config.WRITE_BEHIND_MAX_ATTEMPTS,
+    on_flush=lambda keys, rows: [_remember(alias, row) for (alias, _), row in zip(keys, rows)],
+)
+
+# Shared by every call to the weather API from this process
+rate_limiter = TokenBucket(
+    rate=Config.UPSTREAM_RATE_LIMIT,
+    capacity=Config.UPSTREAM_RATE_BURST,
+    max_wait=Config.UPSTREAM_RATE_MAX_WAIT,
+)
+circuit_breaker = CircuitBreaker(
+    failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=Config.CIRCUIT_RESET_TIMEOUT,
+)
+_CIRCUIT_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+# Where get_weather answers came from
+_HOT_CACHE_HITS = metrics.WEATHER_LOOKUPS.labels("hot_cache")
+_WRITE_BEHIND_HITS = metrics.WEATHER_LOOKUPS.labels("write_behind")
+_SHARED_CACHE_HITS = metrics.WEATHER_LOOKUPS.labels("shared_cache")
+_NEGATIVE_CACHE_HITS = metrics.WEATHER_LOOKUPS.labels("negative_cache")
+_DATABASE_HITS = metrics.WEATHER_LOOKUPS.labels("database")
+_UPSTREAM_FETCHES = metrics.WEATHER_LOOKUPS.labels("upstream")
+_UPSTREAM_NO_DATA = metrics.WEATHER_LOOKUPS.labels("upstream_no_data")
+
+metrics.REGISTRY.callback("weather_hot_cache_entries", "Entries in the in-memory hot cache.",
+                          lambda: len(hot_cache))
+metrics.REGISTRY.callback("weather_hot_cache_evictions", "Hot cache entries evicted to make room.",
+                          lambda: hot_cache.evictions, type="counter")
+metrics.REGISTRY.callback("weather_hot_cache_expirations", "Hot cache entries dropped after their TTL.",
+                          lambda: hot_cache.expirations, type="counter")
+metrics.REGISTRY.callback("weather_alias_cache_entries", "City spellings resolved to a location in memory.",
+                          lambda: len(aliases))
+metrics.REGISTRY.callback("weather_write_behind_pending", "Fetched records waiting to be stored.",
+                          lambda: len(writer))
+metrics.REGISTRY.callback("weather_write_behind_written", "Records stored by the write-behind queue.",
+                          lambda: writer.written, type="counter")
+metrics.REGISTRY.callback("weather_write_behind_failures", "Write-behind batch writes that failed and will be retried.",
+                          lambda: writer.failures, type="counter")
+metrics.REGISTRY.callback("weather_write_behind_rejected", "Fetched records not queued because the queue was full.",
+                          lambda: writer.rejected, type="counter")
+metrics.REGISTRY.callback("weather_write_behind_dead_lettered", "Queued records given up on after repeated failed writes.",
+                          lambda: writer.dead_lettered, type="counter")
+metrics.REGISTRY.callback("weather_inflight_misses", "Cache misses currently being fetched from the weather API.",
+                          lambda: len(_misses))
+metrics.REGISTRY.callback("weather_coalesced_misses", "Cache misses that joined a fetch already in flight.",
+                          lambda: _misses.shared, type="counter")
+metrics.REGISTRY.callback("weather_upstream_circuit_state",
+                          "Weather API circuit breaker state: 0 closed, 1 half-open, 2 open.",
+                          lambda: _CIRCUIT_STATES[circuit_breaker.state])
+metrics.REGISTRY.callback("weather_upstream_circuit_opens", "Times the weather API circuit breaker opened.",
+                          lambda: circuit_breaker.opens, type="counter")
+metrics.REGISTRY.callback("weather_upstream_circuit_rejections",
+                          "Weather API calls rejected because the circuit breaker was open.",
+                          lambda: circuit_breaker.rejected, type="counter")
+metrics.REGISTRY.callback("weather_upstream_throttled", "Weather API calls delayed by the client-side rate limit.",
+                          lambda: rate_limiter.throttled, type="counter")
+metrics.REGISTRY.callback("weather_upstream_throttle_wait_seconds",
+                          "Seconds weather API calls spent waiting for the client-side rate limit.",
+                          lambda: rate_limiter.wait_seconds, type="counter")
+metrics.REGISTRY.callback("weather_upstream_rate_limited",
+                          "Weather API calls rejected because the rate-limit wait was too long.",
+                          lambda: rate_limiter.rejected, type="counter")
+
+# Application-scoped upstream client, managed by the FastAPI lifespan
+_http_client: httpx.AsyncClient | None = None
+
+def create_http_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Build an `httpx.AsyncClient` configured for the weather API.
+
+    Connection-pool limits, keep-alive and per-phase timeouts come from `Config`.
+    HTTP/2 is enabled when `WEATHER_HTTP2` is set and the optional `h2` package
+    is installed; otherwise the client falls back to HTTP/1.1.
+
+    Args:
+        **kwargs: Extra arguments passed to `httpx.AsyncClient` (e.g. `transport` in tests).
+
+    Returns:
+        httpx.AsyncClient: A new, unopened client.
+    """
+    http2 = Config.HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("WEATHER_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1.")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=Config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=Config.HTTP_CONNECT_TIMEOUT,
+        read=Config.HTTP_READ_TIMEOUT,
+        write=Config.HTTP_WRITE_TIMEOUT,
+        pool=Config.HTTP_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, **kwargs)
+
+async def open_http_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Create the shared upstream client. Called once from the application lifespan.
+
+    Args:
+        **kwargs: Extra arguments passed to `create_http_client`.
+
+    Returns:
+        httpx.AsyncClient: The shared client.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = create_http_client(**kwargs)
+    return _http_client
+
+async def close_http_client():
+    """
+    Close the shared upstream client and release its pooled connections.
+    """
+    global _http_client
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
+
+async def open_shared_cache():
+    """
+    Create the shared cache backend selected by `Config.CACHE_BACKEND`, once per process.
+
+    Returns:
+        CacheBackend or None: The backend, or `None` when disabled.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = cache_backends.create_backend(Config.CACHE_BACKEND, Config.CACHE_URL, Config.CACHE_TIMEOUT)
+    return shared_cache
 
-async def fetch_weather_data(city: str, date: str) -> dict:
+async def close_shared_cache():
+    """
+    Close the shared cache backend, if one is open.
+    """
+    global shared_cache
+    if shared_cache is not None:
+        backend, shared_cache = shared_cache, None
+        await backend.close()
+
+def _shared_key(alias: str, date) -> str:
+    # Spellings, not location ids, since ids are local to each node's database
+    return f"{Config.SHARED_CACHE_PREFIX}{alias}:{_format_date(date)}"
+
+async def _shared_get(keys: list) -> dict:
+    # Look up (alias, date) keys in the shared cache; failures count as misses
+    if shared_cache is None or not keys:
+        return {}
+    try:
+        with profiling.phase("shared_cache"):
+            values = await shared_cache.get_many([_shared_key(*key) for key in keys])
+    except Exception as e:
+        metrics.SHARED_CACHE_ERRORS.labels("get").inc()
+        logger.warning("Shared cache lookup of %d keys failed: %s", len(keys), e)
+        return {}
+
+    found = {}
+    for key in keys:
+        value = values.get(_shared_key(*key))
+        if value is not None:
+            found[key] = MISSING if value == b"null" else serialization.load_record(value)
+    return found
+
+async def _shared_set(items: dict):
+    # Store (alias, date) -> fetched record, or None for "no data", in the shared cache
+    if shared_cache is None or not items:
+        return
+    found = {_shared_key(*key): serialization.dump_record(value) for key, value in items.items() if value is not None}
+    missing = {_shared_key(*key): b"null" for key, value in items.items() if value is None}
+    try:
+        with profiling.phase("shared_cache"):
+            await shared_cache.set_many(found, Config.SHARED_CACHE_TTL)
+            await shared_cache.set_many(missing, Config.NEGATIVE_CACHE_TTL)
+    except Exception as e:
+        metrics.SHARED_CACHE_ERRORS.labels("set").inc()
+        logger.warning("Shared cache update of %d keys failed: %s", len(items), e)
+
+async def _share_rows(db: AsyncSession, rows: dict):
+    # Store (alias, date) -> row stored here in the shared cache, as the record another node stores
+    if shared_cache is None or not rows:
+        return
+    locations = await crud.get_locations(db, {row.location_id for row in rows.values()})
+    await _shared_set({key: _record_of(row, locations[row.location_id]) for key, row in rows.items()})
+
+def _record_of(row, location) -> schemas.WeatherCreate:
+    # Without the row id, which is local to this node's database, and without the hourly series
+    return schemas.WeatherCreate(
+        city=row.city, date=row.date, min_temp=row.min_temp, max_temp=row.max_temp, avg_temp=row.avg_temp,
+        humidity=row.humidity,
+        location=schemas.LocationCreate(name=location.name, region=location.region, country=location.country,
+                                        lat=location.lat, lon=location.lon),
+    )
+
+def _format_date(value) -> str:
+    if isinstance(value, (datetime, date_type)):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+@asynccontextmanager
+async def _upstream_client():
+    # Outside the lifespan (scripts, bare TestClient) fall back to a short-lived client.
+    if _http_client is not None:
+        yield _http_client
+    else:
+        async with create_http_client() as client:
+            yield client
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+async def _call_upstream(client: httpx.AsyncClient, params: dict) -> httpx.Response:
+    # One logical call: rate limited, guarded by the circuit breaker and retried on
+    # network errors and retryable statuses while the retry budget allows.
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        circuit_breaker.before_call()
+        await rate_limiter.acquire()
+
+        start = time.perf_counter()
+        error = response = None
+        try:
+            response = await client.get(Config.WEATHER_API_URL, params=params)
+        except httpx.RequestError as e:
+            error = e
+            metrics.UPSTREAM_REQUESTS.labels("error").inc()
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.UPSTREAM_SECONDS.observe(elapsed)
+            profiling.record("upstream", elapsed)
+
+        if response is not None:
+            metrics.UPSTREAM_REQUESTS.labels(str(response.status_code)).inc()
+            if response.status_code not in Config.UPSTREAM_RETRY_STATUSES:
+                circuit_breaker.record_success()
+                return response
+        circuit_breaker.record_failure()
+
+        delay = backoff_delay(attempt, Config.UPSTREAM_RETRY_BASE_DELAY, Config.UPSTREAM_RETRY_MAX_DELAY)
+        if response is not None:
+            delay = max(delay, _retry_after(response) or 0.0)
+        if attempt >= Config.UPSTREAM_RETRIES or time.monotonic() - started + delay > Config.UPSTREAM_RETRY_BUDGET:
+            if error is not None:
+                raise error
+            return response
+
+        reason = "error" if error is not None else str(response.status_code)
+        metrics.UPSTREAM_RETRIES.labels(reason).inc()
+        logger.warning("Retrying weather API call in %.2fs after %s", delay, error or f"status {reason}")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def fetch_weather_data(city: str, date: str, end_date: str | None = None) -> dict:
     """
     Fetch weather data from the external API.
 
+    When `end_date` is given, the API returns one `forecastday` entry per day from
+    `date` to `end_date` inclusive (at most `Config.UPSTREAM_MAX_RANGE_DAYS` days).
+
+    Calls go through the process-wide `rate_limiter` and `circuit_breaker`. Network
+    errors and 429/5xx responses are retried with jittered exponential backoff,
+    honouring `Retry-After`, up to `Config.UPSTREAM_RETRIES` times.
+
     Args:
         city (str): The name of the city to fetch weather data for.
         date (str): The date to fetch weather data for, in 'YYYY-MM-DD' format.
+        end_date (str, optional): The last date of a range to fetch, in 'YYYY-MM-DD' format.
 
     Returns:
         dict: The weather data in JSON format.
@@ -39,14 +461,16 @@ async def fetch_weather_data(city: str, date: str) -> dict:
         httpx.HTTPStatusError: If the HTTP request to the weather API fails.
         httpx.RequestError: For network-related errors.
         ValueError: If the response does not contain expected data.
+        resilience.UpstreamUnavailable: If the circuit breaker is open or the rate
+            limit would delay the call too long.
     """
-    async with httpx.AsyncClient() as client:
+    params = {"key": Config.API_KEY, "q": city, "dt": _format_date(date)}
+    if end_date is not None:
+        params["end_dt"] = _format_date(end_date)
+
+    async with _upstream_client() as client:
         try:
-            response = await client.get(
-                Config.WEATHER_API_URL,
-                params={"key": Config.API_KEY, "q": city, "dt": date},
-                timeout=10.0
-            )
+            response = await _call_upstream(client, params)
             response.raise_for_status()
             data = response.json()
             
@@ -56,6 +480,9 @@ async def fetch_weather_data(city: str, date: str) -> dict:
                 raise ValueError("Unexpected response structure from weather API.")
             
             return data
+        except UpstreamUnavailable as e:
+            logger.warning("Weather API call skipped: %s", e)
+            raise
         except httpx.RequestError as e:
             logger.error("Network-related error occurred while requesting weather data: %s", e)
             raise
@@ -69,47 +496,533 @@ async def fetch_weather_data(city: str, date: str) -> dict:
             logger.error("Unexpected error: %s", e)
             raise
 
-async def get_weather(db: Session, city: str, date: str) -> schemas.WeatherResponse:
+async def get_weather(db: AsyncSession, city: str,
+                      date: str) -> schemas.WeatherResponse | schemas.QueuedWeatherResponse | None:
     """
-    Retrieve weather data from the database or fetch it from the API if not present.
+    Retrieve weather data from the cache or database, or fetch it from the API if not present.
+
+    Lookups go through an in-memory hot cache first, keyed by location once the
+    spelling of `city` has been seen (see `cache_key`), so equivalent spellings
+    share entries, then through the database. Misses are looked up in the shared
+    cache when one is configured, so nodes reuse each other's answers; records
+    found there are stored like fetched ones, so every node answers with a row id
+    of its own database. Upstream answers that mean "no data" (an empty forecast or a
+    400/404 status) are cached negatively for a short time and reported as `None`.
+    In write-behind mode fetched records are returned before they are stored, as
+    `schemas.QueuedWeatherResponse` with no `id`, and stay visible to lookups in
+    this process while they are queued.
 
     Args:
-        db (Session): The database session object.
+        db (AsyncSession): The asyncio database session object.
         city (str): The name of the city to get weather data for.
         date (str): The date to get weather data for, in 'YYYY-MM-DD' format.
 
     Returns:
-        schemas.WeatherResponse: The weather data object.
+        schemas.WeatherResponse, schemas.QueuedWeatherResponse or None: The weather
+        data object, or `None` if the weather API has no data for the city and date.
 
     Raises:
         ValueError: If there's an issue with data retrieval or storage.
         Exception: If there is an error fetching or storing weather data.
     """
+    alias = crud.normalize_city(city)
+    key = cache_key(alias, date)
+    cached = hot_cache.get(key)
+    if cached is MISSING:
+        _NEGATIVE_CACHE_HITS.inc()
+        return None
+    if cached is not None:
+        _HOT_CACHE_HITS.inc()
+        _touch(key)
+        return cached
+
+    queued = writer.get((alias, date))
+    if queued is not None:
+        _WRITE_BEHIND_HITS.inc()
+        return _queued_response(queued)
+
     # Fetch weather from the database
-    weather_data = crud.get_weather_by_city_and_date(db, city, date)
+    weather_data = await crud.get_weather_by_city_and_date(db, city, date)
     if weather_data:
-        return weather_data
-    
-    # Fetch weather from the external API
+        _DATABASE_HITS.inc()
+        response = _remember(alias, weather_data)
+        await _share_rows(db, {(alias, date): weather_data})
+        return response
+
+    # Only one caller per key goes to the external API; the others share its result
+    return await _misses.do(key, lambda: _fetch_and_store(db, city, date, alias, key))
+
+def cache_key(alias: str, date) -> tuple:
+    """
+    Build the hot cache key for a normalized city and a date.
+
+    Spellings already resolved to a location share the key of that location;
+    others are keyed by the spelling itself until a stored row resolves them.
+
+    Args:
+        alias (str): The normalized city, as returned by `crud.normalize_city`.
+        date: The requested date.
+
+    Returns:
+        tuple: (location id or alias, date).
+    """
+    return (aliases.get(alias, alias), date)
+
+def _remember(alias: str, weather_data) -> schemas.WeatherResponse:
+    # Resolve the alias to the row's location and cache the row under the location key
+    aliases.set(alias, weather_data.location_id)
+    _touch((weather_data.location_id, weather_data.date))
+    response = schemas.WeatherResponse.model_validate(weather_data)
+    hot_cache.set((weather_data.location_id, weather_data.date), response)
+    return response
+
+def _queued_response(weather_data: schemas.WeatherCreate) -> schemas.QueuedWeatherResponse:
+    # The response for a record still in the write-behind queue; it has no id yet
+    return schemas.QueuedWeatherResponse(
+        **weather_data.model_dump(exclude={"city", "location", "hourly"}),
+        city=crud.location_of(weather_data).name,
+    )
+
+async def _store(db: AsyncSession, alias: str,
+                 weather_data: schemas.WeatherCreate) -> schemas.WeatherResponse | schemas.QueuedWeatherResponse:
+    # Store a fetched record now, or queue it in write-behind mode
+    if not Config.WRITE_BEHIND_ENABLED:
+        return _remember(alias, await crud.create_weather(db, weather_data))
+    # Answered from the fetched record even if the queue is full and rejects it
+    await writer.put((alias, weather_data.date), weather_data)
+    response = _queued_response(weather_data)
+    hot_cache.set(cache_key(alias, weather_data.date), response)
+    return response
+
+async def _fetch_and_store(db: AsyncSession, city: str, date: str, alias: str, key):
+    # Another flight may have stored the record since our lookup
+    weather_data = await crud.get_weather_by_city_and_date(db, city, date)
+    if weather_data:
+        _DATABASE_HITS.inc()
+        return _remember(alias, weather_data)
+
     try:
-        data = await fetch_weather_data(city, date)
-        forecast = data["forecast"]["forecastday"][0]["day"]
-        
-        # Create a weather data object
-        weather_data = schemas.WeatherCreate(
-            city=city,
-            date=date,
-            min_temp=forecast.get("mintemp_c"),
-            max_temp=forecast.get("maxtemp_c"),
-            avg_temp=forecast.get("avgtemp_c"),
-            humidity=forecast.get("avghumidity")
-        )
+        # Another node may have fetched it
+        shared = (await _shared_get([(alias, date)])).get((alias, date))
+        if shared is not None:
+            _SHARED_CACHE_HITS.inc()
+            if shared is MISSING:
+                hot_cache.set_missing(key)
+                return None
+            return await _store(db, alias, shared)
+
+        # Fetch weather from the external API
+        try:
+            data = await fetch_weather_data(city, date)
+        except httpx.HTTPStatusError as e:
+            if not is_no_data(e):
+                raise
+            _UPSTREAM_NO_DATA.inc()
+            hot_cache.set_missing(key)
+            await _shared_set({(alias, date): None})
+            return None
+
+        weather_data = parse_forecast(city, date, data)
+        if weather_data is None:
+            _UPSTREAM_NO_DATA.inc()
+            hot_cache.set_missing(key)
+            await _shared_set({(alias, date): None})
+            return None
+        _UPSTREAM_FETCHES.inc()
         
         # Store weather data in the database
-        return crud.create_weather(db, weather_data)
+        response = await _store(db, alias, weather_data)
+        await _shared_set({(alias, date): weather_data})
+        return response
     except ValueError as e:
         logger.error("Error processing weather data: %s", e)
         raise
     except Exception as e:
         logger.error("Error fetching or saving weather data: %s", e)
         raise
+
+async def get_weather_hourly(db: AsyncSession, city: str, date: datetime) -> schemas.WeatherHourlyResponse | None:
+    """
+    Retrieve the hourly observations of a city on a date.
+
+    Hourly series are stored with the daily record whenever it is fetched, by any
+    path, so this needs no upstream call for days already stored. Days not stored
+    yet are fetched as a `get_weather` miss, sharing its single flight, so that
+    concurrent daily and hourly lookups of the same day make one upstream call.
+    Days stored before hourly series were kept are fetched again.
+
+    Args:
+        db (AsyncSession): The asyncio database session object.
+        city (str): The name of the city to get weather data for.
+        date (datetime): The date to get weather data for.
+
+    Returns:
+        schemas.WeatherHourlyResponse or None: The 24 hourly observations, or `None`
+        if the weather API has no hourly data for the city and date.
+
+    Raises:
+        Exception: If there is an error fetching or storing weather data.
+    """
+    alias = crud.normalize_city(city)
+    key = cache_key(alias, date)
+    if hot_cache.get(key) is MISSING:
+        _NEGATIVE_CACHE_HITS.inc()
+        return None
+
+    response, stored = await _stored_hourly(db, city, alias, date)
+    if response is not None:
+        return response
+    if not stored:
+        # Join the `get_weather` miss for this day, or start it: the hours are stored with the day
+        if await _misses.do(key, lambda: _fetch_and_store(db, city, date, alias, key)) is None:
+            return None
+        response, stored = await _stored_hourly(db, city, alias, date)
+        if response is not None or not stored:
+            return response
+
+    # Stored before hourly series were kept; daily lookups never fetch this day again
+    return await _misses.do(("hourly", key), lambda: _fetch_hourly(db, city, date, alias, key))
+
+async def _stored_hourly(db: AsyncSession, city: str, alias: str, date: datetime) -> tuple:
+    # (the hourly response from the write-behind queue or the database, or None; whether the day is there at all)
+    queued = writer.get((alias, date))
+    if queued is not None and queued.hourly is not None:
+        _WRITE_BEHIND_HITS.inc()
+        return hourly.response(crud.location_of(queued).name, date, queued.hourly), True
+
+    stored = await crud.get_weather_hourly(db, city, date)
+    if stored is not None and stored[1] is not None:
+        _DATABASE_HITS.inc()
+        _touch((stored[0].location_id, date))
+        return hourly.response(stored[0].city, date, hourly.from_row(stored[1])), True
+    return None, queued is not None or stored is not None
+
+async def _fetch_hourly(db: AsyncSession, city: str, date: datetime, alias: str, key):
+    # The day was stored before hourly series were kept
+    try:
+        weather_data = parse_forecast(city, date, await fetch_weather_data(city, date))
+    except httpx.HTTPStatusError as e:
+        if not is_no_data(e):
+            raise
+        weather_data = None
+
+    if weather_data is None:
+        _UPSTREAM_NO_DATA.inc()
+        hot_cache.set_missing(key)
+        await _shared_set({(alias, date): None})
+        return None
+    _UPSTREAM_FETCHES.inc()
+
+    response = await _store(db, alias, weather_data)
+    await _shared_set({(alias, date): weather_data})
+    if weather_data.hourly is None:
+        return None
+    return hourly.response(response.city, date, weather_data.hourly)
+
+def is_no_data(error: Exception) -> bool:
+    """
+    Tell whether an upstream error means the API simply has no data for the query.
+
+    Args:
+        error (Exception): An error raised by `fetch_weather_data`.
+
+    Returns:
+        bool: True for HTTP statuses listed in `Config.NEGATIVE_CACHE_STATUSES`.
+    """
+    return (
+        isinstance(error, httpx.HTTPStatusError)
+        and error.response.status_code in Config.NEGATIVE_CACHE_STATUSES
+    )
+
+def parse_location(data: dict) -> schemas.LocationCreate | None:
+    """
+    Read the location the weather API resolved a query to.
+
+    Args:
+        data (dict): The response returned by `fetch_weather_data`.
+
+    Returns:
+        schemas.LocationCreate or None: The location, or `None` if the response has none.
+    """
+    location = data.get("location") or {}
+    if not location.get("name"):
+        return None
+    return schemas.LocationCreate(
+        name=location["name"],
+        region=location.get("region") or None,
+        country=location.get("country") or None,
+        lat=location.get("lat"),
+        lon=location.get("lon"),
+    )
+
+def parse_forecast(city: str, date: datetime, data: dict) -> schemas.WeatherCreate | None:
+    """
+    Build the weather record for one day from a history API response.
+
+    Args:
+        city (str): The city name to store.
+        date (datetime): The date to store.
+        data (dict): The response returned by `fetch_weather_data`.
+
+    Daily fields missing from the day's summary are derived from its hours.
+
+    Returns:
+        schemas.WeatherCreate or None: The weather data object, or `None` if the
+        response contains no forecast day.
+    """
+    forecastday = data["forecast"]["forecastday"]
+    if not forecastday:
+        return None
+    series = hourly.parse_hours(forecastday[0])
+
+    # Create a weather data object
+    return schemas.WeatherCreate(
+        city=city,
+        date=date,
+        **_daily_fields(forecastday[0], series),
+        location=parse_location(data),
+        hourly=series,
+    )
+
+# Keys of a forecast day's summary holding each daily field
+_DAILY_KEYS = {"min_temp": "mintemp_c", "max_temp": "maxtemp_c", "avg_temp": "avgtemp_c", "humidity": "avghumidity"}
+
+def _daily_fields(day: dict, series: schemas.HourlySeries | None) -> dict:
+    # The daily fields of a forecast day, those the summary lacks derived from the hours
+    fields = {field: day["day"].get(key) for field, key in _DAILY_KEYS.items()}
+    if series is not None and None in fields.values():
+        derived = hourly.daily_summary(series)
+        fields = {field: derived[field] if value is None else value for field, value in fields.items()}
+    return fields
+
+async def get_weather_batch(db: AsyncSession, items: list) -> dict:
+    """
+    Retrieve weather data for many (city, date) pairs at once.
+
+    Pairs found in the hot cache are answered directly, the rest are looked up with
+    one set-based database query, and then in the shared cache, if configured,
+    with one multi-get. Remaining misses are fetched from the external API
+    concurrently, at most `Config.BATCH_CONCURRENCY` at a time, and stored in a
+    single transaction with the records found in the shared cache. Failures are
+    reported per pair instead of failing the batch.
+
+    Args:
+        db (AsyncSession): The asyncio database session object.
+        items (list): (city, date) tuples; duplicates (after normalization) are resolved once.
+
+    Returns:
+        dict: Maps each (normalized city, date) key to a `schemas.WeatherResponse`
+        (`schemas.QueuedWeatherResponse` while queued for write-behind), `None` if the
+        weather API has no data, or the exception that prevented retrieval.
+    """
+    requested = {}
+    for city, date in items:
+        requested.setdefault((crud.normalize_city(city), date), city)
+
+    results = {}
+    for key in requested:
+        cached = hot_cache.get(cache_key(*key))
+        if cached is MISSING:
+            _NEGATIVE_CACHE_HITS.inc()
+            results[key] = None
+        elif cached is not None:
+            _HOT_CACHE_HITS.inc()
+            _touch(cache_key(*key))
+            results[key] = cached
+        elif (queued := writer.get(key)) is not None:
+            _WRITE_BEHIND_HITS.inc()
+            results[key] = _queued_response(queued)
+
+    # Rows found and records fetched below are copied to the shared cache
+    share_rows, share = {}, {}
+    pending = [(requested[key], key[1]) for key in requested if key not in results]
+    if pending:
+        for key, weather_data in (await crud.get_weather_many(db, pending)).items():
+            _DATABASE_HITS.inc()
+            results[key] = _remember(key[0], weather_data)
+            share_rows[key] = weather_data
+
+    # Records another node fetched are stored here like fetched ones
+    to_store = {}
+    for key, shared in (await _shared_get([key for key in requested if key not in results])).items():
+        _SHARED_CACHE_HITS.inc()
+        if shared is MISSING:
+            hot_cache.set_missing(cache_key(*key))
+            results[key] = None
+        else:
+            to_store[key] = shared
+
+    misses = [key for key in requested if key not in results and key not in to_store]
+    semaphore = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+    async def fetch(key):
+        city, date = requested[key], key[1]
+        async with semaphore:
+            try:
+                return parse_forecast(city, date, await fetch_weather_data(city, date))
+            except Exception as e:
+                if is_no_data(e):
+                    return None
+                return e
+
+    fetched = dict(zip(misses, await asyncio.gather(*(fetch(key) for key in misses))))
+    for key, outcome in fetched.items():
+        if outcome is None:
+            _UPSTREAM_NO_DATA.inc()
+            hot_cache.set_missing(cache_key(*key))
+            results[key] = share[key] = None
+        elif isinstance(outcome, Exception):
+            logger.error("Error fetching weather data for %s on %s: %s", requested[key], key[1], outcome)
+            results[key] = outcome
+        else:
+            _UPSTREAM_FETCHES.inc()
+            to_store[key] = share[key] = outcome
+
+    if to_store and Config.WRITE_BEHIND_ENABLED:
+        for key, weather_data in to_store.items():
+            results[key] = await _store(db, key[0], weather_data)
+    elif to_store:
+        try:
+            stored = await crud.create_weather_many(db, list(to_store.values()))
+        except Exception as e:
+            logger.error("Error saving batch weather data: %s", e)
+            for key in to_store:
+                results[key] = e
+        else:
+            for key, weather_data in zip(to_store, stored):
+                results[key] = _remember(key[0], weather_data)
+
+    await _share_rows(db, share_rows)
+    await _shared_set(share)
+    return results
+
+def parse_forecastdays(city: str, data: dict) -> list:
+    """
+    Build weather records for every day in a history API response.
+
+    Args:
+        city (str): The city name to store.
+        data (dict): The response returned by `fetch_weather_data`.
+
+    Returns:
+        list: `schemas.WeatherCreate` objects, one per `forecastday` entry; daily
+        fields missing from a day's summary are derived from its hours.
+    """
+    location = parse_location(data)
+    records = []
+    for day in data["forecast"]["forecastday"]:
+        series = hourly.parse_hours(day)
+        records.append(schemas.WeatherCreate(
+            city=city,
+            date=datetime.strptime(day["date"], "%Y-%m-%d"),
+            **_daily_fields(day, series),
+            location=location,
+            hourly=series,
+        ))
+    return records
+
+def plan_range_fetches(missing: list, max_days: int) -> list:
+    """
+    Cover missing days with as few upstream range calls as possible.
+
+    Windows are opened greedily at the earliest uncovered day and span at most
+    `max_days` days, so a window may re-fetch cached days between two gaps when
+    that saves a call.
+
+    Args:
+        missing (list): Sorted datetimes that are not cached.
+        max_days (int): Maximum days per upstream call.
+
+    Returns:
+        list: (start, end) datetime tuples, inclusive.
+    """
+    windows = []
+    for day in missing:
+        if windows and (day - windows[-1][0]).days < max_days:
+            windows[-1][1] = day
+        else:
+            windows.append([day, day])
+    return [tuple(window) for window in windows]
+
+async def get_weather_range(db: AsyncSession, city: str, start: datetime, end: datetime) -> list:
+    """
+    Retrieve daily weather for a city over a date range.
+
+    Stored days are read with one range query, and days missing from it are looked
+    up in the shared cache, if configured. Remaining days are fetched from the
+    external API with ranged `dt`/`end_dt` calls (see `plan_range_fetches`), run
+    concurrently, and every returned day is stored with one bulk upsert, together
+    with the days found in the shared cache. When a
+    call fails, the days the other calls returned are still stored before the
+    error is raised, so a retry only fetches the failed windows again.
+
+    Args:
+        db (AsyncSession): The asyncio database session object.
+        city (str): The name of the city to get weather data for.
+        start (datetime): The first date of the range.
+        end (datetime): The last date of the range, inclusive.
+
+    Returns:
+        list: `schemas.WeatherResponse` objects (`schemas.QueuedWeatherResponse` for days
+        queued for write-behind) ordered by date. Days the weather API has no data
+        for are left out.
+
+    Raises:
+        Exception: If there is an error fetching or storing weather data; the first
+        error if several windows failed.
+    """
+    alias = crud.normalize_city(city)
+    found = {}
+    for weather_data in await crud.get_weather_range(db, city, start, end):
+        _touch((weather_data.location_id, weather_data.date))
+        found[weather_data.date] = schemas.WeatherResponse.model_validate(weather_data)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    for day in days:
+        if day not in found and (queued := writer.get((alias, day))) is not None:
+            found[day] = _queued_response(queued)
+    shared = {}
+    for (_, day), record in (await _shared_get([(alias, day) for day in days if day not in found])).items():
+        if record is not MISSING:
+            _SHARED_CACHE_HITS.inc()
+            shared[day] = record
+    missing = [day for day in days if day not in found and day not in shared]
+
+    if missing or shared:
+        semaphore = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+        async def fetch(window):
+            async with semaphore:
+                try:
+                    return parse_forecastdays(city, await fetch_weather_data(city, window[0], window[1]))
+                except httpx.HTTPStatusError as e:
+                    if is_no_data(e):
+                        return []
+                    raise
+
+        windows = plan_range_fetches(missing, Config.UPSTREAM_MAX_RANGE_DAYS)
+        fetched = await asyncio.gather(*(fetch(window) for window in windows), return_exceptions=True)
+        errors = [outcome for outcome in fetched if isinstance(outcome, BaseException)]
+        # Days of the windows that succeeded are stored even if another window failed;
+        # days a window re-fetched between two gaps are already known
+        fetched_days = [
+            day for days_fetched in fetched if not isinstance(days_fetched, BaseException)
+            for day in days_fetched if start <= day.date <= end and day.date not in found and day.date not in shared
+        ]
+        to_store = list(shared.values()) + fetched_days
+        try:
+            if to_store and Config.WRITE_BEHIND_ENABLED:
+                for weather_data in to_store:
+                    found[weather_data.date] = await _store(db, alias, weather_data)
+            elif to_store:
+                for weather_data in await crud.create_weather_many(db, to_store):
+                    found[weather_data.date] = schemas.WeatherResponse.model_validate(weather_data)
+        except Exception as e:
+            logger.error("Error saving weather range for %s: %s", city, e)
+            raise
+        await _shared_set({(alias, day.date): day for day in fetched_days})
+        if errors:
+            logger.error("Error fetching %d of %d windows of the weather range for %s: %s",
+                         len(errors), len(windows), city, errors[0])
+            raise errors[0]
+
+    return [found[day] for day in days if day in found]
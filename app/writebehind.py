@@ -0,0 +1,200 @@
+import asyncio
+from collections import deque
+from typing import Callable, Hashable, Optional
+from app import crud, database, schemas
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """
+    Buffer freshly fetched weather records and store them in batches in the background.
+
+    Records are queued with `put` and written with `crud.create_weather_many`, one
+    transaction per `batch_size` records, once `batch_size` records are waiting or
+    every `interval` seconds. Queued records can be read back with `get` until they
+    are stored, so lookups in this process see their own writes.
+
+    When a batch fails, the flush retries with batches half the size until a
+    single record fails, which narrows a record that can never be written down
+    to itself. That record is moved to the back of the queue for the next flush,
+    so it doesn't hold up the others, and after `max_attempts` failed writes it
+    is dropped to `dead_letters`. When `max_pending` records are waiting, `put`
+    flushes first; if that fails, the new record is not queued, so the queue
+    stays bounded while the database is down.
+    """
+
+    def __init__(self, batch_size=100, interval=0.05, max_pending=10000, max_attempts=3, session_factory=None,
+                 on_flush: Optional[Callable[[list, list], None]] = None):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.on_flush = on_flush
+        self._session_factory = session_factory
+        self._pending = {}
+        self._attempts = {}
+        # (key, record) of the latest records given up on, for inspection
+        self.dead_letters = deque(maxlen=100)
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.queued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.dead_lettered = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _session(self):
+        return (self._session_factory or database.AsyncSessionLocal)()
+
+    def get(self, key: Hashable) -> Optional[schemas.WeatherCreate]:
+        """
+        Return the queued record for a key, if it has not been stored yet.
+
+        Args:
+            key (Hashable): The key the record was queued under.
+
+        Returns:
+            schemas.WeatherCreate or None: The queued record.
+        """
+        return self._pending.get(key)
+
+    async def put(self, key: Hashable, weather: schemas.WeatherCreate) -> bool:
+        """
+        Queue a record for storage, replacing any queued record for the same key.
+
+        When `max_pending` records are already waiting, they are flushed first. If
+        that fails the record is not queued; the caller can still answer with it.
+
+        Args:
+            key (Hashable): Identifies the record for `get` and `on_flush`, e.g. (city, date).
+            weather (schemas.WeatherCreate): The record to store.
+
+        Returns:
+            bool: True if the record was queued.
+        """
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush of %d records failed: %s", len(self._pending), e)
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                return False
+        self._pending[key] = weather
+        self.queued += 1
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        return True
+
+    async def flush(self):
+        """
+        Store every queued record now, in batches of `batch_size`.
+
+        After each batch, `on_flush` is called with the keys and the stored
+        `models.Weather` rows, in the same order.
+
+        Raises:
+            Exception: If a record cannot be stored on its own; it stays queued,
+            behind the others, unless it has failed `max_attempts` times.
+        """
+        async with self._lock:
+            size = self.batch_size
+            while self._pending:
+                batch = list(self._pending.items())[:size]
+                try:
+                    async with self._session() as db:
+                        stored = await crud.create_weather_many(db, [weather for _, weather in batch])
+                except Exception:
+                    self.failures += 1
+                    if len(batch) > 1:
+                        size = max(1, len(batch) // 2)
+                        continue
+                    self._failed(*batch[0])
+                    raise
+
+                for key, weather in batch:
+                    # A newer record queued during the write is kept for the next batch
+                    if self._pending.get(key) is weather:
+                        del self._pending[key]
+                        self._attempts.pop(key, None)
+                self.written += len(batch)
+                self.flushes += 1
+                if self.on_flush is not None:
+                    self.on_flush([key for key, _ in batch], stored)
+
+    def _failed(self, key: Hashable, weather: schemas.WeatherCreate):
+        # Move a record that failed on its own behind the others, or give up on it
+        if self._pending.get(key) is not weather:
+            # Replaced by a newer record during the write, which gets attempts of its own
+            self._attempts.pop(key, None)
+            return
+        del self._pending[key]
+        attempts = self._attempts.pop(key, 0) + 1
+        if attempts < self.max_attempts:
+            self._pending[key] = weather
+            self._attempts[key] = attempts
+            return
+        self.dead_letters.append((key, weather))
+        self.dead_lettered += 1
+        logger.error("Write-behind gave up on %s after %d failed writes", key, attempts)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush of %d records failed: %s", len(self._pending), e)
+
+    def start(self):
+        """
+        Start flushing in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """
+        Stop the background task and store every record still queued.
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush on shutdown failed, %d records lost: %s", len(self._pending), e)
+
+    def stats(self) -> dict:
+        """
+        Return the queue counters.
+
+        Returns:
+            dict: Records queued, pending, written, rejected while the queue was full
+            and given up on, flushes and failed batch writes.
+        """
+        return {
+            "running": self._task is not None,
+            "queued": self.queued,
+            "pending": len(self._pending),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "dead_lettered": self.dead_lettered,
+        }
@@ -0,0 +1,111 @@
+"""
+Replay a messy query log and measure how often equivalent city spellings share cache entries.
+
+Usage:
+    python -m benchmarks.bench_aliases --requests 20000 --cities 200 --days 30
+
+The log draws cities from a Zipf-like popularity curve and writes each one the
+way users do: in any case, with stray whitespace, and with or without a region
+or country ("London", "london ", "London, UK", "London, United Kingdom", ...).
+It is replayed through `weather.get_weather` against a SQLite file, with a
+stand-in for the weather API that resolves every spelling to one location.
+
+"by_spelling" is what keying on the normalized spelling alone would cost: one
+upstream call per distinct (spelling, date). "by_location" is the measured run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+from app import crud, database, weather  # noqa: E402
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+START = datetime(2024, 1, 1)
+SUFFIXES = ["", "", "", ", UK", ", United Kingdom", ", England", ",GB"]
+
+
+def _spelling(rng: random.Random, city: str) -> str:
+    name = rng.choice([city, city.lower(), city.upper(), city.title()])
+    name += rng.choice(SUFFIXES)
+    return rng.choice(["", " "]) + name.replace(" ", rng.choice([" ", "  "])) + rng.choice(["", " ", "  "])
+
+
+def query_log(requests: int, cities: int, days: int, seed: int = 1) -> list:
+    """Build (city as typed, date) pairs with Zipf-distributed city popularity."""
+    rng = random.Random(seed)
+    names = [f"Town {i}" for i in range(cities)]
+    weights = [1 / (rank + 1) for rank in range(cities)]
+    return [
+        (_spelling(rng, rng.choices(names, weights)[0]), START + timedelta(days=rng.randrange(days)))
+        for _ in range(requests)
+    ]
+
+
+def _fake_fetch(calls: list):
+    async def fetch(city, date):
+        calls.append(city)
+        name = city.split(",")[0].strip().title()
+        return {
+            "location": {"name": " ".join(name.split()), "region": "", "country": "United Kingdom",
+                         "lat": 0.0, "lon": 0.0},
+            "forecast": {"forecastday": [{"day": {
+                "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+            }}]},
+        }
+    return fetch
+
+
+async def run(url: str, log: list) -> dict:
+    engine = database.create_async_db_engine(url)
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    calls = []
+    weather.fetch_weather_data = _fake_fetch(calls)
+
+    start = time.perf_counter()
+    for city, date in log:
+        async with SessionLocal() as db:
+            await weather.get_weather(db, city, date)
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+
+    spellings = {crud.normalize_city(city) for city, _ in log}
+    by_spelling = len({(crud.normalize_city(city), date) for city, date in log})
+    return {
+        "requests": len(log),
+        "distinct_spellings": len(spellings),
+        "by_spelling": {"upstream_calls": by_spelling, "hit_ratio": round(1 - by_spelling / len(log), 4)},
+        "by_location": {
+            "upstream_calls": len(calls),
+            "hit_ratio": round(1 - len(calls) / len(log), 4),
+            "hot_cache_hit_ratio": round(weather.hot_cache.hits / len(log), 4),
+            "seconds": round(elapsed, 3),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = database.create_db_engine(url)
+        database.Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        log = query_log(args.requests, args.cities, args.days, args.seed)
+        print(json.dumps(asyncio.run(run(url, log)), indent=2))
@@ -0,0 +1,90 @@
+"""
+Compare resolving many cached (city, date) pairs one by one versus with POST /weather/batch.
+
+Usage:
+    python -m benchmarks.bench_batch --pairs 300
+
+Both runs read the same SQLite file with the hot cache disabled. The report
+lists wall-clock time and the number of SQL statements sent to the database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app import database, main, models, weather  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def _populate(url: str, pairs: int) -> list:
+    engine = create_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    items = []
+    with Session(engine) as db:
+        locations = insert_locations(db, (f"City{i % 50}" for i in range(pairs)))
+        for i in range(pairs):
+            city, date = f"City{i % 50}", datetime(2024, 1, 1) + timedelta(days=i // 50)
+            db.add(models.Weather(location_id=locations[city], city=city, date=date,
+                                  min_temp=1.0, max_temp=2.0, avg_temp=1.5, humidity=50.0))
+            items.append({"city": city, "date": date.strftime("%Y-%m-%d")})
+        db.commit()
+    engine.dispose()
+    return items
+
+
+async def run(url: str, items: list) -> dict:
+    engine = create_async_engine(database.to_async_url(url))
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(1))
+
+    async def get_async_db():
+        async with SessionLocal() as db:
+            yield db
+
+    main.app.dependency_overrides[database.get_async_db] = get_async_db
+    weather.hot_cache.maxsize = 0
+    transport = httpx.ASGITransport(app=main.app)
+    results = {}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        statements.clear()
+        start = time.perf_counter()
+        for item in items:
+            (await client.get("/weather", params=item)).raise_for_status()
+        results["one_by_one"] = {"seconds": round(time.perf_counter() - start, 4), "sql_statements": len(statements)}
+
+        statements.clear()
+        start = time.perf_counter()
+        response = await client.post("/weather/batch", json={"items": items})
+        response.raise_for_status()
+        assert all(r["status"] == "ok" for r in response.json()["results"])
+        results["batch"] = {"seconds": round(time.perf_counter() - start, 4), "sql_statements": len(statements)}
+
+    await engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        items = _populate(url, args.pairs)
+        print(json.dumps(asyncio.run(run(url, items)), indent=2))
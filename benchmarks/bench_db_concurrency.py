@@ -0,0 +1,138 @@
+"""
+Measure /weather hit throughput as the number of in-flight requests grows.
+
+Usage:
+    python -m benchmarks.bench_db_concurrency --rows 20000 --requests 2000
+
+"blocking" is the previous endpoint, which ran the synchronous SQLAlchemy
+`Session` inside `async def` and so held the event loop for every query;
+"async" is the current endpoint on `AsyncSession`. Both answer from the same
+SQLite file with the hot cache disabled, so every request reaches the database.
+Each request also awaits `--io-delay` seconds of simulated non-DB I/O (auth,
+logging sinks, ...), which can only overlap with queries when the loop is free.
+
+Both engines get a pool as large as the highest concurrency level: with a
+smaller pool the blocking variant deadlocks, because a request waiting for a
+connection holds the event loop that the connection owners need to finish.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from fastapi import Depends, FastAPI  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+from sqlalchemy.pool import AsyncAdaptedQueuePool  # noqa: E402
+
+from app import database, main, models, schemas, weather  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+START = datetime(2020, 1, 1)
+
+
+def _populate(url: str, rows: int, cities: int) -> list:
+    engine = create_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    keys = []
+    with Session(engine) as db:
+        locations = insert_locations(db, (f"City{i % cities}" for i in range(rows)))
+        for i in range(rows):
+            city, date = f"City{i % cities}", START + timedelta(days=i // cities)
+            db.add(models.Weather(location_id=locations[city], city=city, date=date,
+                                  min_temp=1.0, max_temp=2.0, avg_temp=1.5, humidity=50.0))
+            keys.append((city, date.strftime("%Y-%m-%d")))
+        db.commit()
+    engine.dispose()
+    return keys
+
+
+def _blocking_app(url: str, io_delay: float, pool_size: int) -> FastAPI:
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=pool_size)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    app = FastAPI()
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/weather", response_model=schemas.WeatherResponse)
+    async def get_weather(city: str, date: str, db: Session = Depends(get_db)):
+        await asyncio.sleep(io_delay)
+        date_obj = datetime.strptime(date, "%Y-%m-%d")
+        return db.query(models.Weather).filter(models.Weather.city == city, models.Weather.date == date_obj).first()
+
+    return app
+
+
+def _async_app(url: str, io_delay: float, pool_size: int) -> FastAPI:
+    engine = create_async_engine(database.to_async_url(url), poolclass=AsyncAdaptedQueuePool, pool_size=pool_size)
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def get_async_db():
+        await asyncio.sleep(io_delay)
+        async with SessionLocal() as db:
+            yield db
+
+    main.app.dependency_overrides[database.get_async_db] = get_async_db
+    return main.app
+
+
+async def _drive(app: FastAPI, keys: list, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    sample = random.Random(0).choices(keys, k=requests)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(key):
+            async with semaphore:
+                response = await client.get("/weather", params={"city": key[0], "date": key[1]})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(key) for key in sample))
+        return requests / (time.perf_counter() - start)
+
+
+async def run(url: str, keys: list, requests: int, levels: list, io_delay: float) -> dict:
+    weather.hot_cache.maxsize = 0
+    pool_size = max(levels)
+    apps = {"blocking": _blocking_app(url, io_delay, pool_size), "async": _async_app(url, io_delay, pool_size)}
+    results = {}
+    for name, app in apps.items():
+        results[name] = {}
+        for concurrency in levels:
+            rps = await _drive(app, keys, requests, concurrency)
+            results[name][str(concurrency)] = round(rps, 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--io-delay", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        keys = _populate(url, args.rows, args.cities)
+        results = asyncio.run(run(url, keys, args.requests, args.concurrency, args.io_delay))
+    print(json.dumps({"requests_per_second": results}, indent=2))
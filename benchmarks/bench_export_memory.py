@@ -0,0 +1,86 @@
+"""
+Stream a multi-million-row weather table through the export path and track memory.
+
+Usage:
+    python -m benchmarks.bench_export_memory --rows 2000000 --format ndjson
+
+Resident memory is sampled after every exported chunk. With a server-side cursor
+it should plateau within the first chunks and stay flat until the end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app import database, export, models  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _populate(url: str, rows: int):
+    engine = create_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    start = datetime(1990, 1, 1)
+    with engine.begin() as conn:
+        locations = insert_locations(conn, (f"City{i}" for i in range(min(rows, 1000))))
+        for offset in range(0, rows, 50000):
+            conn.execute(insert(models.Weather), [
+                {"location_id": locations[f"City{i % 1000}"], "city": f"City{i % 1000}", "city_key": f"city{i % 1000}",
+                 "date": start + timedelta(days=i // 1000),
+                 "min_temp": 1.0, "max_temp": 2.0, "avg_temp": 1.5, "humidity": 50.0}
+                for i in range(offset, min(rows, offset + 50000))
+            ])
+    engine.dispose()
+
+
+async def run(url: str, rows: int, format: str) -> dict:
+    engine = create_async_engine(database.to_async_url(url))
+    database.AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    checkpoints = {round(rows * fraction): None for fraction in (0.01, 0.1, 0.5, 1.0)}
+    exported, written, peak = 0, 0, 0.0
+    start = time.perf_counter()
+
+    async for chunk in export.export_weather(format):
+        exported += chunk.count("\n")
+        written += len(chunk)
+        peak = max(peak, _rss_mb())
+        for mark in checkpoints:
+            if checkpoints[mark] is None and exported >= mark:
+                checkpoints[mark] = round(_rss_mb(), 1)
+
+    await engine.dispose()
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "format": format,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed),
+        "megabytes_written": round(written / 2**20, 1),
+        "rss_mb_at_rows": {str(mark): value for mark, value in checkpoints.items()},
+        "peak_rss_mb": round(peak, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--format", choices=sorted(export.MEDIA_TYPES), default="ndjson")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/export.db"
+        _populate(url, args.rows)
+        print(json.dumps(asyncio.run(run(url, args.rows, args.format)), indent=2))
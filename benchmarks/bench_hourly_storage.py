@@ -0,0 +1,101 @@
+"""
+Measure what keeping hourly observations costs in database size per city-day.
+
+Usage:
+    python -m benchmarks.bench_hourly_storage --cities 20 --days 365
+
+The same synthetic days (24 hours of the fields in `hourly.HOURLY_FIELDS`, as
+the stub upstream returns them) are stored three ways in SQLite files:
+
+- "daily_only": the `weather` rows alone, the baseline.
+- "packed": `weather` plus `weather_hourly`, one row of float32 arrays per day.
+- "row_per_hour": `weather` plus a child table with one row per hour.
+
+Each file is vacuumed before it is measured; "hourly_bytes_per_day" is the size
+over the baseline divided by the number of city-days. "json_bytes_per_day" is
+the size of the hourly entries as the weather API sends them, for reference.
+"""
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert, text  # noqa: E402
+
+from app import database, hourly, models  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+from benchmarks.stub_upstream import forecastday  # noqa: E402
+
+START = datetime(2023, 1, 1)
+
+
+def _days(cities: int, days: int):
+    for city in range(cities):
+        for offset in range(days):
+            date = START + timedelta(days=offset)
+            yield f"City{city}", date, forecastday(date.strftime("%Y-%m-%d"))
+
+
+def _store(path: str, cities: int, days: int, layout: str) -> int:
+    engine = create_engine(f"sqlite:///{path}")
+    database.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if layout == "row_per_hour":
+            conn.execute(text(
+                "CREATE TABLE weather_hourly_rows (weather_id INTEGER NOT NULL REFERENCES weather (id), "
+                "hour INTEGER NOT NULL, " + ", ".join(f"{field} FLOAT" for field in hourly.HOURLY_FIELDS)
+                + ", PRIMARY KEY (weather_id, hour))"
+            ))
+        locations = insert_locations(conn, (f"City{city}" for city in range(cities)))
+        for city, date, day in _days(cities, days):
+            weather_id = conn.execute(insert(models.Weather).values(
+                location_id=locations[city], city=city, city_key=city.lower(), date=date,
+                min_temp=day["day"]["mintemp_c"], max_temp=day["day"]["maxtemp_c"],
+                avg_temp=day["day"]["avgtemp_c"], humidity=day["day"]["avghumidity"],
+            ).returning(models.Weather.id)).scalar_one()
+            series = hourly.parse_hours(day)
+            if layout == "packed":
+                conn.execute(insert(models.WeatherHourly).values(weather_id=weather_id, **hourly.to_row(series)))
+            elif layout == "row_per_hour":
+                conn.execute(
+                    text("INSERT INTO weather_hourly_rows VALUES (:weather_id, :hour, "
+                         + ", ".join(f":{field}" for field in hourly.HOURLY_FIELDS) + ")"),
+                    [{"weather_id": weather_id, "hour": hour,
+                      **{field: getattr(series, field)[hour] for field in hourly.HOURLY_FIELDS}}
+                     for hour in range(hourly.HOURS)],
+                )
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    engine.dispose()
+    return os.path.getsize(path)
+
+
+def run(cities: int, days: int) -> dict:
+    city_days = cities * days
+    sizes = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in ("daily_only", "packed", "row_per_hour"):
+            sizes[layout] = _store(os.path.join(tmp, f"{layout}.db"), cities, days, layout)
+    sample = forecastday(START.strftime("%Y-%m-%d"))["hour"]
+    return {
+        "city_days": city_days,
+        "json_bytes_per_day": len(json.dumps(sample, separators=(",", ":"))),
+        "layouts": {
+            layout: {
+                "file_bytes": size,
+                "hourly_bytes_per_day": round((size - sizes["daily_only"]) / city_days, 1),
+            }
+            for layout, size in sizes.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    print(json.dumps(run(args.cities, args.days), indent=2))
@@ -0,0 +1,80 @@
+"""
+Run the retention job on a large weather.db and report what it reclaims.
+
+Usage:
+    python -m benchmarks.bench_retention --rows 500000 --keep 100000
+
+The table is filled with `--rows` rows for 1000 cities, each with its hourly
+series and a random last access in the past 90 days, so the evicted rows are
+scattered over the file as they are in production. The job then evicts down to
+`--keep` rows in batches and compacts the file with incremental vacuum.
+
+"lookup_ms_*" time point lookups of the same sampled keys before and after,
+through a connection with a small page cache and no memory map, so that pages
+not already cached cost a read.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+from app import database, hourly, models, schemas  # noqa: E402
+from app.retention import RetentionJob  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+NOW = datetime(2024, 6, 1)
+
+
+def _populate(url: str, rows: int, seed: int = 1):
+    rng = random.Random(seed)
+    series = hourly.to_row(schemas.HourlySeries(**{field: [float(hour) for hour in range(24)]
+                                                   for field in hourly.HOURLY_FIELDS}))
+    engine = database.create_db_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    start = datetime(1990, 1, 1)
+    with engine.begin() as conn:
+        locations = insert_locations(conn, (f"City{i}" for i in range(1000)))
+        for offset in range(0, rows, 20000):
+            ids = range(offset + 1, min(rows, offset + 20000) + 1)
+            conn.execute(insert(models.Weather), [
+                {"id": i, "location_id": locations[f"City{i % 1000}"], "city": f"City{i % 1000}",
+                 "city_key": f"city{i % 1000}", "date": start + timedelta(days=i // 1000),
+                 "min_temp": 1.0, "max_temp": 2.0, "avg_temp": 1.5, "humidity": 50.0,
+                 "last_accessed_at": NOW - timedelta(seconds=rng.randrange(90 * 86400))}
+                for i in ids
+            ])
+            conn.execute(insert(models.WeatherHourly), [{"weather_id": i, **series} for i in ids])
+    engine.dispose()
+
+
+async def run(rows: int, keep: int, batch_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/weather.db"
+        _populate(url, rows)
+        engine = database.create_async_db_engine(
+            url, pragmas={**database.SQLITE_PRAGMAS, "cache_size": -2000, "mmap_size": 0})
+        job = RetentionJob(max_rows=keep, batch_size=batch_size, pause=0.0, probes=500,
+                           session_factory=async_sessionmaker(engine, autoflush=False, expire_on_commit=False))
+        start = time.perf_counter()
+        report = await job.run_once(now=NOW)
+        await engine.dispose()
+    report["rows_per_second_evicted"] = round(sum(report["evicted"].values()) / (time.perf_counter() - start))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--keep", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.rows, args.keep, args.batch_size)), indent=2))
@@ -0,0 +1,91 @@
+"""
+Measure per-request CPU time of serving a cached weather row.
+
+Usage:
+    python -m benchmarks.bench_serialization --requests 5000
+
+"response_model" is the previous /weather hot path: the endpoint returned the
+validated `WeatherResponse` and FastAPI validated it again against
+`response_model` and encoded the result with `json.dumps`.
+"orjson" is the current path, which writes the row's bytes directly with
+`serialization.dump_weather`. Both endpoints answer from memory, so the
+difference is serialization alone; "encode" times just that step, and
+"request" a whole in-process ASGI request (the client's share of CPU included
+for both).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import timeit
+from datetime import datetime
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from fastapi import FastAPI, Response  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app import schemas, serialization  # noqa: E402
+
+ROW = schemas.WeatherResponse(id=1, city="London", date=datetime(2024, 8, 8), min_temp=10.2, max_temp=21.7,
+                              avg_temp=15.9, humidity=61.0)
+
+
+def _apps() -> dict:
+    before = FastAPI()
+
+    @before.get("/weather", response_model=schemas.WeatherResponse)
+    async def response_model_path(city: str, date: str):
+        return ROW
+
+    after = FastAPI()
+
+    @after.get("/weather", response_model=schemas.WeatherResponse)
+    async def orjson_path(city: str, date: str):
+        return Response(serialization.dump_weather(ROW), media_type="application/json")
+
+    return {"response_model": before, "orjson": after}
+
+
+def _encode_costs(number: int) -> dict:
+    adapter = TypeAdapter(schemas.WeatherResponse)
+
+    def before():
+        # What FastAPI does with a returned model and a response_model: dump, validate, serialize, json.dumps
+        content = adapter.validate_python(ROW.model_dump(by_alias=True))
+        JSONResponse(adapter.dump_python(content, mode="json"))
+
+    def after():
+        Response(serialization.dump_weather(ROW), media_type="application/json")
+
+    return {name: round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 2)
+            for name, fn in (("response_model", before), ("orjson", after))}
+
+
+async def _request_costs(requests: int) -> dict:
+    results = {}
+    for name, app in _apps().items():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            params = {"city": "London", "date": "2024-08-08"}
+            for _ in range(200):
+                await client.get("/weather", params=params)
+            start = time.process_time()
+            for _ in range(requests):
+                await client.get("/weather", params=params)
+            results[name] = round((time.process_time() - start) / requests * 1e6, 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "encode_us": _encode_costs(args.requests),
+        "request_cpu_us": asyncio.run(_request_costs(args.requests)),
+    }, indent=2))
@@ -0,0 +1,146 @@
+"""
+Measure concurrent read throughput on SQLite while cache misses are being written.
+
+Usage:
+    python -m benchmarks.bench_sqlite_wal --rows 20000 --readers 16 --writers 2 --write-rate 200 --seconds 5 --dir .
+
+Readers in this process look up stored (city, date) keys the way cache hits do,
+each with its own session. Writer processes meanwhile store new rows with one
+commit per row at a fixed total `--write-rate`, the way misses from other
+workers do. Reads are measured alone
+and then under write load.
+
+"rollback" is SQLite's default rollback journal with synchronous=FULL, where a
+committing writer locks readers out; "wal" is the tuned configuration from
+`database.SQLITE_PRAGMAS`. Both use the same busy timeout, so lock contention
+shows up as latency rather than errors. Use `--dir` to put the database on a
+real disk: on tmpfs fsync is free and the difference shrinks.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app import database, models  # noqa: E402
+from app.crud import get_weather_by_city_and_date  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+START = datetime(2020, 1, 1)
+
+MODES = {
+    "rollback": {"busy_timeout": database.SQLITE_PRAGMAS["busy_timeout"], "journal_mode": "DELETE",
+                 "synchronous": "FULL"},
+    "wal": database.SQLITE_PRAGMAS,
+}
+
+
+def _row(city: str, date: datetime, location_id: int) -> dict:
+    return {"location_id": location_id, "city": city, "city_key": models.normalize_city(city), "date": date,
+            "min_temp": 1.0, "max_temp": 2.0, "avg_temp": 1.5, "humidity": 50.0}
+
+
+def _write(url: str, pragmas: dict, n: int, interval: float, stop, written):
+    engine = database.create_db_engine(url, pragmas=pragmas)
+    i = 0
+    next_write = time.perf_counter()
+    while not stop.is_set():
+        next_write += interval
+        time.sleep(max(0.0, next_write - time.perf_counter()))
+        i += 1
+        try:
+            with Session(engine) as db:
+                city = f"Miss{n}-{i}"
+                db.execute(insert(models.Weather), [_row(city, START, insert_locations(db, [city])[city])])
+                db.commit()
+            with written.get_lock():
+                written.value += 1
+        except OperationalError:
+            pass
+    engine.dispose()
+
+
+async def _read(url: str, pragmas: dict, keys: list, readers: int, seconds: float) -> dict:
+    engine = database.create_async_db_engine(url, pragmas=pragmas)
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    deadline = time.perf_counter() + seconds
+    latencies, errors = [], 0
+
+    async def reader(rng):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            city, date = rng.choice(keys)
+            start = time.perf_counter()
+            try:
+                async with SessionLocal() as db:
+                    await get_weather_by_city_and_date(db, city, date)
+            except OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(reader(random.Random(i)) for i in range(readers)))
+    await engine.dispose()
+
+    ordered = sorted(latencies)
+    percentile = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)  # noqa: E731
+    return {"reads_per_second": round(len(latencies) / seconds, 1), "read_p50_ms": percentile(0.50),
+            "read_p99_ms": percentile(0.99), "read_errors": errors}
+
+
+def run(mode: str, directory: str, rows: int, cities: int, readers: int, writers: int, write_rate: float,
+        seconds: float) -> dict:
+    pragmas = MODES[mode]
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        engine = database.create_db_engine(url, pragmas=pragmas)
+        database.Base.metadata.create_all(bind=engine)
+        keys = [(f"City{i % cities}", START + timedelta(days=i // cities)) for i in range(rows)]
+        with Session(engine) as db:
+            locations = insert_locations(db, (city for city, _ in keys))
+            db.execute(insert(models.Weather), [_row(city, date, locations[city]) for city, date in keys])
+            db.commit()
+        engine.dispose()
+
+        result = {"idle": asyncio.run(_read(url, pragmas, keys, readers, seconds))}
+
+        stop, written = multiprocessing.Event(), multiprocessing.Value("i", 0)
+        processes = [multiprocessing.Process(target=_write, args=(url, pragmas, n, writers / write_rate, stop, written))
+                     for n in range(writers)]
+        for process in processes:
+            process.start()
+        result["under_writes"] = asyncio.run(_read(url, pragmas, keys, readers, seconds))
+        stop.set()
+        for process in processes:
+            process.join()
+        result["under_writes"]["writes_per_second"] = round(written.value / seconds, 1)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--write-rate", type=float, default=200.0, help="target commits per second, all writers")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--dir", default=None, help="directory for the database file (default: system temp dir)")
+    args = parser.parse_args()
+
+    # One pooled connection per reader, so pool waits don't hide lock waits
+    database.DB_POOL_SIZE = args.readers
+    results = {mode: run(mode, args.dir, args.rows, args.cities, args.readers, args.writers, args.write_rate,
+                   args.seconds)
+               for mode in MODES}
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,103 @@
+"""
+Measure import time of `app.main` and time-to-first-request of a fresh server.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --revision HEAD~1
+
+Each run starts a new interpreter. "import" times `import app.main`; "first
+request" starts `uvicorn app.main:app` in an empty directory (so a new SQLite
+database is created) and times until GET /weather/stats, which reads the
+database, first succeeds. With --revision, the same measurements run on that git
+revision, checked out in a temporary worktree, for a before/after comparison.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _env(tree: Path) -> dict:
+    return {**os.environ, "PYTHONPATH": str(tree), "WEATHER_API_KEY": "benchmark"}
+
+
+def time_import(tree: Path, workdir: str) -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT], cwd=workdir, env=_env(tree), text=True)
+    return float(output.strip().splitlines()[-1])
+
+
+def time_first_request(tree: Path, workdir: str) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/weather/stats"
+    params = {"city": "London", "start": "2024-01-01", "end": "2024-01-31"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_env(tree),
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(url, params=params, timeout=1.0).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None or time.perf_counter() - start > 60:
+                raise RuntimeError("The server did not answer within 60 seconds.")
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def measure(tree: Path, runs: int) -> dict:
+    imports, first_requests = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            imports.append(time_import(tree, workdir))
+        with tempfile.TemporaryDirectory() as workdir:
+            first_requests.append(time_first_request(tree, workdir))
+    return {
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "first_request_ms": round(statistics.median(first_requests) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--revision", help="also measure this git revision, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    # Warm the OS file cache so the first run isn't an outlier
+    with tempfile.TemporaryDirectory() as workdir:
+        time_import(ROOT, workdir)
+
+    results = {"working tree": measure(ROOT, args.runs)}
+    if args.revision:
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = Path(tmp) / "tree"
+            subprocess.run(["git", "worktree", "add", "--detach", str(tree), args.revision], cwd=ROOT, check=True,
+                           capture_output=True)
+            try:
+                results[args.revision] = measure(tree, args.runs)
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", str(tree)], cwd=ROOT, check=True)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,99 @@
+"""
+Compare /weather/stats aggregation in SQL with a naive row-by-row Python computation.
+
+Usage:
+    python -m benchmarks.bench_stats --cities 20 --years 5 --bucket month --window 3
+
+The naive approach fetches every daily row as an ORM object and aggregates in a
+Python loop, which is what clients did before the endpoint existed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app import crud, database, models, stats  # noqa: E402
+from benchmarks.seed import insert_locations  # noqa: E402
+
+START = datetime(2015, 1, 1)
+
+
+def _populate(url: str, cities: int, days: int):
+    engine = create_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        locations = insert_locations(conn, (f"City{c}" for c in range(cities)))
+        conn.execute(insert(models.Weather), [
+            {"location_id": locations[f"City{c}"], "city": f"City{c}", "city_key": f"city{c}",
+             "date": START + timedelta(days=d),
+             "min_temp": d % 17 - 5.0, "max_temp": d % 23 + 5.0, "avg_temp": d % 19 * 1.0, "humidity": 40.0 + d % 50}
+            for c in range(cities) for d in range(days)
+        ])
+    engine.dispose()
+
+
+async def _naive(db, cities: list, start: datetime, end: datetime) -> dict:
+    rows = (await db.scalars(
+        select(models.Weather).filter(models.Weather.city.in_(cities), models.Weather.date.between(start, end))
+    )).all()
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row.city, row.date.strftime("%Y-%m-01"))].append(row)
+    result = {}
+    for key, group in groups.items():
+        result[key] = {
+            column: (sum(getattr(r, column) for r in group) / len(group),
+                     min(getattr(r, column) for r in group),
+                     max(getattr(r, column) for r in group))
+            for column in crud.STATS_COLUMNS
+        }
+    return result
+
+
+async def run(url: str, cities: list, end: datetime, bucket: str, window: int, repeat: int) -> dict:
+    engine = create_async_engine(database.to_async_url(url))
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+    timings = {"sql_group_by": [], "naive_python": []}
+
+    for _ in range(repeat):
+        async with SessionLocal() as db:
+            start = time.perf_counter()
+            response = await stats.get_weather_stats(db, cities, START, end, bucket, window)
+            timings["sql_group_by"].append(time.perf_counter() - start)
+        async with SessionLocal() as db:
+            start = time.perf_counter()
+            await _naive(db, cities, START, end)
+            timings["naive_python"].append(time.perf_counter() - start)
+
+    await engine.dispose()
+    result = {name: {"best_ms": round(min(t) * 1000, 2)} for name, t in timings.items()}
+    result["buckets_returned"] = len(response.series)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--bucket", choices=["day", "week", "month"], default="month")
+    parser.add_argument("--window", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    days = 365 * args.years
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/stats.db"
+        _populate(url, args.cities, days)
+        cities = [f"City{c}" for c in range(args.cities)]
+        result = asyncio.run(run(url, cities, START + timedelta(days=days - 1), args.bucket, args.window, args.repeat))
+        result["daily_rows"] = args.cities * days
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,84 @@
+"""
+Measure what per-request timing and profiling cost on a hot-cache /weather hit.
+
+Usage:
+    python -m benchmarks.bench_timing_overhead --requests 5000
+
+The real /weather endpoint is served from a warm hot cache through in-process
+ASGI requests, first as shipped (timing off, no middleware), then wrapped in
+`profiling.TimingMiddleware` with the Server-Timing header on, then with every
+request sampled. "phase_off_ns" is the cost of one `profiling.phase` block
+outside timed requests, the price paid by the instrumented code when timing is
+off, next to an empty `contextlib.nullcontext` block for scale. CPU time per
+request includes the client's share.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import timeit
+from contextlib import nullcontext
+from datetime import datetime
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from app import main, profiling, schemas, weather  # noqa: E402
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+ROW = schemas.WeatherResponse(id=1, city="London", date=datetime(2024, 8, 8), min_temp=10.2, max_temp=21.7,
+                              avg_temp=15.9, humidity=61.0)
+
+
+async def _cpu_per_request(app, requests: int) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        params = {"city": "London", "date": "2024-08-08"}
+        for _ in range(200):
+            await client.get("/weather", params=params)
+        start = time.process_time()
+        for _ in range(requests):
+            await client.get("/weather", params=params)
+        return round((time.process_time() - start) / requests * 1e6, 1)
+
+
+async def run(requests: int) -> dict:
+    weather.aliases.set("london", 1)
+    weather.hot_cache.set((1, datetime(2024, 8, 8)), ROW)
+
+    def phase_off():
+        with profiling.phase("serialize"):
+            pass
+
+    def null_context():
+        with nullcontext():
+            pass
+
+    def per_call_ns(fn):
+        return round(min(timeit.repeat(fn, number=100000, repeat=5)) / 100000 * 1e9, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        apps = {
+            "off": main.app,
+            "server_timing": profiling.TimingMiddleware(main.app, server_timing=True),
+            "server_timing_and_profile_all": profiling.TimingMiddleware(
+                main.app, server_timing=True, sample_rate=1.0, directory=tmp),
+        }
+        cpu_us = {name: await _cpu_per_request(app, requests) for name, app in apps.items()}
+    return {
+        "requests": requests,
+        "cpu_us_per_request": cpu_us,
+        "phase_off_ns": per_call_ns(phase_off),
+        "null_context_ns": per_call_ns(null_context),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
@@ -0,0 +1,87 @@
+"""
+Compare cache-miss upstream latency with a per-request client versus the shared pooled client.
+
+Usage:
+    python -m benchmarks.bench_upstream_client --requests 500 --concurrency 20 --latency 0.005
+
+"before" opens a new `httpx.AsyncClient` per call (the previous behaviour of
+`fetch_weather_data`); "after" reuses the application-scoped client. Against a
+loopback stub only TCP setup is saved; against the real API each avoided TLS
+handshake saves one or more extra round-trips.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+import httpx
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from app import weather  # noqa: E402
+from benchmarks.stub_upstream import StubServer  # noqa: E402
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def _fetch_with_new_client(city: str, date: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            weather.Config.WEATHER_API_URL,
+            params={"key": weather.Config.API_KEY, "q": city, "dt": date},
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+async def _run(fetch, requests: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(f"City{i}", "2024-08-08")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def _summary(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000  # noqa: E731
+    return {
+        "requests": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p99_ms": round(pick(0.99), 3),
+    }
+
+
+async def main(requests: int, concurrency: int):
+    before = await _run(_fetch_with_new_client, requests, concurrency)
+
+    await weather.open_http_client()
+    try:
+        after = await _run(weather.fetch_weather_data, requests, concurrency)
+    finally:
+        await weather.close_http_client()
+
+    print(json.dumps({"before_new_client": _summary(before), "after_shared_client": _summary(after)}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub upstream latency in seconds")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as stub:
+        weather.Config.WEATHER_API_URL = stub.url
+        asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,93 @@
+"""
+Compare cache-miss latency with one commit per miss versus write-behind batching.
+
+Usage:
+    python -m benchmarks.bench_write_behind --misses 2000 --concurrency 32
+
+Every request is a miss for a distinct (city, date), answered by an in-process
+stand-in for the weather API after `--upstream-latency` seconds, and goes through
+`weather.get_weather` against a SQLite file with the production pragmas. The
+report lists throughput, latency percentiles and the number of commits.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("WEATHER_API_KEY", "benchmark")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+from app import database, weather  # noqa: E402
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+START = datetime(2020, 1, 1)
+
+
+def _fake_fetch(latency: float):
+    async def fetch(city, date):
+        await asyncio.sleep(latency)
+        return {"forecast": {"forecastday": [{"day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }}]}}
+    return fetch
+
+
+async def run(url: str, write_behind: bool, misses: int, concurrency: int, latency: float) -> dict:
+    engine = database.create_async_db_engine(url)
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    commits = []
+    event.listen(engine.sync_engine, "commit", lambda *args: commits.append(1))
+
+    weather.fetch_weather_data = _fake_fetch(latency)
+    weather.Config.WRITE_BEHIND_ENABLED = write_behind
+    weather.writer = weather.WriteBehindQueue(session_factory=SessionLocal, on_flush=weather.writer.on_flush)
+    weather.writer.start()
+    weather.hot_cache.clear()
+
+    keys = [(f"City{i % 100}", START + timedelta(days=i // 100)) for i in range(misses)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def request(city, date):
+        async with semaphore:
+            started = time.perf_counter()
+            async with SessionLocal() as db:
+                await weather.get_weather(db, city, date)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(request(city, date) for city, date in keys))
+    elapsed = time.perf_counter() - started
+    await weather.writer.stop()
+    await engine.dispose()
+
+    ordered = sorted(latencies)
+    percentile = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)  # noqa: E731
+    return {"requests_per_second": round(misses / elapsed, 1), "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99), "commits": len(commits)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--misses", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--upstream-latency", type=float, default=0.005)
+    parser.add_argument("--dir", default=None, help="directory for the database file (default: system temp dir)")
+    args = parser.parse_args()
+
+    results = {}
+    for mode, write_behind in (("per_miss_commit", False), ("write_behind", True)):
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            url = f"sqlite:///{tmp}/bench.db"
+            engine = database.create_db_engine(url)
+            database.Base.metadata.create_all(bind=engine)
+            engine.dispose()
+            results[mode] = asyncio.run(run(url, write_behind, args.misses, args.concurrency, args.upstream_latency))
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,232 @@
+"""
+Reproducible load and latency benchmark for the weather service.
+
+Usage:
+    python -m benchmarks.loadtest --workloads hit-heavy miss-heavy mixed \\
+        --concurrency 32 --requests 2000 --upstream-latency 0.05 --output results.json
+    python -m benchmarks.loadtest --compare baseline.json results.json
+
+The service runs in its own uvicorn process (so the load generator does not
+share its interpreter), with a fresh SQLite database in a temporary directory,
+and points at a local stub of the weather API with configurable latency and
+error rate. Each workload sends `--requests` GET /weather requests with
+`--concurrency` in flight:
+
+- hit-heavy: 95% of requests for a warmed key set, 5% for new keys
+- miss-heavy: 5% warmed keys, 95% new keys
+- mixed: 50% warmed keys, 50% new keys
+
+The report is JSON with RPS, latency percentiles, status counts and the number
+of upstream calls per workload, plus the run parameters and git revision, so
+runs from different commits can be compared with --compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stub_upstream import StubServer
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Share of requests that target the warmed key set
+WORKLOADS = {"hit-heavy": 0.95, "miss-heavy": 0.05, "mixed": 0.5}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class ServiceProcess:
+    """Run the service with uvicorn in a subprocess, against a temporary database."""
+
+    def __init__(self, upstream_url: str, workers: int = 1, env: dict | None = None):
+        self.port = _free_port()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = {
+            **os.environ,
+            "PYTHONPATH": str(ROOT),
+            "WEATHER_API_KEY": "benchmark",
+            "WEATHER_API_URL": upstream_url,
+            "DATABASE_URL": f"sqlite:///{self.tmp.name}/weather.db",
+            **(env or {}),
+        }
+        self.command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                        "--port", str(self.port), "--log-level", "warning", "--workers", str(workers)]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        # The working directory also holds ./weather.db for builds that ignore DATABASE_URL
+        self.process = subprocess.Popen(self.command, cwd=self.tmp.name, env=self.env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{self.url}/docs", timeout=1.0)
+                return self
+            except httpx.TransportError:
+                if self.process.poll() is not None:
+                    raise RuntimeError("The service exited during startup.")
+                time.sleep(0.1)
+        raise RuntimeError("The service did not start within 30 seconds.")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+        self.tmp.cleanup()
+
+
+class KeySpace:
+    """Generate (city, date) query parameters for warmed and never-seen keys."""
+
+    def __init__(self, warm_keys: int, seed: int, run: str):
+        self.rng = random.Random(seed)
+        self.run = run
+        self.fresh = 0
+        self.warm = [self._key(f"Warm{i}", i) for i in range(warm_keys)]
+
+    @staticmethod
+    def _key(city: str, i: int) -> dict:
+        date = datetime(2024, 1, 1) - timedelta(days=i % 365)
+        return {"city": city, "date": date.strftime("%Y-%m-%d")}
+
+    def next(self, hit_ratio: float) -> dict:
+        if self.rng.random() < hit_ratio:
+            return self.rng.choice(self.warm)
+        self.fresh += 1
+        return self._key(f"{self.run}-{self.fresh}", self.fresh)
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def _drive(client: httpx.AsyncClient, keys: KeySpace, hit_ratio: float, requests: int,
+                 concurrency: int) -> dict:
+    plan = [keys.next(hit_ratio) for _ in range(requests)]
+    latencies = []
+    statuses = Counter()
+    queue = iter(plan)
+
+    async def worker():
+        for params in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.get("/weather", params=params)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "latency_ms": {
+            "p50": ms(_percentile(ordered, 0.50)),
+            "p95": ms(_percentile(ordered, 0.95)),
+            "p99": ms(_percentile(ordered, 0.99)),
+            "max": ms(ordered[-1]),
+        },
+        "statuses": dict(statuses),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+    }
+
+
+async def run(args, service: ServiceProcess, stub: StubServer) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=service.url, limits=limits, timeout=60.0) as client:
+        keys = KeySpace(args.warm_keys, args.seed, run=str(int(time.time())))
+        # Warm the hit set so hit-heavy traffic really hits
+        await asyncio.gather(*(client.get("/weather", params=params) for params in keys.warm))
+
+        results = {}
+        for name in args.workloads:
+            calls_before = stub.calls
+            result = await _drive(client, keys, WORKLOADS[name], args.requests, args.concurrency)
+            result["upstream_calls"] = stub.calls - calls_before
+            results[name] = result
+        return results
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Print the relative change of RPS and latency percentiles between two reports."""
+    baseline = json.loads(Path(baseline_path).read_text())
+    candidate = json.loads(Path(candidate_path).read_text())
+    print(f"baseline {baseline['revision']}  candidate {candidate['revision']}")
+    for name, new in candidate["workloads"].items():
+        old = baseline["workloads"].get(name)
+        if old is None:
+            continue
+        change = lambda a, b: f"{(b - a) / a * 100:+.1f}%" if a else "n/a"  # noqa: E731
+        print(f"{name:12} rps {old['rps']:>9} -> {new['rps']:>9} ({change(old['rps'], new['rps'])})")
+        for q in ("p50", "p95", "p99"):
+            a, b = old["latency_ms"][q], new["latency_ms"][q]
+            print(f"{'':12} {q}  {a:>9} -> {b:>9} ms ({change(a, b)})")
+        print(f"{'':12} upstream calls {old['upstream_calls']} -> {new['upstream_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=["hit-heavy", "miss-heavy", "mixed"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warm-keys", type=int, default=200)
+    parser.add_argument("--upstream-latency", type=float, default=0.05)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    with StubServer(latency=args.upstream_latency, error_rate=args.upstream_error_rate, seed=args.seed) as stub, \
+            ServiceProcess(stub.url, workers=args.workers) as service:
+        workloads = asyncio.run(run(args, service, stub))
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "workloads": workloads,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Helpers for benchmarks that write weather rows directly instead of going through the API.
+"""
+from sqlalchemy import insert
+
+from app import models
+
+
+def insert_locations(conn, cities) -> dict:
+    """
+    Insert one location per distinct city, aliased by its normalized name.
+
+    Args:
+        conn: An open SQLAlchemy `Connection` or `Session`.
+        cities: City names; duplicates are inserted once.
+
+    Returns:
+        dict: Maps each city name to its location id.
+    """
+    ids = {}
+    for city in dict.fromkeys(cities):
+        key = models.normalize_city(city)
+        ids[city] = conn.execute(
+            insert(models.Location).values(key=key, name=city).returning(models.Location.id)
+        ).scalar_one()
+        conn.execute(insert(models.LocationAlias).values(alias=key, location_id=ids[city]))
+    return ids
@@ -0,0 +1,147 @@
+"""
+Local stand-in for `api.weatherapi.com/v1/history.json`, used by the benchmarks.
+
+The stub answers every request with a synthetic history payload after an
+optional delay, fails a configurable fraction of requests, and counts the calls
+it served so benchmarks can report upstream traffic.
+
+It can also run on its own:
+    python -m benchmarks.stub_upstream --port 9000 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+
+def forecastday(date: str) -> dict:
+    """Build one synthetic `forecastday` entry for the given 'YYYY-MM-DD' date."""
+    seed = sum(ord(c) for c in date) % 10
+    return {
+        "date": date,
+        "day": {
+            "mintemp_c": 10.0 + seed,
+            "maxtemp_c": 20.0 + seed,
+            "avgtemp_c": 15.0 + seed,
+            "avghumidity": 60.0 + seed,
+        },
+        "hour": [
+            {
+                "time": f"{date} {hour:02d}:00",
+                "temp_c": round(10.0 + seed + 10.0 * (1 - abs(14 - hour) / 14), 1),
+                "humidity": 60 + seed,
+                "precip_mm": 0.1 * (hour % 3),
+                "wind_kph": 8.3 + hour % 5,
+                "pressure_mb": 1013.0,
+                "cloud": 25 * (hour % 5),
+            }
+            for hour in range(24)
+        ],
+    }
+
+
+def create_stub_app(latency: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                    seed: int | None = None) -> FastAPI:
+    """
+    Create the stub upstream application.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        error_rate (float): Fraction of requests answered with `error_status`.
+        error_status (int): HTTP status of injected failures.
+        seed (int, optional): Seed for the failure injection, for reproducible runs.
+
+    Returns:
+        FastAPI: The stub app. `app.state.calls` holds the number of history calls served
+        and `app.state.errors` how many of them failed.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.errors = 0
+    rng = random.Random(seed)
+
+    @app.get("/v1/history.json")
+    async def history(q: str, dt: str, end_dt: str | None = None, key: str = ""):
+        app.state.calls += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rng.random() < error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": {"code": 9999, "message": "Injected failure."}}, status_code=error_status)
+        start = datetime.fromisoformat(dt)
+        end = datetime.fromisoformat(end_dt) if end_dt else start
+        days = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+        # Like the real API, resolve "london ", "London, UK", ... to one location
+        name = " ".join(q.split(",")[0].split()).title()
+        return {
+            "location": {"name": name, "region": "", "country": "Stubland", "lat": 0.0, "lon": 0.0},
+            "forecast": {"forecastday": [forecastday(day) for day in days]},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": app.state.calls, "errors": app.state.errors}
+
+    return app
+
+
+class StubServer:
+    """
+    Run the stub upstream with uvicorn on a free local port in a background thread.
+
+    Example:
+        with StubServer(latency=0.02) as stub:
+            Config.WEATHER_API_URL = stub.url
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                 seed: int | None = None, host: str = "127.0.0.1"):
+        self.app = create_stub_app(latency=latency, error_rate=error_rate, error_status=error_status, seed=seed)
+        self.host = host
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(self.app, host=host, port=self.port, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/history.json"
+
+    @property
+    def calls(self) -> int:
+        return self.app.state.calls
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_stub_app(args.latency, args.error_rate, args.error_status, args.seed),
+        host=args.host, port=args.port, log_level="warning",
+    )
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for serving the app with several worker processes.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (`preload_app`), which is cheap and opens
+nothing, and then forked into uvicorn workers. The master runs migrations once
+before forking; workers skip that step and each creates its own database engine,
+connection pool and upstream HTTP client in the application lifespan. Caches and
+metrics are per worker.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = "-"
+
+# Workers must not race each other creating tables; the master does it in on_starting
+raw_env = ["INIT_DB_ON_STARTUP=false"]
+
+
+def on_starting(server):
+    from app import config, database
+
+    config.configure_logging()
+    database.init_db()
+    # Don't hand the master's pooled connections to forked workers
+    database.reset_engines()
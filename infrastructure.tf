@@ -47,7 +47,7 @@ resource "aws_instance" "fastapi_instance" {
               git clone https://github.com/Parissai/fastapi-weather-service.git
               cd fastapi-weather-service
               pip3 install -r requirements.txt
-              nohup uvicorn app.main:app --host 0.0.0.0 --port 80 --reload &
+              BIND=0.0.0.0:80 nohup gunicorn -c gunicorn.conf.py app.main:app &
               EOF
 }
 
@@ -0,0 +1,91 @@
+"""
+In-process stand-in for a Redis server, speaking enough RESP2 for `RedisBackend`.
+
+Supports PING, AUTH, SELECT, GET, MGET, SET (with EX/PX) and DEL. Every command
+is recorded in `commands`, and `reads` counts the socket reads that carried
+commands, so tests can check that multi-key calls are batched.
+"""
+import asyncio
+import time
+
+
+class RedisStub:
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.commands = []
+        self.reads = 0
+        self.fail = False
+        self._server = None
+        self.port = None
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            self.data.pop(key, None)
+            return None
+        return entry[0]
+
+    def _handle(self, args):
+        command = args[0].upper().decode()
+        self.commands.append(command)
+        if self.fail:
+            return b"-ERR injected failure\r\n"
+        if command == "PING":
+            return b"+PONG\r\n"
+        if command == "AUTH":
+            return b"+OK\r\n" if args[-1].decode() == self.password else b"-WRONGPASS invalid password\r\n"
+        if command == "SELECT":
+            return b"+OK\r\n"
+        if command == "SET":
+            expires_at = None
+            if len(args) >= 5:
+                unit = args[3].upper()
+                expires_at = time.monotonic() + int(args[4]) / (1000 if unit == b"PX" else 1)
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == "DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if command in ("GET", "MGET"):
+            values = [self._get(key) for key in args[1:]]
+            encoded = [b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value) for value in values]
+            if command == "GET":
+                return encoded[0]
+            return b"*%d\r\n" % len(values) + b"".join(encoded)
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                self.reads += 1
+                replies = []
+                while True:
+                    args = []
+                    for _ in range(int(line[1:-2])):
+                        length = int((await reader.readuntil(b"\r\n"))[1:-2])
+                        args.append((await reader.readexactly(length + 2))[:-2])
+                    replies.append(self._handle(args))
+                    # Commands already buffered arrived in the same write (a pipeline)
+                    if not reader._buffer:
+                        break
+                    line = await reader.readuntil(b"\r\n")
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import httpx
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import backfill, models, weather
+from app.database import Base
+
+START, END = datetime(2024, 1, 1), datetime(2024, 2, 14)
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.fixture(autouse=True)
+def range_limit(monkeypatch):
+    monkeypatch.setattr(weather.Config, "UPSTREAM_MAX_RANGE_DAYS", 30)
+
+def fake_history(calls, failing=(), missing=()):
+    """Build a stand-in for ranged `weather.fetch_weather_data` calls."""
+    async def fetch(city, date, end_date=None):
+        calls.append((city, date, end_date))
+        if city in failing:
+            raise RuntimeError("upstream exploded")
+        if city in missing:
+            request = httpx.Request("GET", weather.Config.WEATHER_API_URL)
+            raise httpx.HTTPStatusError("No matching location found.", request=request,
+                                        response=httpx.Response(400, request=request))
+        days = [date + timedelta(days=i) for i in range((end_date - date).days + 1)]
+        return {"forecast": {"forecastday": [
+            {"date": day.strftime("%Y-%m-%d"),
+             "day": {"mintemp_c": 1.0, "maxtemp_c": 2.0, "avgtemp_c": 1.5, "avghumidity": 50.0}}
+            for day in days
+        ]}}
+    return fetch
+
+async def count_rows(session_factory):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(models.Weather))
+
+def test_plan_uses_ranged_calls_and_skips_done_days():
+    skip = {"paris": {START + timedelta(days=i) for i in range(40)}}
+
+    units = backfill.plan(["London", " london", "Paris"], START, END, skip, 30)
+
+    assert units == [
+        ("London", START, START + timedelta(days=29)),
+        ("London", START + timedelta(days=30), END),
+        ("Paris", START + timedelta(days=40), END),
+    ]
+
+@pytest.mark.asyncio
+async def test_backfill_writes_batches_and_checkpoints(session_factory, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history(calls, missing={"Atlantis"}))
+    checkpoint = tmp_path / "backfill.checkpoint"
+
+    stats = await backfill.run_backfill(["London", "Paris", "Atlantis"], START, END, concurrency=2,
+                                        batch_size=20, checkpoint=str(checkpoint), session_factory=session_factory)
+
+    assert len(calls) == 6
+    assert await count_rows(session_factory) == 90
+    assert (stats["windows"], stats["completed"], stats["no_data"], stats["failed"], stats["rows"]) == (6, 6, 2, 0, 90)
+    assert stats["rows_per_second"] > 0
+    entries = [json.loads(line) for line in checkpoint.read_text().splitlines()]
+    assert {entry["city"] for entry in entries} == {"london", "paris", "atlantis"}
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_without_refetching(session_factory, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history(calls, failing={"Paris"}))
+    checkpoint = str(tmp_path / "backfill.checkpoint")
+
+    stats = await backfill.run_backfill(["London", "Paris"], START, END, checkpoint=checkpoint,
+                                        session_factory=session_factory)
+    assert (stats["completed"], stats["failed"]) == (2, 2)
+
+    # The second run only fetches what failed; completed windows come from the checkpoint
+    calls.clear()
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history(calls))
+    stats = await backfill.run_backfill(["London", "Paris"], START, END, checkpoint=checkpoint,
+                                        session_factory=session_factory)
+
+    assert {city for city, _, _ in calls} == {"Paris"}
+    assert stats["resumed_days"] == 45
+    assert await count_rows(session_factory) == 90
+
+    calls.clear()
+    stats = await backfill.run_backfill(["London", "Paris"], START, END, checkpoint=checkpoint,
+                                        session_factory=session_factory)
+    assert calls == [] and stats["windows"] == 0
+
+@pytest.mark.asyncio
+async def test_backfill_finishes_when_the_checkpoint_cannot_be_written(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    cities = [f"City {i}" for i in range(10)]
+
+    stats = await asyncio.wait_for(backfill.run_backfill(
+        cities, START, END, concurrency=1, batch_size=1, session_factory=session_factory,
+        checkpoint=str(tmp_path / "missing" / "backfill.checkpoint"),
+    ), timeout=10)
+
+    assert (stats["completed"], stats["not_checkpointed"], stats["failed"]) == (20, 20, 0)
+    assert await count_rows(session_factory) == 450
+
+def test_read_cities(tmp_path):
+    path = tmp_path / "cities.txt"
+    path.write_text("# Europe\nLondon\n\n  Paris  \n")
+
+    assert backfill.read_cities(["Rome"], str(path)) == ["Rome", "London", "Paris"]
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from app import cache_backends
+from app.cache_backends import MemoryBackend, RedisBackend, RedisError, SQLiteBackend, create_backend
+from tests.redis_stub import RedisStub
+
+@pytest_asyncio.fixture
+async def redis_stub():
+    stub = await RedisStub().start()
+    yield stub
+    await stub.stop()
+
+@pytest.mark.asyncio
+async def test_memory_backend_round_trip_and_expiry():
+    backend = MemoryBackend()
+    await backend.set_many({"a": b"1", "b": b"2"}, ttl=60)
+    await backend.set_many({"c": b"3"}, ttl=0)
+
+    assert await backend.get_many(["a", "b", "c", "d"]) == {"a": b"1", "b": b"2"}
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_is_shared_through_the_file(tmp_path):
+    writer, reader = SQLiteBackend(str(tmp_path / "cache.db")), SQLiteBackend(str(tmp_path / "cache.db"))
+    try:
+        await writer.set_many({"a": b"1", "b": b"2"}, ttl=60)
+        await writer.set_many({"gone": b"x"}, ttl=-1)
+        await writer.set_many({"b": b"3"}, ttl=60)
+
+        assert await reader.get_many(["a", "b", "gone", "missing"]) == {"a": b"1", "b": b"3"}
+    finally:
+        await writer.close()
+        await reader.close()
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_deletes_expired_entries(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.db"), purge_interval=0)
+    try:
+        await backend.set_many({"missing:1": b"", "missing:2": b""}, ttl=-1)
+        await backend.set_many({"a": b"1"}, ttl=60)
+
+        engine = await backend._get_engine()
+        async with engine.connect() as conn:
+            keys = (await conn.exec_driver_sql("SELECT key FROM cache_entries")).scalars().all()
+        assert keys == ["a"]
+        assert backend.purged == 2
+    finally:
+        await backend.close()
+
+@pytest.mark.asyncio
+async def test_redis_backend_batches_multi_key_calls(redis_stub):
+    backend = RedisBackend(redis_stub.url)
+    try:
+        await backend.set_many({f"k{i}": b"v%d" % i for i in range(20)}, ttl=60)
+        reads = redis_stub.reads
+        found = await backend.get_many([f"k{i}" for i in range(25)])
+    finally:
+        await backend.close()
+
+    assert found == {f"k{i}": b"v%d" % i for i in range(20)}
+    assert redis_stub.commands.count("SET") == 20 and redis_stub.commands.count("MGET") == 1
+    # Twenty SETs in one pipelined write, one MGET
+    assert reads == 1 and redis_stub.reads == 2
+
+@pytest.mark.asyncio
+async def test_redis_backend_expires_entries(redis_stub):
+    backend = RedisBackend(redis_stub.url)
+    try:
+        await backend.set_many({"short": b"1"}, ttl=0.01)
+        await asyncio.sleep(0.05)
+        assert await backend.get_many(["short"]) == {}
+    finally:
+        await backend.close()
+
+@pytest.mark.asyncio
+async def test_redis_backend_authenticates_and_reports_errors():
+    stub = await RedisStub(password="secret").start()
+    try:
+        backend = RedisBackend(f"redis://:secret@127.0.0.1:{stub.port}/2")
+        await backend.set_many({"a": b"1"}, ttl=60)
+        assert stub.commands[:3] == ["AUTH", "SELECT", "SET"]
+
+        stub.fail = True
+        with pytest.raises(RedisError):
+            await backend.get_many(["a"])
+        await backend.close()
+
+        with pytest.raises(RedisError):
+            await RedisBackend(f"redis://:wrong@127.0.0.1:{stub.port}/0").get_many(["a"])
+    finally:
+        await stub.stop()
+
+def test_create_backend():
+    assert create_backend("none") is None
+    assert create_backend("") is None
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    assert isinstance(create_backend("redis", "redis://cache:6380/1"), cache_backends.RedisBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached")
@@ -0,0 +1,75 @@
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+from app import compression, http_cache
+from app.compression import CompressionMiddleware, choose_encoding
+
+def make_client(minimum_size=100):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, paths=("/big", "/tagged"), minimum_size=minimum_size)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse("weather " * 500)
+
+    @app.get("/other")
+    def other():
+        return PlainTextResponse("weather " * 500)
+
+    @app.get("/tagged")
+    def tagged(if_none_match: str = Header(default=None)):
+        if http_cache.etag_matches(if_none_match, '"abc"'):
+            return Response(status_code=304, headers={"ETag": '"abc"'})
+        return PlainTextResponse("weather " * 500, headers={"ETag": '"abc"'})
+
+    return TestClient(app)
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+def test_compresses_selected_paths_only():
+    client = make_client()
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == "weather " * 500
+
+    response = client.get("/other", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+def test_small_bodies_are_not_compressed():
+    client = make_client(minimum_size=10000)
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert int(response.headers["content-length"]) == len("weather " * 500)
+
+def test_brotli_when_installed():
+    pytest.importorskip("brotli")
+    client = make_client()
+
+    response = client.get("/big", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == "weather " * 500
+
+def test_compressed_bodies_get_their_own_etag(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    client = make_client()
+
+    compressed = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["etag"] == '"abc-gzip"'
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+    revalidated = client.get("/tagged", headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == '"abc-gzip"'
+    small = make_client(minimum_size=10000).get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert small.headers["etag"] == '"abc"'
@@ -1,10 +1,11 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import SQLAlchemyError
 from app.database import Base
-from app import models, schemas
-from app.crud import get_weather_by_city_and_date, create_weather
+from app import hourly, models, schemas
+from app.crud import get_weather_by_city_and_date, create_weather, get_weather_many, create_weather_many, get_weather_hourly
 from datetime import datetime
 import logging
 
@@ -13,30 +14,28 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Setup in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture(scope="module")
-def setup_database():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-    yield
-    # Drop tables
-    Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def db_session(setup_database):
-    # Create a new session for each test
-    db = TestingSessionLocal()
-    try:
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+@pytest_asyncio.fixture
+async def db_session():
+    # Create tables in a fresh database and a new session for each test
+    engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    TestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+    await engine.dispose()
 
-def test_get_weather_by_city_and_date(db_session):
-    # Create and insert a weather record
+@pytest.mark.asyncio
+async def test_get_weather_by_city_and_date(db_session):
+    # Create and insert a location, the alias that names it and a weather record
+    location = models.Location(key="seattle", name="Seattle")
+    db_session.add(location)
+    await db_session.flush()
+    db_session.add(models.LocationAlias(alias="seattle", location_id=location.id))
     weather = models.Weather(
+        location_id=location.id,
         city="Seattle",
         date=datetime(2024, 8, 8),
         min_temp=15.0,
@@ -45,10 +44,10 @@ def test_get_weather_by_city_and_date(db_session):
         humidity=70.0
     )
     db_session.add(weather)
-    db_session.commit()
+    await db_session.commit()
 
     # Test the retrieval function
-    retrieved_weather = get_weather_by_city_and_date(db_session, "Seattle", datetime(2024, 8, 8))
+    retrieved_weather = await get_weather_by_city_and_date(db_session, "Seattle", datetime(2024, 8, 8))
 
     assert retrieved_weather is not None
     assert retrieved_weather.city == "Seattle"
@@ -58,13 +57,15 @@ def test_get_weather_by_city_and_date(db_session):
     assert retrieved_weather.avg_temp == 20.0
     assert retrieved_weather.humidity == 70.0
 
-def test_get_weather_by_city_and_date_no_record(db_session):
+@pytest.mark.asyncio
+async def test_get_weather_by_city_and_date_no_record(db_session):
     # Test retrieval when no record exists
-    retrieved_weather = get_weather_by_city_and_date(db_session, "Nonexistent City", datetime(2024, 8, 8))
+    retrieved_weather = await get_weather_by_city_and_date(db_session, "Nonexistent City", datetime(2024, 8, 8))
 
     assert retrieved_weather is None
 
-def test_create_weather(db_session):
+@pytest.mark.asyncio
+async def test_create_weather(db_session):
     # Create a WeatherCreate schema object
     weather_data = schemas.WeatherCreate(
         city="Los Angeles",
@@ -76,7 +77,7 @@ def test_create_weather(db_session):
     )
 
     # Test the create function
-    created_weather = create_weather(db_session, weather_data)
+    created_weather = await create_weather(db_session, weather_data)
 
     assert created_weather.id is not None
     assert created_weather.city == "Los Angeles"
@@ -86,12 +87,13 @@ def test_create_weather(db_session):
     assert created_weather.avg_temp == 23.0
     assert created_weather.humidity == 50.0
 
-def test_create_weather_exception(db_session, monkeypatch):
+@pytest.mark.asyncio
+async def test_create_weather_exception(db_session, monkeypatch):
     # Mock SQLAlchemyError to test exception handling
-    def mock_add(*args, **kwargs):
+    def mock_scalars(*args, **kwargs):
         raise SQLAlchemyError("Database error")
 
-    monkeypatch.setattr(db_session, 'add', mock_add)
+    monkeypatch.setattr(db_session, 'scalars', mock_scalars)
     
     # Create a WeatherCreate schema object
     weather_data = schemas.WeatherCreate(
@@ -105,4 +107,59 @@ def test_create_weather_exception(db_session, monkeypatch):
 
     # Test the exception handling
     with pytest.raises(SQLAlchemyError):
-        create_weather(db_session, weather_data)
+        await create_weather(db_session, weather_data)
+
+@pytest.mark.asyncio
+async def test_create_weather_upserts_normalized_city(db_session):
+    weather_data = schemas.WeatherCreate(
+        city="Chicago",
+        date=datetime(2024, 8, 8),
+        min_temp=18.0,
+        max_temp=28.0,
+        avg_temp=23.0,
+        humidity=50.0
+    )
+    first = await create_weather(db_session, weather_data)
+
+    # Same city in a different spelling updates the existing row
+    updated = weather_data.model_copy(update={"city": " chicago ", "humidity": 55.0})
+    second = await create_weather(db_session, updated)
+
+    assert second.id == first.id
+    assert second.humidity == 55.0
+    retrieved_weather = await get_weather_by_city_and_date(db_session, "CHICAGO", datetime(2024, 8, 8))
+    assert retrieved_weather.id == first.id
+
+@pytest.mark.asyncio
+async def test_create_and_get_weather_many(db_session):
+    weathers = [
+        schemas.WeatherCreate(city=f"City {i}", date=datetime(2024, 8, 1 + i % 5),
+                              min_temp=1.0, max_temp=2.0, avg_temp=1.5, humidity=40.0)
+        for i in range(250)
+    ]
+
+    created = await create_weather_many(db_session, weathers)
+    found = await get_weather_many(db_session, [(" city 7 ", datetime(2024, 8, 3)), ("City 8", datetime(2024, 8, 1))])
+
+    assert len(created) == 250
+    assert list(found) == [("city 7", datetime(2024, 8, 3))]
+    assert found[("city 7", datetime(2024, 8, 3))].city == "City 7"
+
+@pytest.mark.asyncio
+async def test_create_weather_many_stores_hourly_series(db_session):
+    series = schemas.HourlySeries(**{field: [float(hour) for hour in range(24)] for field in hourly.HOURLY_FIELDS})
+    weathers = [
+        schemas.WeatherCreate(city="Seattle", date=datetime(2024, 8, 8), min_temp=0.0, max_temp=23.0,
+                              avg_temp=11.5, humidity=11.5, hourly=series),
+        schemas.WeatherCreate(city="Boston", date=datetime(2024, 8, 8), min_temp=1.0, max_temp=2.0,
+                              avg_temp=1.5, humidity=50.0),
+    ]
+
+    stored = await create_weather_many(db_session, weathers)
+    seattle, seattle_hours = await get_weather_hourly(db_session, "seattle", datetime(2024, 8, 8))
+    boston, boston_hours = await get_weather_hourly(db_session, "Boston", datetime(2024, 8, 8))
+
+    assert seattle.id == stored[0].id and hourly.from_row(seattle_hours) == series
+    assert len(seattle_hours.temp_c) == 24 * 4
+    assert boston.id == stored[1].id and boston_hours is None
+    assert await get_weather_hourly(db_session, "Paris", datetime(2024, 8, 8)) is None
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app import database
+
+@pytest.mark.asyncio
+async def test_async_sqlite_engine_applies_pragmas(tmp_path):
+    engine = database.create_async_db_engine(f"sqlite:///{tmp_path}/weather.db")
+    try:
+        async with engine.connect() as conn:
+            pragmas = {name: await conn.scalar(text(f"PRAGMA {name}"))
+                       for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size")}
+    finally:
+        await engine.dispose()
+
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    # synchronous=NORMAL reads back as 1
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "cache_size": -64000}
+
+def test_sync_sqlite_engine_accepts_pragma_overrides(tmp_path):
+    engine = database.create_db_engine(f"sqlite:///{tmp_path}/weather.db", pragmas={"journal_mode": "DELETE"})
+    with engine.connect() as conn:
+        assert conn.scalar(text("PRAGMA journal_mode")) == "delete"
+    engine.dispose()
+
+def test_engine_options_for_server_databases(monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 20)
+
+    options = database.engine_options("postgresql+asyncpg://user:secret@db:5432/weatherdb", is_async=True)
+
+    assert options["pool_size"] == 20
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == 1800
+
+def test_engine_options_leave_in_memory_sqlite_unpooled():
+    assert database.engine_options("sqlite+aiosqlite:///:memory:", is_async=True) == {}
+    assert database.to_async_url("postgresql://user:secret@db/weatherdb") == "postgresql+asyncpg://user:secret@db/weatherdb"
@@ -0,0 +1,80 @@
+import json
+import tracemalloc
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app import database, export, main, models
+
+def populate(url, rows, first=0):
+    """Insert `rows` synthetic weather rows, numbered from `first`, with multi-row inserts."""
+    engine = create_engine(url)
+    database.Base.metadata.create_all(bind=engine)
+    start = datetime(2000, 1, 1)
+    with engine.begin() as conn:
+        if first == 0:
+            # Location i + 1 is City{i}, aliased as city{i}
+            conn.execute(insert(models.Location), [{"id": i + 1, "key": f"city{i}", "name": f"City{i}"} for i in range(1000)])
+            conn.execute(insert(models.LocationAlias), [{"alias": f"city{i}", "location_id": i + 1} for i in range(1000)])
+        for offset in range(first, first + rows, 10000):
+            conn.execute(insert(models.Weather), [
+                {"location_id": i % 1000 + 1, "city": f"City{i % 1000}", "city_key": f"city{i % 1000}",
+                 "date": start + timedelta(days=i // 1000),
+                 "min_temp": 1.0, "max_temp": 2.0, "avg_temp": 1.5, "humidity": 50.0}
+                for i in range(offset, min(first + rows, offset + 10000))
+            ])
+    engine.dispose()
+
+@pytest.fixture
+def export_db(tmp_path, monkeypatch):
+    """Fixture to point the export session factory at a file database; returns a populate function."""
+    url = f"sqlite:///{tmp_path}/export.db"
+    async_engine = create_async_engine(database.to_async_url(url))
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(async_engine, expire_on_commit=False))
+    yield lambda rows, first=0: populate(url, rows, first)
+
+def test_export_ndjson(export_db):
+    export_db(3000)
+    client = TestClient(main.app)
+
+    response = client.get("/weather/export", params={"city": "city7", "end": "2000-01-02"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["date"] for line in lines] == ["2000-01-01T00:00:00", "2000-01-02T00:00:00"]
+    assert lines[0] == {"id": 8, "city": "City7", "date": "2000-01-01T00:00:00",
+                        "min_temp": 1.0, "max_temp": 2.0, "avg_temp": 1.5, "humidity": 50.0}
+
+def test_export_csv(export_db):
+    export_db(2500)
+    client = TestClient(main.app)
+
+    response = client.get("/weather/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,city,date,min_temp,max_temp,avg_temp,humidity"
+    assert lines[1] == "1,City0,2000-01-01T00:00:00,1.0,2.0,1.5,50.0"
+    assert len(lines) == 2501
+
+@pytest.mark.asyncio
+async def test_export_memory_stays_flat(export_db):
+    """Peak memory while streaming must not grow with the table size."""
+    async def peak_while_exporting():
+        tracemalloc.start()
+        exported = 0
+        async for chunk in export.export_weather("ndjson"):
+            exported += chunk.count("\n")
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return exported, peak
+
+    export_db(10000)
+    small_rows, small_peak = await peak_while_exporting()
+    export_db(40000, first=10000)
+    large_rows, large_peak = await peak_while_exporting()
+
+    assert (small_rows, large_rows) == (10000, 50000)
+    assert large_peak < small_peak * 1.5
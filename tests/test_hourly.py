@@ -0,0 +1,40 @@
+from datetime import datetime
+from app import hourly, schemas
+
+def day(hours):
+    return {"date": "2024-08-08", "hour": [
+        {"time": f"2024-08-08 {hour:02d}:00", "temp_c": 10.0 + hour * 0.5, "humidity": 60,
+         "precip_mm": 0.0, "wind_kph": 11.2, "pressure_mb": 1013.0, "cloud": 25}
+        for hour in hours
+    ]}
+
+def test_pack_round_trips_and_marks_missing_hours():
+    values = [15.3, None, -2.1, 1013.0]
+
+    data = hourly.pack(values)
+
+    assert len(data) == 16
+    assert hourly.unpack(data) == values
+
+def test_parse_hours_places_entries_by_time():
+    series = hourly.parse_hours(day([0, 1, 5, 23]))
+
+    assert len(series.temp_c) == 24
+    assert series.temp_c[:3] == [10.0, 10.5, None]
+    assert series.temp_c[5] == 12.5 and series.temp_c[23] == 21.5
+    assert hourly.parse_hours({"date": "2024-08-08", "day": {}}) is None
+
+def test_daily_summary_is_derived_from_hours():
+    series = hourly.parse_hours(day(range(24)))
+
+    assert hourly.daily_summary(series) == {"min_temp": 10.0, "max_temp": 21.5, "avg_temp": 15.8, "humidity": 60.0}
+
+def test_row_round_trip_and_response():
+    series = hourly.parse_hours(day(range(24)))
+    row = schemas.HourlySeries(**{field: hourly.unpack(data) for field, data in hourly.to_row(series).items()})
+
+    response = hourly.response("London", datetime(2024, 8, 8), row)
+
+    assert row == series
+    assert response.hours[13].time == datetime(2024, 8, 8, 13)
+    assert response.hours[13].temp_c == 16.5
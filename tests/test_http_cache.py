@@ -0,0 +1,43 @@
+from datetime import date, datetime
+from app import schemas
+from app.http_cache import cache_control, coded_etag, etag_for, etag_matches
+
+def row(**overrides):
+    fields = dict(id=1, city="London", date=datetime(2024, 8, 8), min_temp=10.0, max_temp=20.0,
+                  avg_temp=15.0, humidity=60.0)
+    fields.update(overrides)
+    return schemas.WeatherResponse(**fields)
+
+def test_etag_is_strong_and_tracks_row_content():
+    etag = etag_for([row()])
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag_for([row()]) == etag
+    assert etag_for([row(humidity=61.0)]) != etag
+    assert etag_for([row(id=2)]) == etag
+    assert etag_for([row(), row(date=datetime(2024, 8, 9))]) != etag_for([row(date=datetime(2024, 8, 9)), row()])
+
+def test_etag_matches_lists_wildcards_and_weak_tags():
+    etag = etag_for([row()])
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+def test_compressed_copies_have_their_own_strong_tag():
+    etag = etag_for([row()])
+
+    assert coded_etag(etag, "gzip") == etag[:-1] + '-gzip"'
+    assert coded_etag(etag, "br") != coded_etag(etag, "gzip") != etag
+    assert coded_etag("W/" + etag, "gzip") == "W/" + etag
+    assert etag_matches(coded_etag(etag, "gzip"), etag)
+    assert etag_matches(f'"other", {coded_etag(etag, "br")}', etag)
+    assert not etag_matches(coded_etag('"other"', "gzip"), etag)
+
+def test_cache_control_marks_past_dates_immutable():
+    today = date(2024, 8, 9)
+
+    assert cache_control(datetime(2024, 8, 8), 31536000, 300, today=today) == "public, max-age=31536000, immutable"
+    assert cache_control(datetime(2024, 8, 9), 31536000, 300, today=today) == "public, max-age=300"
@@ -2,7 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app import models, schemas, database, main  # Adjust import as needed
+from app import models, schemas, database, main, weather  # Adjust import as needed
 from datetime import datetime
 
 # Setup in-memory SQLite database for testing
@@ -30,6 +30,8 @@ def db_session():
 def setup_database():
     """Fixture to create and drop tables in the in-memory database."""
     models.Base.metadata.create_all(bind=engine)
+    # The app's own database is initialized by the lifespan, which this client doesn't run
+    database.init_db()
     yield
     models.Base.metadata.drop_all(bind=engine)
 
@@ -95,3 +97,244 @@ def test_get_weather_internal_server_error(db_session, setup_database, monkeypat
     response = client.get("/weather", params={"city": "Seattle", "date": "2024-08-08"})
     assert response.status_code == 500
     assert response.json() == {"detail": "Internal server error. Please try again later."}
+
+@pytest.fixture
+def async_db(monkeypatch):
+    """Fixture to point the async session dependency at a fresh in-memory database."""
+    import asyncio
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import StaticPool
+
+    async_engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+
+    async def create_tables():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[database.get_async_db] = override_get_async_db
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    yield AsyncTestingSessionLocal
+    app.dependency_overrides.pop(database.get_async_db, None)
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    asyncio.run(async_engine.dispose())
+
+def fake_history(calls, missing=()):
+    """Build a stand-in for `weather.fetch_weather_data` that records its calls."""
+    import httpx
+
+    async def fetch(city, date):
+        calls.append((city, date))
+        if city in missing:
+            request = httpx.Request("GET", weather.Config.WEATHER_API_URL)
+            raise httpx.HTTPStatusError("No matching location found.", request=request,
+                                        response=httpx.Response(400, request=request))
+        if city == "Error City":
+            raise RuntimeError("upstream exploded")
+        return {"forecast": {"forecastday": [{"day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }}]}}
+    return fetch
+
+def test_get_weather_batch_reports_each_item(async_db, monkeypatch):
+    """Test case for a batch mixing cached, fetched, missing and failing pairs."""
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history(calls, missing={"Atlantis"}))
+    assert client.get("/weather", params={"city": "Seattle", "date": "2024-08-08"}).status_code == 200
+    weather.hot_cache.clear()
+    calls.clear()
+
+    response = client.post("/weather/batch", json={"items": [
+        {"city": "Seattle", "date": "2024-08-08"},
+        {"city": "Boston", "date": "2024-08-08"},
+        {"city": " boston", "date": "2024-08-08"},
+        {"city": "Atlantis", "date": "2024-08-08"},
+        {"city": "Error City", "date": "2024-08-08"},
+    ]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["ok", "ok", "ok", "not_found", "error"]
+    assert results[0]["data"]["city"] == "Seattle"
+    assert results[1]["data"]["id"] == results[2]["data"]["id"]
+    assert results[2]["city"] == " boston"
+    assert sorted(city for city, _ in calls) == ["Atlantis", "Boston", "Error City"]
+
+def test_get_weather_batch_answers_queued_rows_in_write_behind_mode(async_db, monkeypatch):
+    """Test case for batch items fetched while write-behind queues them, before they have an id."""
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    monkeypatch.setattr(weather.Config, "WRITE_BEHIND_ENABLED", True)
+    try:
+        response = client.post("/weather/batch", json={"items": [{"city": "Denver", "date": "2024-08-08"}]})
+    finally:
+        weather.writer._pending.clear()
+
+    assert response.status_code == 200
+    result, = response.json()["results"]
+    assert result["status"] == "ok"
+    assert result["data"]["city"] == "Denver" and result["data"]["id"] is None
+
+def test_openapi_documents_stored_rows_with_an_id():
+    """Test case for the response contract while write-behind is off: every row has an integer id."""
+    schema = app.openapi()["components"]["schemas"]["WeatherResponse"]
+
+    assert schema["properties"]["id"]["type"] == "integer"
+    assert "id" in schema["required"]
+    assert "QueuedWeatherResponse" not in app.openapi()["components"]["schemas"]
+
+def test_get_weather_batch_validates_items(async_db):
+    """Test case for a batch with an invalid date."""
+    response = client.post("/weather/batch", json={"items": [{"city": "Seattle", "date": "2024-08-32"}]})
+    assert response.status_code == 422
+
+def test_get_weather_range_rejects_reversed_range(async_db):
+    """Test case for a range whose end is before its start."""
+    response = client.get("/weather/range", params={"city": "Seattle", "start": "2024-08-08", "end": "2024-08-01"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "End date must not be before start date."}
+
+def test_get_weather_stats(async_db, monkeypatch):
+    """Test case for monthly statistics over cached rows."""
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    for day in ("2024-08-08", "2024-08-09"):
+        assert client.get("/weather", params={"city": "Seattle", "date": day}).status_code == 200
+
+    response = client.get("/weather/stats", params={"city": "seattle", "start": "2024-01-01", "end": "2024-12-31"})
+
+    assert response.status_code == 200
+    series = response.json()["series"]
+    assert len(series) == 1
+    assert series[0]["period_start"] == "2024-08-01"
+    assert series[0]["days"] == 2
+    assert series[0]["avg_temp"] == {"mean": 15.0, "min": 15.0, "max": 15.0, "rolling_mean": None}
+
+def test_metrics_endpoint_reports_lookups(async_db, monkeypatch):
+    """Test case for the Prometheus metrics endpoint."""
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    for _ in range(2):
+        assert client.get("/weather", params={"city": "Denver", "date": "2024-08-08"}).status_code == 200
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{route="/weather",method="GET",status="200"}' in body
+    assert 'weather_lookups_total{source="hot_cache"}' in body
+    assert 'db_query_duration_seconds_count{operation="create_weather"}' in body
+
+def test_get_weather_returns_503_while_circuit_is_open(async_db, monkeypatch):
+    """Test case for failing fast while the weather API circuit breaker is open."""
+    from app.resilience import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    monkeypatch.setattr(weather, "circuit_breaker", breaker)
+
+    response = client.get("/weather", params={"city": "Boston", "date": "2024-08-08"})
+
+    assert response.status_code == 503
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+    assert breaker.rejected == 1
+    assert "weather_upstream_circuit_state 2.0" in client.get("/metrics").text
+
+def test_get_weather_supports_conditional_requests(async_db, monkeypatch):
+    """Test case for ETag, Cache-Control and If-None-Match on `/weather`."""
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history(calls))
+    params = {"city": "Austin", "date": "2024-08-08"}
+
+    first = client.get("/weather", params=params)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = first.headers["etag"]
+
+    second = client.get("/weather", params=params, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert client.get("/weather", params=params, headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert len(calls) == 1
+
+def test_queued_rows_are_not_cached_by_clients(async_db, monkeypatch):
+    """Test case for Cache-Control while a fetched row is queued for write-behind, before it has an id."""
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    monkeypatch.setattr(weather.Config, "WRITE_BEHIND_ENABLED", True)
+    try:
+        queued = client.get("/weather", params={"city": "Tulsa", "date": "2024-08-08"})
+        days = client.get("/weather/range", params={"city": "Tulsa", "start": "2024-08-08", "end": "2024-08-08"})
+    finally:
+        weather.writer._pending.clear()
+
+    assert queued.json()["id"] is None
+    assert queued.headers["cache-control"] == "no-cache"
+    assert days.headers["cache-control"] == "no-cache"
+
+def test_get_weather_batch_is_compressed(async_db, monkeypatch):
+    """Test case for gzip-compressed batch responses."""
+    monkeypatch.setattr(weather, "fetch_weather_data", fake_history([]))
+    items = [{"city": f"City {i}", "date": "2024-08-08"} for i in range(20)]
+
+    response = client.post("/weather/batch", json={"items": items}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["results"]) == 20
+
+def test_get_weather_hourly(async_db, monkeypatch):
+    """Test case for hourly observations, served from the same upstream call as the daily row."""
+    calls = []
+
+    async def fetch(city, date):
+        calls.append((city, date))
+        return {"forecast": {"forecastday": [{"day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }, "hour": [{"time": f"2024-08-08 {hour:02d}:00", "temp_c": 10.0 + hour} for hour in range(24)]}]}}
+
+    monkeypatch.setattr(weather, "fetch_weather_data", fetch)
+    assert client.get("/weather", params={"city": "Seattle", "date": "2024-08-08"}).status_code == 200
+
+    response = client.get("/weather/hourly", params={"city": "seattle", "date": "2024-08-08"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["city"] == "Seattle" and len(data["hours"]) == 24
+    assert data["hours"][6] == {"time": "2024-08-08T06:00:00", "temp_c": 16.0, "humidity": None,
+                                "precip_mm": None, "wind_kph": None, "pressure_mb": None, "cloud": None}
+    assert len(calls) == 1
+    assert client.get("/weather/hourly", params={"city": "Seattle", "date": "2024-08-32"}).status_code == 400
+
+def test_import_has_no_side_effects():
+    """Test case for importing the app without an API key, engines or database files."""
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    env = {key: value for key, value in os.environ.items() if key != "WEATHER_API_KEY"}
+    code = (
+        "import os, app.main, app.database as d; "
+        "assert not {'engine', 'async_engine'} & set(vars(d)); "
+        "assert not os.path.exists('weather.db')"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env={**env, "PYTHONPATH": root},
+                                capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_lifespan_validates_configuration(monkeypatch):
+    """Test case for startup failing without an API key."""
+    monkeypatch.setattr(weather.Config, "API_KEY", None)
+
+    with pytest.raises(ValueError, match="API key is missing"):
+        with TestClient(app):
+            pass
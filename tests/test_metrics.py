@@ -0,0 +1,36 @@
+from app.metrics import Registry
+
+def test_counter_renders_labelled_series():
+    registry = Registry()
+    requests = registry.counter("requests", "Requests.", ("route", "status"))
+    requests.labels("/weather", "200").inc()
+    requests.labels("/weather", "200").inc(2)
+    requests.labels("/weather", "404").inc()
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE requests counter" in lines
+    assert 'requests_total{route="/weather",status="200"} 3.0' in lines
+    assert 'requests_total{route="/weather",status="404"} 1.0' in lines
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 3.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+def test_callback_metric_reads_value_at_render():
+    registry = Registry()
+    size = [1]
+    registry.callback("cache_entries", "Entries.", lambda: size[0])
+    size[0] = 5
+
+    assert "cache_entries 5.0" in registry.render().splitlines()
@@ -0,0 +1,176 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import crud, migrations, schemas
+from app.database import Base
+
+# Schema of databases created before weather.city_key existed
+LEGACY_SCHEMA = [
+    """CREATE TABLE weather (
+        id INTEGER NOT NULL PRIMARY KEY,
+        city VARCHAR NOT NULL,
+        date DATETIME NOT NULL,
+        min_temp FLOAT,
+        max_temp FLOAT,
+        avg_temp FLOAT,
+        humidity FLOAT
+    )""",
+    "CREATE INDEX ix_weather_id ON weather (id)",
+    "CREATE INDEX ix_weather_city ON weather (city)",
+    "CREATE INDEX ix_weather_date ON weather (date)",
+]
+
+def _create_legacy(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO weather (id, city, date, min_temp, max_temp, avg_temp, humidity) VALUES "
+            "(1, 'London', '2024-08-08 00:00:00.000000', 1, 2, 1.5, 50), "
+            "(2, ' london', '2024-08-08 00:00:00.000000', 1, 2, 1.5, 50), "
+            "(3, 'London', '2024-08-09 00:00:00.000000', 1, 2, 1.5, 50), "
+            "(4, 'Paris', '2024-08-08 00:00:00.000000', 1, 2, 1.5, 50)"
+        ))
+
+@pytest.fixture
+def legacy_engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    _create_legacy(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def migrated_url(tmp_path):
+    # A legacy database file brought up to date as init_db does, for tests using the async session
+    engine = create_engine(f"sqlite:///{tmp_path}/weather.db")
+    _create_legacy(engine)
+    with engine.begin() as conn:
+        migrations.run(conn)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return f"sqlite+aiosqlite:///{tmp_path}/weather.db"
+
+def _fetched(city: str, date: datetime, name: str = "London", region: str = "City of London, Greater London",
+             country: str = "United Kingdom") -> schemas.WeatherCreate:
+    return schemas.WeatherCreate(
+        city=city, date=date, min_temp=3, max_temp=4, avg_temp=3.5, humidity=60,
+        location=schemas.LocationCreate(name=name, region=region, country=country, lat=51.52, lon=-0.11),
+    )
+
+def test_add_weather_city_key_deduplicates(legacy_engine):
+    with legacy_engine.begin() as conn:
+        assert migrations.add_weather_city_key(conn) is True
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, city_key FROM weather ORDER BY id")).all()
+        indexes = {index["name"]: index for index in inspect(conn).get_indexes("weather")}
+
+    assert rows == [(1, "london"), (3, "london"), (4, "paris")]
+    assert indexes["ix_weather_city_key_date"]["unique"]
+    assert "ix_weather_city" not in indexes
+
+def test_add_weather_city_key_enforces_uniqueness(legacy_engine):
+    with legacy_engine.begin() as conn:
+        migrations.run(conn)
+
+    with pytest.raises(IntegrityError):
+        with legacy_engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO weather (city, city_key, location_id, date) "
+                "SELECT 'PARIS', 'paris', location_id, '2024-08-08 00:00:00.000000' "
+                "FROM location_aliases WHERE alias = 'paris'"
+            ))
+
+def test_add_weather_city_key_is_idempotent(legacy_engine):
+    with legacy_engine.begin() as conn:
+        migrations.run(conn)
+    with legacy_engine.begin() as conn:
+        assert migrations.add_weather_city_key(conn) is False
+
+def test_add_locations_adopts_existing_rows(legacy_engine):
+    with legacy_engine.begin() as conn:
+        migrations.run(conn)
+
+    with legacy_engine.connect() as conn:
+        locations = dict(conn.execute(text("SELECT key, id FROM locations")).all())
+        aliases = dict(conn.execute(text("SELECT alias, location_id FROM location_aliases")).all())
+        rows = conn.execute(text("SELECT id, location_id FROM weather ORDER BY id")).all()
+        indexes = {index["name"]: index for index in inspect(conn).get_indexes("weather")}
+
+    assert sorted(locations) == ["london", "paris"]
+    assert aliases == locations
+    assert rows == [(1, locations["london"]), (3, locations["london"]), (4, locations["paris"])]
+    assert indexes["ix_weather_location_id_date"]["unique"]
+    assert "ix_weather_city_key_date" not in indexes
+
+def test_add_locations_is_idempotent(legacy_engine):
+    with legacy_engine.begin() as conn:
+        migrations.run(conn)
+    with legacy_engine.begin() as conn:
+        assert migrations.add_locations(conn) is False
+
+def test_add_weather_last_accessed_at(legacy_engine):
+    with legacy_engine.begin() as conn:
+        migrations.run(conn)
+
+    with legacy_engine.connect() as conn:
+        indexes = {index["name"] for index in inspect(conn).get_indexes("weather")}
+        missing = conn.scalar(text("SELECT COUNT(*) FROM weather WHERE last_accessed_at IS NULL"))
+        assert "ix_weather_last_accessed_at" in indexes
+        assert missing == 0
+        assert not migrations.add_weather_last_accessed_at(conn)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("existing", [False, True])
+async def test_migrated_rows_stay_reachable_after_a_fetch(migrated_url, existing):
+    engine = create_async_engine(migrated_url)
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with sessions() as db:
+        if existing:
+            # Another spelling already created the full location, with a row for a migrated date
+            await crud.create_weather(db, _fetched("London, UK", datetime(2024, 8, 9)))
+        await crud.create_weather(db, _fetched("London", datetime(2024, 8, 10)))
+
+        old = await crud.get_weather_by_city_and_date(db, "London", datetime(2024, 8, 8))
+        new = await crud.get_weather_by_city_and_date(db, "london", datetime(2024, 8, 10))
+        rows = await crud.get_weather_range(db, "London", datetime(2024, 8, 1), datetime(2024, 8, 31))
+        locations = (await db.execute(text("SELECT key, region, country FROM locations ORDER BY key"))).all()
+        paris = await crud.get_weather_by_city_and_date(db, "Paris", datetime(2024, 8, 8))
+    await engine.dispose()
+
+    assert old is not None and old.id == 1
+    assert new.location_id == old.location_id
+    assert [row.date.day for row in rows] == [8, 9, 10]
+    assert rows[1].min_temp == (3 if existing else 1)
+    assert locations == [
+        ("london, city of london, greater london, united kingdom", "City of London, Greater London", "United Kingdom"),
+        ("paris", None, None),
+    ]
+    assert paris is not None
+
+@pytest.mark.asyncio
+async def test_writes_stop_looking_up_legacy_locations_once_merged(migrated_url):
+    engine = create_async_engine(migrated_url)
+    lookups = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if "FROM location_aliases JOIN locations" in statement:
+            lookups.append(statement)
+
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with sessions() as db:
+        await crud.create_weather(db, _fetched("London", datetime(2024, 8, 10)))
+        merging = len(lookups)
+        await crud.create_weather(db, _fetched("London", datetime(2024, 8, 11)))
+        confirmed = len(lookups)
+        await crud.create_weather(db, _fetched("London", datetime(2024, 8, 12)))
+        await crud.create_weather(db, _fetched("Rome", datetime(2024, 8, 12), name="Rome", region="Lazio",
+                                               country="Italy"))
+    await engine.dispose()
+
+    # Loading the legacy aliases and merging London; then confirming London is merged; then nothing
+    assert (merging, confirmed, len(lookups)) == (2, 3, 3)
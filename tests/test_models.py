@@ -2,7 +2,7 @@ import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.database import Base
-from app.models import Weather
+from app.models import Location, Weather
 from datetime import datetime
 
 # Setup in-memory SQLite database for testing
@@ -29,7 +29,11 @@ def db_session(setup_database):
 
 def test_create_weather(db_session):
     # Create an instance of Weather
+    location = Location(key="new york", name="New York")
+    db_session.add(location)
+    db_session.flush()
     weather = Weather(
+        location_id=location.id,
         city="New York",
         date=datetime(2024, 8, 8),
         min_temp=10.0,
@@ -54,7 +58,11 @@ def test_create_weather(db_session):
 
 def test_default_values(db_session):
     # Create an instance of Weather with defaults
+    location = Location(key="san francisco", name="San Francisco")
+    db_session.add(location)
+    db_session.flush()
     weather = Weather(
+        location_id=location.id,
         city="San Francisco",
         date=datetime(2024, 8, 8)
     )
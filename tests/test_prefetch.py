@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import schemas, weather
+from app.crud import create_weather
+from app.database import Base
+from app.leader import LeaderLock
+from app.prefetch import CacheWarmer
+
+TODAY = datetime(2024, 8, 10)
+YESTERDAY = datetime(2024, 8, 9)
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    await engine.dispose()
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+
+    async def fetch(city, date):
+        calls.append(city)
+        return {"forecast": {"forecastday": [{"day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }}]}}
+
+    monkeypatch.setattr(weather, "fetch_weather_data", fetch)
+    return calls
+
+def test_targets_follow_request_frequency():
+    warmer = CacheWarmer(top=2, days=2)
+    for city in ["Paris", "london", "London ", "Rome", "Paris", "LONDON"]:
+        warmer.record(city, TODAY)
+
+    assert warmer.targets(TODAY) == [
+        ("LONDON", YESTERDAY), ("Paris", YESTERDAY),
+        ("LONDON", datetime(2024, 8, 8)), ("Paris", datetime(2024, 8, 8)),
+    ]
+
+def test_configured_cities_take_precedence():
+    warmer = CacheWarmer(cities=["Oslo"])
+    warmer.record("Paris", TODAY)
+
+    assert warmer.targets(TODAY) == [("Oslo", YESTERDAY)]
+
+@pytest.mark.asyncio
+async def test_run_once_respects_budget_and_skips_cached(session_factory, upstream):
+    async with session_factory() as db:
+        await create_weather(db, schemas.WeatherCreate(
+            city="Oslo", date=YESTERDAY, min_temp=1.0, max_temp=2.0, avg_temp=1.5, humidity=50.0
+        ))
+    warmer = CacheWarmer(cities=["Oslo", "Paris", "Rome", "Berlin"], budget=2, session_factory=session_factory)
+
+    assert await warmer.run_once(TODAY) == 2
+
+    assert upstream == ["Paris", "Rome"]
+    stats = warmer.stats()
+    assert stats["already_cached"] == 1
+    assert stats["over_budget"] == 1
+
+@pytest.mark.asyncio
+async def test_prevented_misses_count_first_user_request(session_factory, upstream):
+    warmer = CacheWarmer(cities=["Paris"], session_factory=session_factory)
+    await warmer.run_once(TODAY)
+
+    warmer.record("paris", YESTERDAY)
+    warmer.record("Paris", YESTERDAY)
+    warmer.record("Rome", YESTERDAY)
+
+    assert warmer.prevented_misses == 1
+
+@pytest.mark.asyncio
+async def test_only_the_lock_holder_warms(session_factory, upstream, tmp_path):
+    leader, follower = (
+        CacheWarmer(cities=["Paris"], session_factory=session_factory, lock=LeaderLock("prefetch", str(tmp_path)),
+                    lock_interval=0.01)
+        for _ in range(2)
+    )
+    leader.lock.acquire()
+
+    follower.start()
+    await asyncio.sleep(0.1)
+    assert follower.runs == 0
+    assert upstream == []
+
+    # The follower takes over well before its warming interval when the leader exits
+    leader.lock.release()
+    await asyncio.sleep(0.1)
+    await follower.stop()
+
+    assert follower.runs == 1
+    assert upstream == ["Paris"]
+    assert leader.lock.acquire()
+    leader.lock.release()
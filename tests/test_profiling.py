@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import main, metrics, profiling
+
+@metrics.timed_db("fake_query")
+async def fake_query():
+    await asyncio.sleep(0.01)
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+def timed_app(**options):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        await fake_query()
+        with profiling.phase("serialize"):
+            busy(0.03)
+        return {"ok": True}
+
+    return profiling.TimingMiddleware(app, **options)
+
+def server_timing(response):
+    return {part.split(";")[0]: float(part.split("dur=")[1]) for part in response.headers["server-timing"].split(", ")}
+
+def test_phases_are_ignored_outside_timed_requests():
+    profiling.record("upstream", 1.0)
+    with profiling.phase("serialize") as phase:
+        pass
+
+    assert phase.phases is None
+
+def test_server_timing_header_and_log(caplog):
+    client = TestClient(timed_app(server_timing=True))
+
+    with caplog.at_level(logging.INFO, logger="app.profiling"):
+        response = client.get("/work")
+
+    timings = server_timing(response)
+    assert set(timings) == {"fake_query", "serialize", "total"}
+    assert timings["fake_query"] >= 10 and timings["serialize"] >= 30
+    assert timings["total"] >= timings["fake_query"] + timings["serialize"]
+    assert "x-profile-id" not in response.headers
+    logged = json.loads(caplog.records[-1].getMessage().removeprefix("request timing "))
+    assert logged["path"] == "/work" and logged["status"] == 200
+    assert set(logged["phases_ms"]) == {"fake_query", "serialize"}
+
+def test_profiles_requests_that_opt_in(tmp_path):
+    client = TestClient(timed_app(server_timing=False, profile_token="secret", directory=str(tmp_path)))
+
+    assert "x-profile-id" not in client.get("/work").headers
+    assert "x-profile-id" not in client.get("/work", headers={"X-Profile": "wrong"}).headers
+    response = client.get("/work", headers={"X-Profile": "secret"})
+
+    assert "server-timing" not in response.headers
+    lines = (tmp_path / response.headers["x-profile-id"]).read_text().splitlines()
+    assert [path.name for path in tmp_path.iterdir()] == [response.headers["x-profile-id"]]
+    assert any("busy (test_profiling.py" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+def test_profiles_a_sample_of_requests(tmp_path):
+    client = TestClient(timed_app(server_timing=False, sample_rate=1.0, directory=str(tmp_path)))
+
+    client.get("/work")
+    client.get("/work")
+
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_sampler_folds_stacks_of_another_thread():
+    worker = threading.Thread(target=busy, args=(0.1,))
+    worker.start()
+    sampler = profiling.Sampler(worker.ident, interval=0.001).start()
+    worker.join()
+    stacks = sampler.stop()
+
+    assert sum(stacks.values()) > 10
+    assert any(stack.split(";")[-1].startswith("busy ") for stack in stacks)
+
+def test_timing_is_off_by_default():
+    assert not any(middleware.cls is profiling.TimingMiddleware for middleware in main.app.user_middleware)
@@ -0,0 +1,105 @@
+import random
+import pytest
+from app.resilience import CircuitBreaker, CircuitOpenError, RateLimitExceeded, TokenBucket, backoff_delay
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_spaces_calls():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, max_wait=10, timer=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        await bucket.acquire()
+    assert clock.now == 0
+    assert bucket.throttled == 0
+
+    await bucket.acquire()
+    await bucket.acquire()
+    assert clock.now == pytest.approx(1.0)
+    assert bucket.throttled == 2
+
+@pytest.mark.asyncio
+async def test_token_bucket_rejects_waits_longer_than_max_wait():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=1, max_wait=0.5, timer=clock, sleep=clock.sleep)
+    await bucket.acquire()
+
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        await bucket.acquire()
+
+    assert excinfo.value.retry_after == pytest.approx(1.0)
+    assert bucket.rejected == 1
+    clock.now = 1.0
+    await bucket.acquire()
+
+@pytest.mark.asyncio
+async def test_token_bucket_disabled_with_zero_rate():
+    bucket = TokenBucket(rate=0)
+    for _ in range(1000):
+        await bucket.acquire()
+    assert bucket.throttled == 0
+
+def test_circuit_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, timer=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 10
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(20)
+    assert (breaker.opens, breaker.rejected) == (1, 1)
+
+def test_half_open_circuit_allows_one_trial_call():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, timer=clock)
+    breaker.record_failure()
+
+    clock.now = 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed trial reopens the circuit, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.opens == 2
+
+def test_half_open_trial_slot_is_freed_if_the_trial_never_reports():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, timer=clock)
+    breaker.record_failure()
+    clock.now = 30
+    breaker.before_call()
+
+    clock.now = 60
+    breaker.before_call()
+
+def test_backoff_delay_grows_exponentially_with_jitter_and_cap():
+    rng = random.Random(0)
+    for attempt in range(8):
+        delays = [backoff_delay(attempt, base=0.1, cap=1.0, rng=rng) for _ in range(50)]
+        assert all(0 <= delay <= min(1.0, 0.1 * 2 ** attempt) for delay in delays)
+        assert len(set(delays)) > 1
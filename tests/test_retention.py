@@ -0,0 +1,144 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import crud, database, hourly, models, schemas, weather
+from app.leader import LeaderLock
+from app.retention import RetentionJob
+
+START = datetime(2020, 1, 1)
+NOW = datetime(2024, 1, 1)
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    # A file database, so that pages can be freed and the file shrinks
+    engine = database.create_async_db_engine(f"sqlite:///{tmp_path}/weather.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.fixture(autouse=True)
+def clear_accesses(monkeypatch):
+    monkeypatch.setattr(weather.Config, "RETENTION_ENABLED", True)
+    weather.accessed.clear()
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    yield
+    weather.accessed.clear()
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+
+async def seed(session_factory, cities=5, days=10, with_hours=False):
+    series = schemas.HourlySeries(**{field: [1.0] * 24 for field in hourly.HOURLY_FIELDS}) if with_hours else None
+    rows = [
+        schemas.WeatherCreate(city=f"City {city}", date=START + timedelta(days=day), min_temp=1.0, max_temp=2.0,
+                              avg_temp=1.5, humidity=50.0, hourly=series)
+        for city in range(cities) for day in range(days)
+    ]
+    async with session_factory() as db:
+        stored = await crud.create_weather_many(db, rows)
+        # Stored long ago, read oldest city first
+        for i, row in enumerate(stored):
+            await crud.touch_weather(db, [(row.location_id, row.date)], NOW - timedelta(days=365, minutes=-i))
+    return stored
+
+async def count(session_factory, model=models.Weather):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_rows_over_the_row_cap(session_factory):
+    stored = await seed(session_factory, with_hours=True)
+    # Reading the oldest rows makes them the most recently used
+    weather.accessed.update((row.location_id, row.date) for row in stored[:5])
+    job = RetentionJob(max_rows=20, batch_size=7, pause=0, session_factory=session_factory)
+
+    report = await job.run_once(now=NOW)
+
+    assert report["accesses_recorded"] == 5
+    assert report["evicted"] == {"age": 0, "rows": 30, "bytes": 0}
+    assert (report["rows_before"], report["rows_after"]) == (50, 20)
+    async with session_factory() as db:
+        kept = set(await db.scalars(select(models.Weather.id)))
+    assert kept == {row.id for row in stored[:5] + stored[35:]}
+    assert await count(session_factory, models.WeatherHourly) == 20
+    assert job.stats()["evicted"] == 30
+
+@pytest.mark.asyncio
+async def test_evicts_rows_not_read_within_the_age_limit(session_factory):
+    stored = await seed(session_factory)
+    async with session_factory() as db:
+        await crud.touch_weather(db, [(row.location_id, row.date) for row in stored[:10]], NOW - timedelta(days=1))
+    job = RetentionJob(max_age_days=30, batch_size=15, pause=0, session_factory=session_factory)
+
+    report = await job.run_once(now=NOW)
+
+    assert report["evicted"]["age"] == 40
+    assert await count(session_factory) == 10
+
+@pytest.mark.asyncio
+async def test_size_cap_evicts_and_vacuum_returns_space(session_factory):
+    await seed(session_factory, cities=20, days=100, with_hours=True)
+    job = RetentionJob(max_bytes=400_000, batch_size=200, pause=0, vacuum_pages=50, session_factory=session_factory)
+
+    report = await job.run_once(now=NOW)
+
+    assert report["compacted"]
+    assert report["evicted"]["bytes"] > 0
+    assert report["reclaimed_bytes"] > 0
+    assert report["file_bytes_after"] < report["file_bytes_before"]
+    assert report["lookup_ms_before"]["p50"] is not None and report["lookup_ms_after"]["p99"] is not None
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(models.Weather)) == report["rows_after"]
+
+@pytest.mark.asyncio
+async def test_reads_are_tracked_only_when_retention_is_enabled(session_factory, monkeypatch):
+    stored = await seed(session_factory, cities=1, days=1)
+    async with session_factory() as db:
+        await weather.get_weather(db, "City 0", START)
+        await weather.get_weather(db, "city 0", START)
+    assert weather.accessed == {(stored[0].location_id, START)}
+
+    weather.accessed.clear()
+    monkeypatch.setattr(weather.Config, "RETENTION_ENABLED", False)
+    async with session_factory() as db:
+        await weather.get_weather(db, "City 0", START)
+    assert weather.accessed == set()
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_evict_about_the_excess(session_factory):
+    await seed(session_factory)
+    jobs = [RetentionJob(max_rows=20, batch_size=4, pause=0, session_factory=session_factory) for _ in range(3)]
+
+    reports = await asyncio.gather(*(job.run_once(now=NOW) for job in jobs))
+
+    # Each job counts again before each batch, so together they overshoot by less than a batch per extra job
+    evicted = sum(report["evicted"]["rows"] for report in reports)
+    assert 30 <= evicted <= 30 + 4 * (len(jobs) - 1)
+    assert await count(session_factory) == 50 - evicted
+
+@pytest.mark.asyncio
+async def test_only_the_lock_holder_evicts(session_factory, tmp_path):
+    stored = await seed(session_factory)
+    leader, follower = (
+        RetentionJob(max_rows=20, pause=0, session_factory=session_factory, lock=LeaderLock("retention", str(tmp_path)))
+        for _ in range(2)
+    )
+    leader.lock.acquire()
+    weather.accessed.add((stored[0].location_id, stored[0].date))
+
+    follower.start()
+    await asyncio.sleep(0.1)
+    await follower.stop()
+
+    assert follower.runs == 0
+    assert weather.accessed == set()
+    assert await count(session_factory) == 50
+    await leader.run_once(now=NOW)
+    assert await count(session_factory) == 20
+    leader.lock.release()
+    assert follower.lock.acquire()
+    follower.lock.release()
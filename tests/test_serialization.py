@@ -0,0 +1,33 @@
+from datetime import datetime
+from app import schemas, serialization
+
+def row(**overrides):
+    fields = dict(id=7, city="São Paulo", date=datetime(2024, 8, 8), min_temp=10.1, max_temp=20.0,
+                  avg_temp=1e-7, humidity=60)
+    fields.update(overrides)
+    return schemas.WeatherResponse(**fields)
+
+def test_dump_weather_matches_pydantic_serialization():
+    weather = row()
+
+    assert serialization.dump_weather(weather) == weather.model_dump_json().encode()
+
+def test_dump_weather_list_matches_pydantic_serialization():
+    from pydantic import TypeAdapter
+    from typing import List
+
+    rows = [row(), row(id=8, date=datetime(2024, 8, 9, 12, 30, 15, 250000))]
+
+    assert serialization.dump_weather_list(rows) == TypeAdapter(List[schemas.WeatherResponse]).dump_json(rows)
+
+def test_records_round_trip_without_a_row_id():
+    record = schemas.WeatherCreate(
+        **row().model_dump(exclude={"id"}),
+        location=schemas.LocationCreate(name="São Paulo", region="Sao Paulo", country="Brazil", lat=-23.53, lon=-46.62),
+        hourly=schemas.HourlySeries(**{field: [1.5] * 24 for field in schemas.HourlySeries.model_fields}),
+    )
+
+    loaded = serialization.load_record(serialization.dump_record(record))
+
+    assert loaded == record
+    assert b'"id"' not in serialization.dump_record(record)
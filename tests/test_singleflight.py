@@ -0,0 +1,39 @@
+import asyncio
+import pytest
+from app.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_do_runs_again_after_completion():
+    flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return len(calls)
+
+    assert await flight.do("key", fn) == 1
+    assert await flight.do("key", fn) == 2
+    assert len(flight) == 0
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_leader_is_cancelled():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.create_task(flight.do("key", fn))
+    await started.wait()
+    waiter = asyncio.create_task(flight.do("key", fn))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await waiter == "done"
+    assert len(calls) == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
@@ -0,0 +1,78 @@
+import pytest
+import pytest_asyncio
+from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import models
+from app.database import Base
+from app.stats import get_weather_stats
+
+@pytest_asyncio.fixture
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        london, paris = models.Location(key="london", name="London"), models.Location(key="paris", name="Paris")
+        db.add_all([london, paris])
+        await db.flush()
+        db.add_all([models.LocationAlias(alias="london", location_id=london.id),
+                    models.LocationAlias(alias="paris", location_id=paris.id)])
+        # London: 2024-01-01 (a Monday) to 2024-02-29, avg_temp equal to the day of year
+        for i in range(60):
+            db.add(models.Weather(location_id=london.id, city="London", date=datetime(2024, 1, 1) + timedelta(days=i),
+                                  min_temp=i - 5.0, max_temp=i + 5.0, avg_temp=float(i), humidity=50.0))
+        db.add(models.Weather(location_id=paris.id, city="Paris", date=datetime(2024, 1, 7),
+                              min_temp=1.0, max_temp=3.0, avg_temp=2.0, humidity=80.0))
+        await db.commit()
+        yield db
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_monthly_stats(db_session):
+    response = await get_weather_stats(db_session, ["london", "Paris"], datetime(2024, 1, 1), datetime(2024, 12, 31))
+
+    london_jan, london_feb, paris_jan = response.series
+    assert (london_jan.city, london_jan.period_start, london_jan.days) == ("london", date(2024, 1, 1), 31)
+    assert london_jan.avg_temp.mean == 15.0
+    assert (london_jan.min_temp.min, london_jan.max_temp.max) == (-5.0, 35.0)
+    assert (london_feb.period_start, london_feb.days) == (date(2024, 2, 1), 29)
+    assert (paris_jan.city, paris_jan.humidity.mean) == ("Paris", 80.0)
+    assert london_jan.avg_temp.rolling_mean is None
+
+@pytest.mark.asyncio
+async def test_weekly_buckets_start_on_monday(db_session):
+    response = await get_weather_stats(db_session, ["Paris", "London"], datetime(2024, 1, 1), datetime(2024, 1, 14), "week")
+
+    assert [(b.city, b.period_start, b.days) for b in response.series] == [
+        ("London", date(2024, 1, 1), 7),
+        ("London", date(2024, 1, 8), 7),
+        # Sunday 2024-01-07 belongs to the week starting Monday 2024-01-01
+        ("Paris", date(2024, 1, 1), 1),
+    ]
+
+@pytest.mark.asyncio
+async def test_rolling_mean_is_day_weighted(db_session):
+    response = await get_weather_stats(db_session, ["London", "Paris"], datetime(2024, 1, 1), datetime(2024, 2, 29),
+                                       "month", window=2)
+
+    london_jan, london_feb, paris_jan = response.series
+    assert london_jan.avg_temp.rolling_mean == 15.0
+    # Mean of days 0..59 across both months
+    assert london_feb.avg_temp.rolling_mean == pytest.approx(29.5)
+    # The window restarts for each city
+    assert paris_jan.avg_temp.rolling_mean == 2.0
+
+@pytest.mark.asyncio
+async def test_rolling_window_spans_calendar_buckets(db_session):
+    london = (await db_session.get(models.LocationAlias, "london")).location_id
+    db_session.add(models.Weather(location_id=london, city="London", date=datetime(2024, 4, 10),
+                                  min_temp=0.0, max_temp=10.0, avg_temp=100.0, humidity=50.0))
+    await db_session.commit()
+
+    response = await get_weather_stats(db_session, ["London"], datetime(2024, 1, 1), datetime(2024, 4, 30),
+                                       "month", window=2)
+
+    # March has no data: April's window is March and April, not February and April
+    assert [b.period_start for b in response.series] == [date(2024, 1, 1), date(2024, 2, 1), date(2024, 4, 1)]
+    assert response.series[2].avg_temp.rolling_mean == 100.0
@@ -0,0 +1,535 @@
+import asyncio
+import pytest
+import pytest_asyncio
+import httpx
+from sqlalchemy import func, select
+from datetime import datetime, timedelta
+from app import cache_backends, models, weather
+from tests.redis_stub import RedisStub
+
+@pytest.fixture(autouse=True)
+def clear_hot_cache():
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    yield
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breaker():
+    weather.circuit_breaker.reset()
+    yield
+    weather.circuit_breaker.reset()
+
+def history_handler(calls):
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={
+            "forecast": {"forecastday": [{"date": request.url.params["dt"], "day": {
+                "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+            }}]}
+        })
+    return handler
+
+@pytest.mark.asyncio
+async def test_fetch_weather_data_reuses_shared_client():
+    calls = []
+    client = await weather.open_http_client(transport=httpx.MockTransport(history_handler(calls)))
+    try:
+        # Opening again must not replace the pooled client
+        assert await weather.open_http_client() is client
+
+        await weather.fetch_weather_data("London", "2024-08-08")
+        await weather.fetch_weather_data("Paris", "2024-08-08")
+
+        assert len(calls) == 2
+        assert calls[1].url.params["q"] == "Paris"
+        assert not client.is_closed
+    finally:
+        await weather.close_http_client()
+
+    assert client.is_closed
+    assert weather._http_client is None
+
+def test_create_http_client_applies_config(monkeypatch):
+    monkeypatch.setattr(weather.Config, "HTTP_CONNECT_TIMEOUT", 1.5)
+    monkeypatch.setattr(weather.Config, "HTTP_READ_TIMEOUT", 7.0)
+    monkeypatch.setattr(weather.Config, "HTTP2", False)
+
+    client = weather.create_http_client()
+
+    assert client.timeout.connect == 1.5
+    assert client.timeout.read == 7.0
+
+@pytest_asyncio.fixture
+async def session_factory():
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import StaticPool
+    from app.database import Base
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+async def get_weather(session_factory, city, date):
+    # Each concurrent caller has its own session, as requests do
+    async with session_factory() as db:
+        return await weather.get_weather(db, city, date)
+
+async def count_rows(session_factory):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(models.Weather))
+
+def slow_fetch(calls, delay=0.05, error=None):
+    async def fetch(city, date):
+        calls.append((city, date))
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return {"forecast": {"forecastday": [{"day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }}]}}
+    return fetch
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_call_upstream_once(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls))
+    date = datetime(2024, 8, 8)
+
+    results = await asyncio.gather(*(get_weather(session_factory, "London", date) for _ in range(20)))
+
+    assert len(calls) == 1
+    assert {r.id for r in results} == {results[0].id}
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_upstream_error(session_factory, monkeypatch):
+    calls = []
+    error = ValueError("Unexpected response structure from weather API.")
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, error=error))
+    date = datetime(2024, 8, 8)
+
+    results = await asyncio.gather(
+        *(get_weather(session_factory, " london ", date) for _ in range(5)),
+        return_exceptions=True,
+    )
+
+    assert len(calls) == 1
+    assert all(r is error for r in results)
+
+@pytest.mark.asyncio
+async def test_hot_cache_answers_repeat_lookups_without_database(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    date = datetime(2024, 8, 8)
+    first = await get_weather(session_factory, "London", date)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("database should not be queried")
+
+    monkeypatch.setattr(weather.crud, "get_weather_by_city_and_date", fail)
+    second = await get_weather(session_factory, "london", date)
+
+    assert second == first
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_upstream_no_data_is_cached_negatively(session_factory, monkeypatch):
+    calls = []
+    request = httpx.Request("GET", weather.Config.WEATHER_API_URL)
+    error = httpx.HTTPStatusError("No matching location found.", request=request,
+                                  response=httpx.Response(400, request=request))
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0, error=error))
+    date = datetime(2024, 8, 8)
+
+    assert await get_weather(session_factory, "Atlantis", date) is None
+    assert await get_weather(session_factory, "Atlantis", date) is None
+    assert len(calls) == 1
+    assert await count_rows(session_factory) == 0
+
+def london_fetch(calls):
+    # The weather API resolves every spelling of London to the same location
+    async def fetch(city, date):
+        calls.append((city, date))
+        return {
+            "location": {"name": "London", "region": "City of London, Greater London",
+                         "country": "United Kingdom", "lat": 51.52, "lon": -0.11},
+            "forecast": {"forecastday": [{"day": {
+                "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+            }}]},
+        }
+    return fetch
+
+@pytest.mark.asyncio
+async def test_city_spellings_share_location_rows_and_cache(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", london_fetch(calls))
+    first, second = datetime(2024, 8, 8), datetime(2024, 8, 9)
+
+    await get_weather(session_factory, "London", first)
+    # An unseen spelling goes upstream once, then resolves to the same location
+    stored = await get_weather(session_factory, "London, UK", second)
+    assert stored.city == "London"
+
+    async def no_database(*args):
+        raise AssertionError("database should not be queried")
+    monkeypatch.setattr(weather.crud, "get_weather_by_city_and_date", no_database)
+    assert (await get_weather(session_factory, " london, uk ", first)).date == first
+    assert (await get_weather(session_factory, "LONDON", second)).id == stored.id
+
+    assert len(calls) == 2
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(models.Location)) == 1
+        aliases = set(await db.scalars(select(models.LocationAlias.alias)))
+    assert aliases == {"london", "london, uk"}
+
+@pytest.mark.asyncio
+async def test_batch_maps_aliases_of_one_location(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", london_fetch(calls))
+    date = datetime(2024, 8, 8)
+
+    async with session_factory() as db:
+        results = await weather.get_weather_batch(db, [("London", date), ("London, UK", date)])
+
+    assert set(results) == {("london", date), ("london, uk", date)}
+    assert results[("london", date)].id == results[("london, uk", date)].id
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_write_behind_returns_at_once_and_reads_its_own_writes(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    monkeypatch.setattr(weather.Config, "WRITE_BEHIND_ENABLED", True)
+    queue = weather.WriteBehindQueue(session_factory=session_factory, on_flush=weather.writer.on_flush)
+    monkeypatch.setattr(weather, "writer", queue)
+    date = datetime(2024, 8, 8)
+
+    fetched = await get_weather(session_factory, "London", date)
+    assert fetched.id is None and fetched.city == "London"
+    assert await count_rows(session_factory) == 0
+
+    # Still queued: answered from the queue, not the API, even without the hot cache
+    weather.hot_cache.clear()
+    assert (await get_weather(session_factory, " london ", date)).avg_temp == 15.0
+    async with session_factory() as db:
+        assert [day.date for day in await weather.get_weather_range(db, "London", date, date)] == [date]
+    assert len(calls) == 1
+
+    await queue.stop()
+    assert await count_rows(session_factory) == 1
+    stored = await get_weather(session_factory, "London", date)
+    assert stored.id is not None
+    assert len(calls) == 1
+
+@pytest_asyncio.fixture
+async def shared_redis(monkeypatch):
+    stub = await RedisStub().start()
+    backend = cache_backends.RedisBackend(stub.url)
+    monkeypatch.setattr(weather, "shared_cache", backend)
+    yield stub
+    await backend.close()
+    await stub.stop()
+
+async def new_node(session_factory):
+    # Another node: its own (empty) database and in-memory caches
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import StaticPool
+    from app.database import Base
+
+    weather.hot_cache.clear()
+    weather.aliases.clear()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+@pytest.mark.asyncio
+async def test_nodes_share_answers_through_the_shared_cache(session_factory, shared_redis, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    dates = [datetime(2024, 8, 8), datetime(2024, 8, 9)]
+
+    async with session_factory() as db:
+        await weather.get_weather_batch(db, [("London", date) for date in dates])
+    assert len(calls) == 2
+
+    engine, other_node = await new_node(session_factory)
+    try:
+        first = await get_weather(other_node, "london", dates[0])
+        async with other_node() as db:
+            results = await weather.get_weather_batch(db, [(" LONDON", date) for date in dates])
+        # Stored locally, so the other node answers with its own row ids
+        assert await count_rows(other_node) == 2
+    finally:
+        await engine.dispose()
+
+    assert len(calls) == 2
+    assert first.avg_temp == 15.0
+    assert [results[("london", date)].date for date in dates] == dates
+    # The batch found its remaining key with a single MGET
+    assert shared_redis.commands.count("MGET") == 3
+
+@pytest.mark.asyncio
+async def test_shared_cache_failures_fall_back_to_the_database(session_factory, shared_redis, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    shared_redis.fail = True
+    date = datetime(2024, 8, 8)
+
+    assert (await get_weather(session_factory, "Paris", date)).avg_temp == 15.0
+    weather.hot_cache.clear()
+    assert (await get_weather(session_factory, "Paris", date)).avg_temp == 15.0
+
+    assert len(calls) == 1
+    assert weather.metrics.SHARED_CACHE_ERRORS.labels("get").value >= 1
+    assert weather.metrics.SHARED_CACHE_ERRORS.labels("set").value >= 2
+
+@pytest.mark.asyncio
+async def test_nodes_give_the_same_etag_to_shared_answers(session_factory, shared_redis, monkeypatch):
+    from app.http_cache import etag_for
+
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    date = datetime(2024, 8, 8)
+    first = await get_weather(session_factory, "London", date)
+
+    engine, other_node = await new_node(session_factory)
+    try:
+        # The other node's database has rows of its own, so ids differ between the nodes
+        await get_weather(other_node, "Paris", date)
+        second = await get_weather(other_node, "london", date)
+        weather.hot_cache.clear()
+        async with other_node() as db:
+            days = await weather.get_weather_range(db, "London", date, date)
+    finally:
+        await engine.dispose()
+
+    assert [city for city, _ in calls] == ["London", "Paris"]
+    assert first.id != second.id == days[0].id
+    assert etag_for([first]) == etag_for([second]) == etag_for(days)
+
+def test_plan_range_fetches_uses_fewest_windows():
+    day = lambda n: datetime(2024, 1, 1) + timedelta(days=n)  # noqa: E731
+    missing = [day(0), day(1), day(3), day(4), day(40), day(75)]
+
+    assert weather.plan_range_fetches(missing, 30) == [(day(0), day(4)), (day(40), day(40)), (day(75), day(75))]
+    assert weather.plan_range_fetches(missing, 2) == [(day(0), day(1)), (day(3), day(4)), (day(40), day(40)), (day(75), day(75))]
+
+@pytest.mark.asyncio
+async def test_get_weather_range_fetches_only_missing_days(session_factory, monkeypatch):
+    calls = []
+
+    async def fetch(city, date, end_date=None):
+        calls.append((date, end_date))
+        end_date = end_date or date
+        days = [date + timedelta(days=i) for i in range((end_date - date).days + 1)]
+        return {"forecast": {"forecastday": [{"date": d.strftime("%Y-%m-%d"), "day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0 + d.day
+        }} for d in days]}}
+
+    monkeypatch.setattr(weather, "fetch_weather_data", fetch)
+    monkeypatch.setattr(weather.Config, "UPSTREAM_MAX_RANGE_DAYS", 10)
+    # Days 5 and 6 are already cached
+    await get_weather(session_factory, "London", datetime(2024, 8, 5))
+    await get_weather(session_factory, "London", datetime(2024, 8, 6))
+    calls.clear()
+
+    async with session_factory() as db:
+        days = await weather.get_weather_range(db, "london", datetime(2024, 8, 1), datetime(2024, 8, 20))
+
+    assert [d.date.day for d in days] == list(range(1, 21))
+    assert calls == [(datetime(2024, 8, 1), datetime(2024, 8, 10)), (datetime(2024, 8, 11), datetime(2024, 8, 20))]
+    assert await count_rows(session_factory) == 20
+
+@pytest.mark.asyncio
+async def test_get_weather_range_stores_windows_that_succeeded(session_factory, monkeypatch):
+    async def fetch(city, date, end_date=None):
+        if date.day == 21:
+            request = httpx.Request("GET", weather.Config.WEATHER_API_URL)
+            raise httpx.HTTPStatusError("Service unavailable", request=request,
+                                        response=httpx.Response(503, request=request))
+        end_date = end_date or date
+        days = [date + timedelta(days=i) for i in range((end_date - date).days + 1)]
+        return {"forecast": {"forecastday": [{"date": d.strftime("%Y-%m-%d"), "day": {
+            "mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0
+        }} for d in days]}}
+
+    stored = []
+    create_weather_many = weather.crud.create_weather_many
+
+    async def spy(db, weathers):
+        stored.extend(weather_data.date.day for weather_data in weathers)
+        return await create_weather_many(db, weathers)
+
+    monkeypatch.setattr(weather, "fetch_weather_data", fetch)
+    monkeypatch.setattr(weather.crud, "create_weather_many", spy)
+    monkeypatch.setattr(weather.Config, "UPSTREAM_MAX_RANGE_DAYS", 10)
+    await get_weather(session_factory, "London", datetime(2024, 8, 5))
+
+    async with session_factory() as db:
+        with pytest.raises(httpx.HTTPStatusError):
+            await weather.get_weather_range(db, "london", datetime(2024, 8, 1), datetime(2024, 8, 31))
+
+    # The 21-30 window failed; the others are stored, without day 5 that the first one re-fetched
+    assert sorted(stored) == [day for day in range(1, 21) if day != 5] + [31]
+    assert await count_rows(session_factory) == 21
+
+def faulty_handler(calls, faults):
+    """Serve history responses, failing first with each of `faults` (a status or an exception)."""
+    faults = list(faults)
+    ok = history_handler(calls)
+
+    def handler(request):
+        if not faults:
+            return ok(request)
+        calls.append(request)
+        fault = faults.pop(0)
+        if isinstance(fault, Exception):
+            raise fault
+        return httpx.Response(fault, headers={"Retry-After": "0"}, request=request)
+    return handler
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(weather.Config, "UPSTREAM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(weather.Config, "UPSTREAM_RETRIES", 2)
+
+@pytest.mark.asyncio
+async def test_fetch_weather_data_retries_transient_failures(fast_retries):
+    calls = []
+    faults = [503, httpx.ConnectError("connection refused")]
+    await weather.open_http_client(transport=httpx.MockTransport(faulty_handler(calls, faults)))
+    try:
+        data = await weather.fetch_weather_data("London", "2024-08-08")
+    finally:
+        await weather.close_http_client()
+
+    assert data["forecast"]["forecastday"][0]["date"] == "2024-08-08"
+    assert len(calls) == 3
+    assert weather.circuit_breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_fetch_weather_data_does_not_retry_client_errors(fast_retries):
+    calls = []
+    await weather.open_http_client(transport=httpx.MockTransport(faulty_handler(calls, [404])))
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await weather.fetch_weather_data("Atlantis", "2024-08-08")
+    finally:
+        await weather.close_http_client()
+
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_after_repeated_failures(fast_retries, monkeypatch):
+    from app.resilience import CircuitOpenError
+
+    monkeypatch.setattr(weather.circuit_breaker, "failure_threshold", 3)
+    calls = []
+    await weather.open_http_client(transport=httpx.MockTransport(faulty_handler(calls, [500] * 10)))
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await weather.fetch_weather_data("London", "2024-08-08")
+        assert weather.circuit_breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            await weather.fetch_weather_data("London", "2024-08-09")
+    finally:
+        await weather.close_http_client()
+
+    assert len(calls) == 3
+
+def hourly_fetch(calls):
+    async def fetch(city, date):
+        calls.append((city, date))
+        return {"forecast": {"forecastday": [{
+            "date": date.strftime("%Y-%m-%d"),
+            "day": {"mintemp_c": 10.0, "maxtemp_c": 20.0, "avgtemp_c": 15.0, "avghumidity": 60.0},
+            "hour": [{"time": f"{date:%Y-%m-%d} {hour:02d}:00", "temp_c": 10.0 + hour / 2, "humidity": 60,
+                      "precip_mm": 0.0, "wind_kph": 5.0, "pressure_mb": 1010.0, "cloud": 0} for hour in range(24)],
+        }]}}
+    return fetch
+
+@pytest.mark.asyncio
+async def test_hourly_series_is_stored_with_the_daily_fetch(session_factory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(weather, "fetch_weather_data", hourly_fetch(calls))
+    date = datetime(2024, 8, 8)
+    await get_weather(session_factory, "London", date)
+
+    async with session_factory() as db:
+        observations = await weather.get_weather_hourly(db, " london", date)
+
+    assert len(calls) == 1
+    assert observations.city == "London"
+    assert [hour.temp_c for hour in observations.hours[:3]] == [10.0, 10.5, 11.0]
+
+def test_missing_daily_fields_are_derived_from_the_hours():
+    date = datetime(2024, 8, 8)
+    data = asyncio.run(hourly_fetch([])("London", date))
+    summary = data["forecast"]["forecastday"][0]["day"]
+    del summary["avgtemp_c"], summary["avghumidity"]
+
+    record = weather.parse_forecast("London", date, data)
+    [day] = weather.parse_forecastdays("London", data)
+
+    assert (record.min_temp, record.max_temp) == (10.0, 20.0)
+    assert (record.avg_temp, record.humidity) == (15.8, 60.0)
+    assert day == record
+
+@pytest.mark.asyncio
+async def test_concurrent_daily_and_hourly_misses_share_one_fetch(session_factory, monkeypatch):
+    calls = []
+    fetch = hourly_fetch(calls)
+
+    async def slow_hourly_fetch(city, date):
+        await asyncio.sleep(0.05)
+        return await fetch(city, date)
+
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_hourly_fetch)
+    date = datetime(2024, 8, 8)
+
+    async def get_hourly():
+        async with session_factory() as db:
+            return await weather.get_weather_hourly(db, "London", date)
+
+    daily, observations = await asyncio.gather(get_weather(session_factory, "London", date), get_hourly())
+
+    assert len(calls) == 1
+    assert daily.city == observations.city == "London"
+    assert len(observations.hours) == 24
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_hourly_lookup_fetches_days_stored_without_hours(session_factory, monkeypatch):
+    calls = []
+    date = datetime(2024, 8, 8)
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0))
+    await get_weather(session_factory, "London", date)
+    monkeypatch.setattr(weather, "fetch_weather_data", hourly_fetch(calls))
+
+    async with session_factory() as db:
+        first = await weather.get_weather_hourly(db, "London", date)
+        second = await weather.get_weather_hourly(db, "London", date)
+
+    assert len(calls) == 2
+    assert first == second and len(first.hours) == 24
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_hourly_lookup_of_unknown_city_returns_none(session_factory, monkeypatch):
+    calls = []
+    request = httpx.Request("GET", weather.Config.WEATHER_API_URL)
+    error = httpx.HTTPStatusError("No matching location found.", request=request,
+                                  response=httpx.Response(400, request=request))
+    monkeypatch.setattr(weather, "fetch_weather_data", slow_fetch(calls, delay=0, error=error))
+
+    async with session_factory() as db:
+        assert await weather.get_weather_hourly(db, "Atlantis", datetime(2024, 8, 8)) is None
+        assert await weather.get_weather_hourly(db, "Atlantis", datetime(2024, 8, 8)) is None
+
+    assert len(calls) == 1
@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app import crud, models, schemas
+from app.database import Base
+from app.writebehind import WriteBehindQueue
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+def record(city, day):
+    return schemas.WeatherCreate(city=city, date=datetime(2024, 8, 1) + timedelta(days=day),
+                                 min_temp=1.0, max_temp=2.0, avg_temp=1.5, humidity=50.0)
+
+async def count_rows(session_factory):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(models.Weather))
+
+@pytest.mark.asyncio
+async def test_queued_records_are_readable_until_flushed(session_factory):
+    flushed = []
+    queue = WriteBehindQueue(batch_size=2, session_factory=session_factory,
+                             on_flush=lambda keys, rows: flushed.append((keys, rows)))
+
+    for day in range(3):
+        await queue.put(("london", day), record("London", day))
+
+    assert queue.get(("london", 1)).date == datetime(2024, 8, 2)
+    assert await count_rows(session_factory) == 0
+
+    await queue.flush()
+
+    assert len(queue) == 0 and queue.get(("london", 1)) is None
+    assert await count_rows(session_factory) == 3
+    assert [len(keys) for keys, _ in flushed] == [2, 1]
+    keys, rows = flushed[0]
+    assert keys == [("london", 0), ("london", 1)]
+    assert all(row.id is not None for row in rows)
+    assert queue.stats()["flushes"] == 2
+
+@pytest.mark.asyncio
+async def test_background_flush_by_size_and_on_stop(session_factory):
+    queue = WriteBehindQueue(batch_size=2, interval=60, session_factory=session_factory)
+    queue.start()
+    try:
+        await queue.put(("paris", 0), record("Paris", 0))
+        await queue.put(("paris", 1), record("Paris", 1))
+        for _ in range(50):
+            if not len(queue):
+                break
+            await asyncio.sleep(0.01)
+        assert await count_rows(session_factory) == 2
+
+        # Below the batch size and long before the interval: only stop() writes it
+        await queue.put(("paris", 2), record("Paris", 2))
+        await asyncio.sleep(0.05)
+        assert await count_rows(session_factory) == 2
+    finally:
+        await queue.stop()
+
+    assert await count_rows(session_factory) == 3
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_records_queued(session_factory):
+    def broken_session():
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    queue = WriteBehindQueue(session_factory=broken_session)
+    await queue.put(("rome", 0), record("Rome", 0))
+
+    with pytest.raises(OperationalError):
+        await queue.flush()
+    assert len(queue) == 1 and queue.failures == 1
+
+    queue._session_factory = session_factory
+    await queue.flush()
+    assert await count_rows(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_records_instead_of_failing_while_the_database_is_down():
+    def broken_session():
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    queue = WriteBehindQueue(max_pending=2, session_factory=broken_session)
+    assert await queue.put(("rome", 0), record("Rome", 0))
+    assert await queue.put(("rome", 1), record("Rome", 1))
+
+    assert not await queue.put(("rome", 2), record("Rome", 2))
+    assert len(queue) == 2 and queue.rejected == 1
+    # A newer record for a queued key still replaces it
+    assert await queue.put(("rome", 1), record("Rome", 1))
+
+@pytest.mark.asyncio
+async def test_record_that_cannot_be_written_does_not_block_the_others(session_factory, monkeypatch):
+    class Unwritable(schemas.WeatherCreate):
+        pass
+
+    store = crud.create_weather_many
+
+    async def create_weather_many(db, weathers):
+        if any(isinstance(weather, Unwritable) for weather in weathers):
+            raise OperationalError("INSERT", {}, Exception("constraint failed"))
+        return await store(db, weathers)
+
+    bad = Unwritable(**record("Oslo", 0).model_dump())
+    queue = WriteBehindQueue(batch_size=4, max_attempts=2, session_factory=session_factory)
+    await queue.put(("oslo", 0), bad)
+    for day in range(1, 6):
+        await queue.put(("oslo", day), record("Oslo", day))
+
+    monkeypatch.setattr(crud, "create_weather_many", create_weather_many)
+    with pytest.raises(OperationalError):
+        await queue.flush()
+    assert list(queue._pending) == [("oslo", day) for day in range(1, 6)] + [("oslo", 0)]
+    # The others are written first; the second failure of the bad record gives up on it
+    with pytest.raises(OperationalError):
+        await queue.flush()
+    assert await count_rows(session_factory) == 5
+    await queue.flush()
+
+    assert len(queue) == 0 and queue.dead_lettered == 1
+    assert list(queue.dead_letters) == [(("oslo", 0), bad)]